@@ -0,0 +1,211 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from typing import Any, BinaryIO, Iterator, List, Optional, Tuple, Union
+
+ZIP_EXTS = ('.zip',)
+TAR_EXTS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+SEVENZIP_EXTS = ('.7z',)
+ARCHIVE_EXTS = ZIP_EXTS + TAR_EXTS + SEVENZIP_EXTS
+
+# Separator between an archive and a member path in provenance strings,
+# e.g. "host1.zip!C/Windows/System32/winevt/Logs/Security.evtx"
+MEMBER_SEP = '!'
+
+
+def is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_EXTS)
+
+
+def is_evtx(name: str) -> bool:
+    return name.lower().endswith('.evtx')
+
+
+def default_spool_dir() -> str:
+    # tmpfs where available, so spilled members never touch the evidence disk
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+class EvtxSource:
+    # One EVTX log to parse: a file on disk, an archive member held in memory,
+    # or a member spooled to a temp file. `source` is the provenance string
+    # recorded on every event.
+    def __init__(self, source: str, path: Optional[str] = None, data: Optional[bytes] = None,
+                 spooled: bool = False, chunks: Optional[Tuple[int, int]] = None) -> None:
+        self.source = source
+        self.path = path
+        self.data = data
+        self.spooled = spooled
+        # Optional (start, end) chunk range of a file on disk
+        self.chunks = chunks
+
+    def close(self) -> None:
+        self.data = None
+        if self.spooled and self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+    def __enter__(self) -> 'EvtxSource':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class ArchiveWalker:
+    # Yields EvtxSource objects for every .evtx member of zip, tar(.gz/.bz2/.xz)
+    # and 7z archives, recursing into nested archives. python-evtx needs random
+    # access, so each member is materialised once: in memory up to
+    # `max_member_ram` bytes, otherwise spooled to `spool_dir`. Only the member
+    # currently being parsed is held, which bounds memory and spool use;
+    # nothing is extracted up front.
+    def __init__(self, max_member_ram: int = 256 * 1024 * 1024, spool_dir: Optional[str] = None,
+                 max_depth: int = 4) -> None:
+        self.max_member_ram = max_member_ram
+        self.spool_dir = spool_dir or default_spool_dir()
+        self.max_depth = max_depth
+        self.errors: List[Tuple[str, str]] = []
+
+    def iter_sources(self, path: str) -> Iterator[EvtxSource]:
+        yield from self._walk(path, path, 0)
+
+    def _walk(self, label: str, target: Union[str, BinaryIO], depth: int) -> Iterator[EvtxSource]:
+        if depth > self.max_depth:
+            self.errors.append((label, 'archive nesting too deep'))
+            return
+        name = label.lower()
+        try:
+            if name.endswith(ZIP_EXTS):
+                members = self._zip_members(target)
+            elif name.endswith(TAR_EXTS):
+                members = self._tar_members(target)
+            elif name.endswith(SEVENZIP_EXTS):
+                members = self._7z_members(target)
+            else:
+                return
+            for member_name, size, fh in members:
+                source = f"{label}{MEMBER_SEP}{member_name}"
+                try:
+                    src = self._materialise(source, fh, size)
+                except Exception as e:
+                    self.errors.append((source, str(e)))
+                    continue
+                if is_evtx(member_name):
+                    yield src
+                else:
+                    with src:
+                        inner: Union[str, BinaryIO] = src.path if src.data is None else io.BytesIO(src.data)
+                        yield from self._walk(source, inner, depth + 1)
+        except Exception as e:
+            self.errors.append((label, str(e)))
+
+    @staticmethod
+    def _wanted(name: str) -> bool:
+        return is_evtx(name) or is_archive(name)
+
+    def _zip_members(self, target: Union[str, BinaryIO]) -> Iterator[Tuple[str, int, BinaryIO]]:
+        with zipfile.ZipFile(target) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not self._wanted(info.filename):
+                    continue
+                with zf.open(info) as fh:
+                    yield info.filename, info.file_size, fh
+
+    def _tar_members(self, target: Union[str, BinaryIO]) -> Iterator[Tuple[str, int, BinaryIO]]:
+        # Stream mode: members are visited in archive order and decompressed
+        # once, which is all the walker needs
+        if isinstance(target, str):
+            tf = tarfile.open(target, mode='r|*')
+        else:
+            tf = tarfile.open(fileobj=target, mode='r|*')
+        with tf:
+            for info in tf:
+                if not info.isfile() or not self._wanted(info.name):
+                    continue
+                fh = tf.extractfile(info)
+                if fh is None:
+                    continue
+                yield info.name, info.size, fh
+
+    def _7z_members(self, target: Union[str, BinaryIO]) -> Iterator[Tuple[str, int, BinaryIO]]:
+        try:
+            import py7zr
+        except ImportError:
+            raise RuntimeError('7z input requires py7zr (pip install py7zr)')
+        with py7zr.SevenZipFile(target, mode='r') as archive:
+            infos = [i for i in archive.list() if not i.is_directory and self._wanted(i.filename)]
+            # Solid 7z blocks decompress front to back, so read members in
+            # batches bounded by the RAM budget instead of one call per member
+            batch: List[Any] = []
+            batch_size = 0
+            for info in infos + [None]:
+                if info is not None and info.uncompressed > self.max_member_ram:
+                    # Over the budget on its own: extracted to the spool dir,
+                    # like an oversized zip/tar member
+                    yield from self._7z_batch(archive, batch)
+                    yield from self._7z_batch(archive, [info], spool=True)
+                    batch, batch_size = [], 0
+                    continue
+                if info is not None and batch_size + info.uncompressed <= self.max_member_ram:
+                    batch.append(info)
+                    batch_size += info.uncompressed
+                    continue
+                yield from self._7z_batch(archive, batch)
+                batch, batch_size = ([info], info.uncompressed) if info is not None else ([], 0)
+
+    def _7z_batch(self, archive: Any, batch: List[Any], spool: bool = False) -> Iterator[Tuple[str, int, BinaryIO]]:
+        if not batch:
+            return
+        names = [i.filename for i in batch]
+        archive.reset()
+        if not spool and hasattr(archive, 'read'):
+            contents = archive.read(targets=names)
+            for info in batch:
+                fh = contents.get(info.filename)
+                if fh is not None:
+                    yield info.filename, info.uncompressed, fh
+            return
+        # Oversized members, or newer py7zr without read(): extract the batch
+        # into the spool dir
+        tmp = tempfile.mkdtemp(prefix='eventhound-7z-', dir=self.spool_dir)
+        try:
+            archive.extract(path=tmp, targets=names)
+            for info in batch:
+                member_path = os.path.join(tmp, info.filename)
+                if os.path.isfile(member_path):
+                    with open(member_path, 'rb') as fh:
+                        yield info.filename, info.uncompressed, fh
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _materialise(self, source: str, fh: BinaryIO, size: int) -> EvtxSource:
+        if size <= self.max_member_ram:
+            return EvtxSource(source, data=fh.read())
+        suffix = '.evtx' if is_evtx(source) else os.path.splitext(source)[1]
+        fd, path = tempfile.mkstemp(prefix='eventhound-', suffix=suffix, dir=self.spool_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                shutil.copyfileobj(fh, out, 1024 * 1024)
+        except Exception:
+            os.remove(path)
+            raise
+        return EvtxSource(source, path=path, spooled=True)
+
+
+def iter_inputs(path: str) -> Iterator[str]:
+    # Top-level inputs: loose .evtx files and archives, each parsed as a unit
+    if os.path.isdir(path):
+        for root, _dirs, files in os.walk(path):
+            for f in files:
+                if is_evtx(f) or is_archive(f):
+                    yield os.path.join(root, f)
+    elif is_evtx(path) or is_archive(path):
+        yield path
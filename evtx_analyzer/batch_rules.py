@@ -0,0 +1,446 @@
+import re
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from . import sigma
+from .rules import Rule, RuleCondition, RuleSet
+
+Hits = List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]
+Mask = Callable[['_Batch'], np.ndarray]
+
+# Values on which RE2 (Arrow) and Python `re` agree for \s, \w, \b, case
+# folding and lowercasing. Distinct values outside this set, or ending in a
+# newline when the pattern uses `$`, are re-checked with the Python matcher.
+_PLAIN = r'^[\t\n\r\x20-\x7e]*$'
+_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'))
+# Syntax both engines accept with a different meaning: `{,n}` is a
+# quantifier in Python and a literal in RE2, `[:` opens a POSIX class in RE2.
+# Case-insensitive non-ASCII patterns fold differently (Python: İ ~ i).
+_RE2_AMBIGUOUS = ('{,', '[:')
+# Pseudo-field for Sigma keywords: every EventData value of every event
+_KEYWORDS = '\0keywords'
+
+
+def _np(arr: pa.Array) -> np.ndarray:
+    return np.asarray(arr.to_numpy(zero_copy_only=False), dtype=bool)
+
+
+class _Column:
+    # One field over a batch, dictionary-encoded in Python: kernels run once
+    # per distinct value and are expanded to rows via codes (-1 = missing)
+    def __init__(self, values: List[Optional[str]], owners: Optional[np.ndarray] = None) -> None:
+        # owners: the row of each value when a row has several (keywords)
+        self.owners = owners
+        index: Dict[str, int] = {}
+        codes = np.empty(len(values), dtype=np.int64)
+        for i, v in enumerate(values):
+            if v is None:
+                codes[i] = -1
+                continue
+            c = index.get(v)
+            if c is None:
+                c = index[v] = len(index)
+            codes[i] = c
+        self.uniques = list(index)
+        self.codes = codes
+        try:
+            self.arr: Optional[pa.Array] = pa.array(self.uniques, type=pa.string())
+        except (pa.ArrowException, UnicodeError):
+            self.arr = None  # e.g. lone surrogates: Python matchers only
+        self._lower: Optional[pa.Array] = None
+        self._plain: Optional[np.ndarray] = None
+        self._trailing_nl: Optional[np.ndarray] = None
+
+    @property
+    def lower(self) -> pa.Array:
+        if self._lower is None:
+            self._lower = pc.utf8_lower(self.arr)
+        return self._lower
+
+    @property
+    def plain(self) -> np.ndarray:
+        if self._plain is None:
+            self._plain = _np(pc.match_substring_regex(self.arr, _PLAIN))
+        return self._plain
+
+    @property
+    def trailing_nl(self) -> np.ndarray:
+        if self._trailing_nl is None:
+            self._trailing_nl = _np(pc.ends_with(self.arr, '\n'))
+        return self._trailing_nl
+
+    def expand(self, per_unique: np.ndarray, missing: bool) -> np.ndarray:
+        return np.append(per_unique, missing)[self.codes]
+
+
+class _Leaf:
+    # A single value test on one field. `vector` computes it for every
+    # distinct value with Arrow kernels and `python` is the reference
+    # matcher; `exact` marks the distinct values the vector result can be
+    # trusted for, the others go through `python`.
+    def __init__(self, column: Tuple[str, str], python: Callable[[Optional[str]], bool],
+                 vector: Optional[Callable[[_Column], np.ndarray]] = None,
+                 exact: Optional[Callable[[_Column], np.ndarray]] = None) -> None:
+        self.column = column
+        self.python = python
+        self.vector = vector
+        self.exact = exact
+        self.missing = bool(python(None))
+
+    def evaluate(self, col: _Column) -> np.ndarray:
+        per_unique = None
+        if self.vector is not None and col.arr is not None and col.uniques:
+            try:
+                per_unique = self.vector(col)
+            except pa.ArrowException:
+                per_unique = None  # e.g. a pattern RE2 does not support
+            if per_unique is not None and self.exact is not None:
+                redo = np.flatnonzero(~self.exact(col))
+                if len(redo):
+                    per_unique = per_unique.copy()
+                    for i in redo:
+                        per_unique[i] = self.python(col.uniques[i])
+        if per_unique is None:
+            per_unique = np.fromiter((self.python(v) for v in col.uniques), dtype=bool, count=len(col.uniques))
+        return col.expand(per_unique, self.missing)
+
+
+def _plain(col: _Column) -> np.ndarray:
+    return col.plain
+
+
+def _regex(pattern: str, flags: int, negate: bool = False
+           ) -> Tuple[Optional[Callable[[_Column], np.ndarray]], Callable[[_Column], np.ndarray]]:
+    # (vector, exact) for a Python regex search with `flags`
+    if any(s in pattern for s in _RE2_AMBIGUOUS) or (flags & re.IGNORECASE and not pattern.isascii()):
+        return None, _plain
+    inline = ''.join(ch for flag, ch in _FLAGS if flags & flag)
+    expr = f'(?{inline}){pattern}' if inline else pattern
+    vector = lambda col: _np(pc.match_substring_regex(col.arr, expr)) != negate  # noqa: E731
+    if '$' in pattern and not flags & re.MULTILINE:
+        # Python `$` also matches before a final newline, RE2 only at the end
+        return vector, lambda col: col.plain & ~col.trailing_nl
+    return vector, _plain
+
+
+def _never(batch: '_Batch') -> np.ndarray:
+    return np.zeros(batch.size, dtype=bool)
+
+
+def _always(batch: '_Batch') -> np.ndarray:
+    return np.ones(batch.size, dtype=bool)
+
+
+class _Compiler:
+    # Turns rules into mask functions over a _Batch. Identical leaves are
+    # shared, so a large pack evaluates each distinct (field, test) once per
+    # batch however many rules use it.
+    def __init__(self) -> None:
+        self.leaves: Dict[Hashable, _Leaf] = {}
+
+    def _leaf(self, key: Hashable, build: Callable[[], _Leaf]) -> Mask:
+        leaf = self.leaves.get(key)
+        if leaf is None:
+            leaf = self.leaves[key] = build()
+        return lambda batch: batch.leaf(leaf)
+
+    def native_condition(self, c: RuleCondition) -> Optional[Mask]:
+        # None: the condition raises on every event it is evaluated for
+        if c.op in ('length_gt', 'length_lt'):
+            try:
+                int(c.value)
+            except (TypeError, ValueError):
+                return None
+        value = str(c.value)
+        return self._leaf(('native', c.field, c.op, value), lambda: self._native_leaf(c, value))
+
+    @staticmethod
+    def _native_leaf(c: RuleCondition, value: str) -> _Leaf:
+        python = lambda v: c.match({c.field: v})  # noqa: E731
+        vector = None
+        exact = None
+        op = c.op
+        if op in ('length_gt', 'length_lt'):
+            cmp = pc.greater if op == 'length_gt' else pc.less
+            n = int(c.value)
+            vector = lambda col: _np(cmp(pc.utf8_length(col.arr), n))  # noqa: E731
+        elif op in ('eq', 'ne'):
+            kernel = pc.equal if op == 'eq' else pc.not_equal
+            vector = lambda col: _np(kernel(col.arr, value))  # noqa: E731
+        elif op in ('contains', 'not_contains'):
+            negate = op == 'not_contains'
+            vector = lambda col: _np(pc.match_substring(col.arr, value)) != negate  # noqa: E731
+        elif op in ('regex', 'not_regex'):
+            try:
+                re.compile(value, re.IGNORECASE)
+            except re.error:
+                pass  # constant result, taken from the Python matcher
+            else:
+                vector, exact = _regex(value, re.IGNORECASE, negate=op == 'not_regex')
+        return _Leaf(('native', c.field), python, vector, exact)
+
+    def native_rule(self, rule: Rule) -> Mask:
+        # Same short-circuiting as Rule.match: a condition that raises only
+        # drops the rows that get as far as evaluating it
+        all_of = [self.native_condition(c) for c in rule.all_of]
+        any_of = [self.native_condition(c) for c in rule.any_of]
+
+        def run(batch: '_Batch') -> np.ndarray:
+            ok = np.ones(batch.size, dtype=bool)
+            for fn in all_of:
+                if fn is None:
+                    return np.zeros(batch.size, dtype=bool)
+                ok &= fn(batch)
+                if not ok.any():
+                    return ok
+            if any_of:
+                hit = np.zeros(batch.size, dtype=bool)
+                for fn in any_of:
+                    if fn is None:
+                        break
+                    hit |= fn(batch)
+                return ok & hit
+            return ok if all_of else np.zeros(batch.size, dtype=bool)
+        return run
+
+    def sigma_matcher(self, field: str, m: Any) -> Mask:
+        pattern = m.pattern.pattern if m.pattern is not None else None
+        flags = m.pattern.flags if m.pattern is not None else 0
+        key = ('sigma', field, m.kind, m.cased, pattern, flags, str(m.value))
+        return self._leaf(key, lambda: self._sigma_leaf(field, m))
+
+    @staticmethod
+    def _sigma_leaf(field: str, m: Any) -> _Leaf:
+        vector = None
+        exact = None
+        kind = m.kind
+        if kind in ('eq', 'contains', 'startswith', 'endswith'):
+            value = m.value
+            kernel = {'eq': pc.equal, 'contains': pc.match_substring,
+                      'startswith': pc.starts_with, 'endswith': pc.ends_with}[kind]
+            if m.cased:
+                vector = lambda col: _np(kernel(col.arr, value))  # noqa: E731
+            else:
+                # str.lower() and utf8_lower agree on plain values
+                vector = lambda col: _np(kernel(col.lower, value))  # noqa: E731
+                exact = _plain
+        elif kind == 'wildcard':
+            # fullmatch: anchored at both ends, so no trailing-newline gap
+            vector, _exact = _regex('^(?:' + m.pattern.pattern + ')\\z', m.pattern.flags)
+            exact = _plain
+        elif kind == 're':
+            vector, exact = _regex(m.pattern.pattern, m.pattern.flags)
+        elif kind == 'null':
+            vector = lambda col: _np(pc.equal(col.arr, ''))  # noqa: E731
+        # cidr and numeric comparisons run in Python, once per distinct value
+        return _Leaf(('sigma', field), m.match, vector, exact)
+
+    def sigma_node(self, node: Any) -> Mask:
+        if isinstance(node, sigma.FieldMatch):
+            if node.exists is not None:
+                column = ('sigma', node.field)
+                want = node.exists
+                return lambda batch: (batch.column(column).codes >= 0) == want
+            if node.require_all:
+                return self._all([self._any([self.sigma_matcher(node.field, m) for m in group])
+                                  for group in node.groups])
+            return self._any([self.sigma_matcher(node.field, m) for m in node.matchers])
+        if isinstance(node, sigma.AllOf):
+            return self._all([self.sigma_node(c) for c in node.children])
+        if isinstance(node, sigma.AnyOf):
+            return self._any([self.sigma_node(c) for c in node.children])
+        if isinstance(node, sigma.AtLeast):
+            children = [self.sigma_node(c) for c in node.children]
+            if not children:
+                return _never
+            # AtLeast.match needs at least one hit even when count <= 0
+            need = max(node.count, 1)
+            return lambda batch: np.add.reduce([fn(batch) for fn in children], dtype=np.int64) >= need
+        if isinstance(node, sigma.Not):
+            child = self.sigma_node(node.child)
+            return lambda batch: ~child(batch)
+        if isinstance(node, sigma.Keywords):
+            if not node.matchers:
+                return _never
+            leaves = [self.sigma_matcher(_KEYWORDS, m) for m in node.matchers]
+            return lambda batch: batch.any_value(np.logical_or.reduce([fn(batch) for fn in leaves]))
+        # Anything else: the node's own matcher, row by row
+        return lambda batch: np.fromiter((bool(node.match(e)) for e in batch.events), dtype=bool, count=batch.size)
+
+    @staticmethod
+    def _all(children: List[Mask]) -> Mask:
+        if not children:
+            return _always
+
+        def run(batch: '_Batch') -> np.ndarray:
+            mask = children[0](batch).copy()
+            for fn in children[1:]:
+                if not mask.any():
+                    break
+                mask &= fn(batch)
+            return mask
+        return run
+
+    @staticmethod
+    def _any(children: List[Mask]) -> Mask:
+        if not children:
+            return _never
+
+        def run(batch: '_Batch') -> np.ndarray:
+            mask = children[0](batch).copy()
+            for fn in children[1:]:
+                if mask.all():
+                    break
+                mask |= fn(batch)
+            return mask
+        return run
+
+    def sigma_rule(self, rule: Any) -> Mask:
+        condition = self.sigma_node(rule.condition)
+        if rule.logsource is None:
+            return condition
+        gate = tuple(sorted((ch, None if ids is None else frozenset(ids)) for ch, ids in rule.logsource.items()))
+
+        def run(batch: '_Batch') -> np.ndarray:
+            mask = batch.gate(gate)
+            if not mask.any():
+                return mask
+            return mask & condition(batch)
+        return run
+
+    def rule(self, rule: Rule) -> Optional[Mask]:
+        # None: evaluated per event with rule.match, like RuleSet.evaluate
+        if type(rule) is Rule:
+            return self.native_rule(rule)
+        if isinstance(rule, sigma.SigmaRule) and type(rule).match is sigma.SigmaRule.match:
+            return self.sigma_rule(rule)
+        return None
+
+
+def _native_value(evt: Dict[str, Any], field: str) -> Optional[str]:
+    # RuleCondition._get_value
+    if field in evt:
+        v = evt.get(field)
+    else:
+        v = (evt.get('data') or {}).get(field)
+    return None if v is None else str(v)
+
+
+def _sigma_value(evt: Dict[str, Any], field: str) -> Optional[str]:
+    v = sigma._resolve(evt, field)
+    return None if v is None else str(v)
+
+
+def _match(rule: Rule, evt: Dict[str, Any]) -> bool:
+    try:
+        return bool(rule.match(evt))
+    except Exception:
+        return False
+
+
+class _Batch:
+    # Events of one batch plus lazily built columns and leaf/gate masks
+    def __init__(self, events: List[Dict[str, Any]]) -> None:
+        self.events = events
+        self.size = len(events)
+        self.columns: Dict[Tuple[str, str], _Column] = {}
+        self.leaves: Dict[int, np.ndarray] = {}
+        self.gates: Dict[Hashable, np.ndarray] = {}
+        self._sources: Optional[Tuple[List[Tuple[str, str]], np.ndarray]] = None
+
+    def column(self, key: Tuple[str, str]) -> _Column:
+        col = self.columns.get(key)
+        if col is None:
+            if key[1] == _KEYWORDS:
+                values: List[Optional[str]] = []
+                owners: List[int] = []
+                for i, e in enumerate(self.events):
+                    for v in (e.get('data') or {}).values():
+                        if v is not None:
+                            values.append(str(v))
+                            owners.append(i)
+                col = _Column(values, np.asarray(owners, dtype=np.int64))
+            else:
+                resolve = _native_value if key[0] == 'native' else _sigma_value
+                field = key[1]
+                col = _Column([resolve(e, field) for e in self.events])
+            self.columns[key] = col
+        return col
+
+    def any_value(self, mask: np.ndarray) -> np.ndarray:
+        # Per-value keyword mask -> rows with at least one matching value
+        owners = self.column(('sigma', _KEYWORDS)).owners
+        return np.bincount(owners[mask], minlength=self.size) > 0
+
+    def leaf(self, leaf: _Leaf) -> np.ndarray:
+        mask = self.leaves.get(id(leaf))
+        if mask is None:
+            mask = self.leaves[id(leaf)] = leaf.evaluate(self.column(leaf.column))
+        return mask
+
+    def gate(self, key: Tuple[Tuple[str, Optional[frozenset]], ...]) -> np.ndarray:
+        # SigmaRule logsource check (exact channel, then event_id if listed),
+        # decided once per distinct (channel, event_id) in the batch
+        mask = self.gates.get(key)
+        if mask is not None:
+            return mask
+        if self._sources is None:
+            index: Dict[Tuple[str, str], int] = {}
+            codes = np.fromiter((index.setdefault((e.get('channel') or '', str(e.get('event_id'))), len(index))
+                                 for e in self.events), dtype=np.int64, count=self.size)
+            self._sources = (list(index), codes)
+        uniques, codes = self._sources
+        allowed = dict(key)
+        per_unique = np.fromiter(
+            (ch in allowed and (allowed[ch] is None or eid in allowed[ch]) for ch, eid in uniques),
+            dtype=bool, count=len(uniques))
+        mask = self.gates[key] = per_unique[codes]
+        return mask
+
+
+class BatchRuleEngine:
+    # Evaluates a RuleSet over batches of events with Arrow compute kernels
+    # instead of rule by rule per event. Fields become dictionary-encoded
+    # columns, each distinct condition runs once per distinct value, and
+    # per-rule masks are combined with NumPy. Findings equal RuleSet.evaluate
+    # (same rules, same order, per event): values where RE2 and Python `re`
+    # could disagree are re-checked with the Python matcher, and rule types
+    # the compiler does not know are evaluated with their own match().
+    def __init__(self, rule_set: RuleSet, batch_size: int = 10000) -> None:
+        self.batch_size = max(1, batch_size)
+        compiler = _Compiler()
+        self.compiled = [(r, compiler.rule(r)) for r in rule_set.rules]
+        self.pending: List[Dict[str, Any]] = []
+
+    def add(self, evt: Dict[str, Any]) -> Hits:
+        # (event, findings) pairs for a whole batch once it is full, else []
+        self.pending.append(evt)
+        if len(self.pending) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self) -> Hits:
+        if not self.pending:
+            return []
+        events, self.pending = self.pending, []
+        return list(zip(events, self.evaluate(events)))
+
+    def evaluate(self, events: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        batch = _Batch(events)
+        hits: List[List[Dict[str, Any]]] = [[] for _ in events]
+        for rule, fn in self.compiled:
+            rows = None
+            if fn is not None:
+                try:
+                    rows = np.flatnonzero(fn(batch)).tolist()
+                except Exception:
+                    rows = None  # a matcher raised: decide row by row below
+            if rows is None:
+                rows = [i for i, evt in enumerate(events) if _match(rule, evt)]
+            for i in rows:
+                hits[i].append({'rule_id': rule.rule_id, 'severity': rule.severity,
+                                'description': rule.description, 'tags': rule.tags})
+        return hits
@@ -0,0 +1,68 @@
+import os
+import pickle
+import hashlib
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+# Bump when the layout of compiled objects changes so stale pickles are ignored
+CACHE_VERSION = 4
+
+
+def default_cache_dir() -> str:
+    return os.environ.get('EVENTHOUND_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'eventhound')
+
+
+def iter_files(dir_path: str, exts: Iterable[str]) -> Iterable[str]:
+    exts = tuple(e.lower() for e in exts)
+    for root, dirs, files in os.walk(dir_path):
+        dirs.sort()
+        for f in sorted(files):
+            if f.lower().endswith(exts):
+                yield os.path.join(root, f)
+
+
+def fingerprint_dir(dir_path: str, exts: Iterable[str]) -> str:
+    # Content hash of every matching file (plus its relative path), so renames,
+    # edits, additions and deletions all produce a new key.
+    h = hashlib.sha256(f'v{CACHE_VERSION}'.encode())
+    for path in iter_files(dir_path, exts):
+        h.update(os.path.relpath(path, dir_path).encode('utf-8', 'replace'))
+        h.update(b'\0')
+        try:
+            with open(path, 'rb') as fh:
+                h.update(hashlib.sha256(fh.read()).digest())
+        except OSError:
+            h.update(b'<unreadable>')
+    return h.hexdigest()
+
+
+def load_or_build(kind: str, dir_path: str, exts: Iterable[str], build: Callable[[], Any],
+                  cache_dir: Optional[str] = None, rebuild: bool = False) -> Tuple[Any, bool]:
+    exts = tuple(exts)
+    cache_dir = cache_dir or default_cache_dir()
+    dir_key = hashlib.sha256(os.path.abspath(dir_path).encode('utf-8', 'replace')).hexdigest()[:12]
+    prefix = f'{kind}-{dir_key}-'
+    path = os.path.join(cache_dir, prefix + fingerprint_dir(dir_path, exts)[:24] + '.pickle')
+    if not rebuild and os.path.exists(path):
+        try:
+            with open(path, 'rb') as fh:
+                return pickle.load(fh), True
+        except Exception:
+            pass
+    obj = build()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as fh:
+            pickle.dump(obj, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        # Drop artifacts for older contents of the same directory
+        for f in os.listdir(cache_dir):
+            full = os.path.join(cache_dir, f)
+            if f.startswith(prefix) and full != path:
+                try:
+                    os.remove(full)
+                except OSError:
+                    pass
+    except Exception:
+        pass
+    return obj, False
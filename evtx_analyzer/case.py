@@ -0,0 +1,736 @@
+import os
+import re
+import json
+import heapq
+import hashlib
+import sqlite3
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .archives import ARCHIVE_EXTS, is_archive, is_evtx, iter_inputs
+from .dsl_sql import register_functions
+from .payload_codec import load_payload
+from .pointers import resolve_data
+from .storage import (drop_storage_columns, events_where, findings_where, indexed_fields, order_by, EVENT_SORT_COLS,
+                      FINDING_SORT_COLS)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+HOSTS_DIR = 'hosts'
+SHARD_DB = 'events.db'
+SHARD_PREFIX = 'events'
+# Event/finding ids served from a case are shard index * ID_STRIDE + the row
+# id inside that shard, so they stay unique and stable as hosts are added.
+ID_STRIDE = 10 ** 12
+
+_HOST_RE = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+def host_name(entry: str) -> str:
+    name = os.path.basename(entry.rstrip('/\\'))
+    lower = name.lower()
+    for ext in sorted(ARCHIVE_EXTS + ('.evtx',), key=len, reverse=True):
+        if lower.endswith(ext):
+            name = name[:-len(ext)]
+            break
+    return _HOST_RE.sub('_', name).strip('._') or 'host'
+
+
+def iter_hosts(input_dir: str) -> Iterator[Tuple[str, str]]:
+    # Each entry directly under the case input dir is one host: a directory,
+    # a triage archive, or a single .evtx file
+    seen: Dict[str, int] = {}
+    for entry in sorted(os.listdir(input_dir)):
+        full = os.path.join(input_dir, entry)
+        if not (os.path.isdir(full) or is_archive(entry) or is_evtx(entry)):
+            continue
+        host = host_name(entry)
+        seen[host] = seen.get(host, 0) + 1
+        if seen[host] > 1:
+            host = f'{host}-{seen[host]}'
+        yield host, full
+
+
+def fingerprint_inputs(path: str) -> str:
+    # Cheap stat-based fingerprint: a host is reprocessed when any of its
+    # input files is added, removed, resized or touched
+    h = hashlib.sha256()
+    for p in sorted(iter_inputs(path)):
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        h.update(f'{os.path.relpath(p, path)}\0{st.st_size}\0{st.st_mtime_ns}\n'.encode('utf-8', 'replace'))
+    return h.hexdigest()
+
+
+def _connect(db_path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    register_functions(conn, db_path)
+    return conn
+
+
+def shard_stats(db_path: str) -> Dict[str, Any]:
+    conn = _connect(db_path)
+    try:
+        events = conn.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+        findings = conn.execute('SELECT COUNT(*) FROM findings').fetchone()[0]
+        first_ts, last_ts = conn.execute(
+            'SELECT MIN(timestamp), MAX(timestamp) FROM events WHERE timestamp IS NOT NULL').fetchone()
+        channels = {('' if r[0] is None else str(r[0])): r[1] for r in conn.execute(
+            'SELECT channel, COUNT(*) FROM events GROUP BY channel ORDER BY 2 DESC')}
+    finally:
+        conn.close()
+    return {'events': events, 'findings': findings, 'first_ts': first_ts, 'last_ts': last_ts, 'channels': channels}
+
+
+class CaseManifest:
+    # manifest.json at the root of a case directory: one entry per host with
+    # its shard location, input fingerprint, time range and channel counts.
+    # The server uses it to skip shards a query cannot match.
+    def __init__(self, case_dir: str) -> None:
+        self.case_dir = case_dir
+        self.path = os.path.join(case_dir, MANIFEST_NAME)
+        self.hosts: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, case_dir: str) -> 'CaseManifest':
+        manifest = cls(case_dir)
+        if os.path.exists(manifest.path):
+            with open(manifest.path, 'r', encoding='utf-8') as fh:
+                data = json.load(fh) or {}
+            manifest.hosts = dict(data.get('hosts') or {})
+        return manifest
+
+    def shard_dir(self, host: str) -> str:
+        return os.path.join(self.case_dir, HOSTS_DIR, host)
+
+    def is_current(self, host: str, fingerprint: str) -> bool:
+        meta = self.hosts.get(host)
+        return bool(meta) and meta.get('fingerprint') == fingerprint \
+            and os.path.exists(os.path.join(self.shard_dir(host), SHARD_DB))
+
+    def index_for(self, host: str) -> int:
+        meta = self.hosts.get(host)
+        if meta and meta.get('index'):
+            return int(meta['index'])
+        return max([int(m.get('index') or 0) for m in self.hosts.values()] + [0]) + 1
+
+    def record(self, host: str, input_path: str, fingerprint: str, stats: Dict[str, Any],
+               shard: Optional[str] = None) -> None:
+        self.hosts[host] = {
+            'index': self.index_for(host),
+            'shard': shard or os.path.join(HOSTS_DIR, host),
+            'input': os.path.abspath(input_path),
+            'fingerprint': fingerprint,
+            'processed_at': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+            **stats,
+        }
+
+    def totals(self) -> Dict[str, Any]:
+        channels: Counter = Counter()
+        firsts = [m['first_ts'] for m in self.hosts.values() if m.get('first_ts')]
+        lasts = [m['last_ts'] for m in self.hosts.values() if m.get('last_ts')]
+        for m in self.hosts.values():
+            channels.update(m.get('channels') or {})
+        return {
+            'hosts': len(self.hosts),
+            'events': sum(int(m.get('events') or 0) for m in self.hosts.values()),
+            'findings': sum(int(m.get('findings') or 0) for m in self.hosts.values()),
+            'first_ts': min(firsts) if firsts else None,
+            'last_ts': max(lasts) if lasts else None,
+            'channels': dict(channels.most_common()),
+        }
+
+    def save(self) -> None:
+        os.makedirs(self.case_dir, exist_ok=True)
+        data = {'version': MANIFEST_VERSION, 'totals': self.totals(),
+                'hosts': dict(sorted(self.hosts.items()))}
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump(data, fh, indent=2)
+        os.replace(tmp, self.path)
+
+
+class _Shard:
+    __slots__ = ('index', 'host', 'db_path', 'meta')
+
+    def __init__(self, index: int, host: str, db_path: str, meta: Dict[str, Any]) -> None:
+        self.index = index
+        self.host = host
+        self.db_path = db_path
+        self.meta = meta
+
+
+def _sort_key(col: str) -> Callable[[Dict[str, Any]], Any]:
+    # NULLs first ascending / last descending, like SQLite
+    return lambda r: (r.get(col) is not None, r.get(col) or '')
+
+
+def _decode_event(shard: _Shard, row: sqlite3.Row) -> Dict[str, Any]:
+    item = dict(row)
+    load_payload(item, shard.db_path)
+    try:
+        item['data'] = json.loads(item['data_json']) if isinstance(item.get('data_json'), str) else None
+    except Exception:
+        item['data'] = None
+    resolve_data(item)
+    drop_storage_columns(item)
+    item['id'] = shard.index * ID_STRIDE + int(item['id'])
+    item['host'] = shard.host
+    return item
+
+
+def _decode_finding(shard: _Shard, row: sqlite3.Row) -> Dict[str, Any]:
+    item = dict(row)
+    item['id'] = shard.index * ID_STRIDE + int(item['id'])
+    if item.get('event_ref') is not None:
+        item['event_ref'] = shard.index * ID_STRIDE + int(item['event_ref'])
+    item['host'] = shard.host
+    return item
+
+
+# Serves the web API from a case directory: every query fans out to the
+# per-host SQLite shards on a thread pool and the partial results are merged.
+# Same method surface as ParquetStore, so server.py treats both alike.
+class CaseStore:
+    def __init__(self, case_dir: str, host: Optional[str] = None, max_workers: int = 16) -> None:
+        self.manifest = CaseManifest.load(case_dir)
+        self.host = host
+        self.max_workers = max_workers
+        self.shards: List[_Shard] = []
+        for name, meta in self.manifest.hosts.items():
+            if host and name != host:
+                continue
+            db_path = os.path.join(case_dir, meta.get('shard') or os.path.join(HOSTS_DIR, name), SHARD_DB)
+            if os.path.exists(db_path):
+                self.shards.append(_Shard(int(meta.get('index') or 0), name, db_path, meta))
+        self.shards.sort(key=lambda s: s.index)
+
+    def _candidates(self, channel: Optional[str] = None, since: Optional[str] = None,
+                    until: Optional[str] = None) -> List[_Shard]:
+        out = []
+        for s in self.shards:
+            m = s.meta
+            if channel and channel not in (m.get('channels') or {}):
+                continue
+            if since and m.get('last_ts') and m['last_ts'] < since:
+                continue
+            if until and m.get('first_ts') and m['first_ts'] > until:
+                continue
+            out.append(s)
+        return out
+
+    def _map(self, fn: Callable[[_Shard, sqlite3.Connection], Any], shards: List[_Shard]) -> List[Any]:
+        def run(shard: _Shard) -> Any:
+            conn = _connect(shard.db_path)
+            try:
+                return fn(shard, conn)
+            finally:
+                conn.close()
+        if len(shards) <= 1:
+            return [run(s) for s in shards]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(shards))) as pool:
+            return list(pool.map(run, shards))
+
+    def indexed_fields(self, common: bool = False) -> Dict[str, str]:
+        # Fields promoted on any shard (all of them filter on it), or with
+        # `common` the ones every shard has under the same column: only those
+        # are compiled to the column, the rest go through json_extract
+        out: Optional[Dict[str, str]] = None
+        for part in self._map(lambda _s, conn: indexed_fields(conn), self.shards):
+            if out is None:
+                out = dict(part)
+            elif common:
+                out = {f: c for f, c in out.items() if part.get(f) == c}
+            else:
+                out.update({f: c for f, c in part.items() if f not in out})
+        return out or {}
+
+    def event_filter(self, q: Optional[str] = None, channel: Optional[str] = None, event_id: Optional[str] = None,
+                     since: Optional[str] = None, until: Optional[str] = None,
+                     dsl: Optional[str] = None, fields: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        where, params = events_where(q, channel, event_id, since, until, dsl, fields,
+                                     self.indexed_fields(common=True) if fields or dsl else None)
+        return {'where': where, 'params': params, 'shards': self._candidates(channel, since, until)}
+
+    def _page(self, table: str, where: str, params: List[Any], shards: List[_Shard], sort_by: str,
+              sort_dir: str, limit: int, offset: int, decode: Callable) -> Dict[str, Any]:
+        k = offset + limit
+        sql = f'SELECT * FROM {table} {where} ORDER BY {sort_by} {sort_dir} LIMIT ?'
+        count_sql = f'SELECT COUNT(*) FROM {table} {where}'
+
+        def query(shard: _Shard, conn: sqlite3.Connection) -> Tuple[List[Dict[str, Any]], int]:
+            rows = [decode(shard, r) for r in conn.execute(sql, params + [k])]
+            return rows, conn.execute(count_sql, params).fetchone()[0]
+
+        parts = self._map(query, shards)
+        rows = [r for part, _n in parts for r in part]
+        rows.sort(key=_sort_key(sort_by), reverse=(sort_dir == 'DESC'))
+        return {'items': rows[offset:offset + limit], 'total': sum(n for _p, n in parts)}
+
+    def list_events(self, q: Optional[str], channel: Optional[str], event_id: Optional[str],
+                    since: Optional[str], until: Optional[str], limit: int, offset: int,
+                    sort_by: str, sort_dir: str, dsl: Optional[str] = None,
+                    fields: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        f = self.event_filter(q, channel, event_id, since, until, dsl, fields)
+        sort_by, sort_dir = order_by(sort_by, sort_dir, EVENT_SORT_COLS, 'timestamp')
+        return self._page('events', f['where'], f['params'], f['shards'], sort_by, sort_dir, limit, offset,
+                          _decode_event)
+
+    def _shard_for(self, pk: int) -> Tuple[Optional[_Shard], int]:
+        index, local = divmod(int(pk), ID_STRIDE)
+        return next((s for s in self.shards if s.index == index), None), local
+
+    def get_event(self, event_pk: int) -> Optional[Dict[str, Any]]:
+        shard, local = self._shard_for(event_pk)
+        if shard is None:
+            return None
+        conn = _connect(shard.db_path)
+        try:
+            row = conn.execute('SELECT * FROM events WHERE id = ?', (local,)).fetchone()
+            return _decode_event(shard, row) if row else None
+        finally:
+            conn.close()
+
+    def get_finding_event(self, finding_pk: int) -> Optional[Dict[str, Any]]:
+        # A finding's event always lives in the same shard as the finding
+        shard, local = self._shard_for(finding_pk)
+        if shard is None:
+            return None
+        conn = _connect(shard.db_path)
+        try:
+            row = conn.execute('SELECT e.* FROM findings f JOIN events e ON e.id = f.event_ref WHERE f.id = ?',
+                               (local,)).fetchone()
+            return _decode_event(shard, row) if row else None
+        finally:
+            conn.close()
+
+    def iter_events(self, expr: Dict[str, Any], batch_size: int, sort_by: str = 'timestamp',
+                    sort_dir: str = 'desc') -> Iterator[List[Dict[str, Any]]]:
+        # k-way merge of per-shard cursors that are already sorted, so an
+        # export across every host stays globally ordered in constant memory
+        sort_by, sort_dir = order_by(sort_by, sort_dir, EVENT_SORT_COLS, 'timestamp')
+        sql = f"SELECT * FROM events {expr['where']} ORDER BY {sort_by} {sort_dir}"
+        conns = []
+
+        def cursor(shard: _Shard) -> Iterator[Dict[str, Any]]:
+            conn = _connect(shard.db_path, check_same_thread=False)
+            conns.append(conn)
+            cur = conn.execute(sql, expr['params'])
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    return
+                for r in rows:
+                    yield _decode_event(shard, r)
+
+        try:
+            merged = heapq.merge(*(cursor(s) for s in expr['shards']), key=_sort_key(sort_by),
+                                 reverse=(sort_dir == 'DESC'))
+            batch: List[Dict[str, Any]] = []
+            for item in merged:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            for conn in conns:
+                conn.close()
+
+    def list_findings(self, q: Optional[str], rule_id: Optional[str], severity: Optional[str],
+                      channel: Optional[str], event_id: Optional[str], limit: int, offset: int,
+                      sort_by: str, sort_dir: str) -> Dict[str, Any]:
+        where, params = findings_where(q, rule_id, severity, channel, event_id)
+        sort_by, sort_dir = order_by(sort_by, sort_dir, FINDING_SORT_COLS, 'event_timestamp')
+        shards = [s for s in self.shards if int(s.meta.get('findings') or 0) > 0]
+        return self._page('findings', where, params, shards, sort_by, sort_dir, limit, offset, _decode_finding)
+
+    # Process tree: every shard has its own processes table, linked at the
+    # end of its ingest. Parents a shard could not link (distributed jobs
+    # split one host's logs) are looked up in the other shards by the same
+    # rules as process_tree.resolve_parents.
+    def _global_node(self, shard: _Shard, node: Dict[str, Any]) -> Dict[str, Any]:
+        node = dict(node)
+        node['event_ref'] = shard.index * ID_STRIDE + int(node['event_ref'])
+        if node.get('parent_ref') is not None:
+            node['parent_ref'] = shard.index * ID_STRIDE + int(node['parent_ref'])
+        node['host'] = shard.host
+        return node
+
+    def _find_process(self, ident: str, prefer: Optional[_Shard] = None) -> Optional[Tuple[_Shard, Dict[str, Any]]]:
+        from .process_tree import find_process
+        ident = str(ident).strip()
+        if ident.isdigit():
+            shard, local = self._shard_for(int(ident))
+            if shard is None:
+                return None
+            shards, ident = [shard], str(local)
+        else:
+            shards = ([prefer] if prefer is not None else []) + [s for s in self.shards if s is not prefer]
+        for shard in shards:
+            try:
+                node = self._map(lambda _s, conn: find_process(conn, ident), [shard])[0]
+            except sqlite3.OperationalError:
+                continue
+            if node is not None:
+                return shard, node
+        return None
+
+    def _parent_elsewhere(self, shard: _Shard, node: Dict[str, Any]) -> Optional[Tuple[_Shard, Dict[str, Any]]]:
+        from .process_tree import SELECT, _node
+        others = [s for s in self.shards if s is not shard]
+        if node.get('parent_key'):
+            sql = f'SELECT {SELECT} FROM processes p WHERE p.proc_key = ? ORDER BY p.event_ref LIMIT 1'
+            params: List[Any] = [node['parent_key']]
+        elif node.get('parent_pid') is not None:
+            sql = (f'SELECT {SELECT} FROM processes p WHERE p.computer = ? AND p.pid = ? AND p.timestamp <= ? '
+                   f'ORDER BY p.timestamp DESC LIMIT 1')
+            params = [node['computer'], node['parent_pid'], node['timestamp']]
+        else:
+            return None
+
+        def query(s: _Shard, conn: sqlite3.Connection) -> Optional[Tuple[_Shard, Dict[str, Any]]]:
+            try:
+                row = conn.execute(sql, params).fetchone()
+            except sqlite3.OperationalError:
+                return None
+            return (s, _node(row)) if row else None
+
+        found = [f for f in self._map(query, others) if f is not None]
+        if not found:
+            return None
+        if node.get('parent_key'):
+            return found[0]
+        return max(found, key=lambda f: f[1]['timestamp'] or '')
+
+    def _ancestry(self, shard: _Shard, node: Dict[str, Any], max_depth: int) -> List[Dict[str, Any]]:
+        from .process_tree import ancestors
+        chain: List[Dict[str, Any]] = []
+        seen = {(shard.index, node['event_ref'])}
+        cur_shard, cur = shard, node
+        while len(chain) < max_depth:
+            part = self._map(lambda _s, conn: ancestors(conn, cur['event_ref'], max_depth - len(chain)),
+                             [cur_shard])[0]
+            chain.extend(self._global_node(cur_shard, n) for n in part)
+            top = part[-1] if part else cur
+            if len(chain) >= max_depth or top.get('parent_ref') is not None or len(self.shards) < 2:
+                break
+            found = self._parent_elsewhere(cur_shard, top)
+            if found is None or (found[0].index, found[1]['event_ref']) in seen:
+                break
+            cur_shard, cur = found
+            seen.add((cur_shard.index, cur['event_ref']))
+            linked = self._global_node(cur_shard, cur)
+            if chain:
+                chain[-1]['parent_ref'] = linked['event_ref']
+            chain.append(linked)
+        for depth, n in enumerate(chain, 1):
+            n['depth'] = depth
+        return chain
+
+    def _children_elsewhere(self, shard: _Shard, nodes: List[Dict[str, Any]]) -> List[Tuple[_Shard, Dict[str, Any], Dict[str, Any]]]:
+        # (shard, child, parent) for unlinked children in other shards whose
+        # parent is one of `nodes` (pid matches are checked against every shard)
+        from .process_tree import SELECT, _node
+        by_key = {n['proc_key']: n for n in nodes if n.get('kind') == 'sysmon'}
+        by_pid = {(n['computer'], n['pid']): n for n in nodes if n.get('pid') is not None}
+        out = []
+        for s in self.shards:
+            if s is shard:
+                continue
+            conn = _connect(s.db_path)
+            try:
+                for i in range(0, len(nodes), 400):
+                    batch = nodes[i:i + 400]
+                    keys = [n['proc_key'] for n in batch if n['proc_key'] in by_key]
+                    pairs = [(n['computer'], n['pid']) for n in batch if n.get('pid') is not None]
+                    clauses, params = [], []
+                    if keys:
+                        clauses.append(f"p.parent_key IN ({','.join('?' * len(keys))})")
+                        params += keys
+                    if pairs:
+                        clauses.append('(p.parent_key IS NULL AND (p.computer, p.parent_pid) IN (VALUES '
+                                       + ','.join('(?, ?)' for _ in pairs) + '))')
+                        params += [v for pair in pairs for v in pair]
+                    if not clauses:
+                        continue
+                    try:
+                        rows = conn.execute(f"SELECT {SELECT} FROM processes p WHERE p.parent_ref IS NULL AND "
+                                            f"({' OR '.join(clauses)})", params).fetchall()
+                    except sqlite3.OperationalError:
+                        break
+                    for row in rows:
+                        child = _node(row)
+                        if child.get('parent_key'):
+                            out.append((s, child, by_key[child['parent_key']]))
+                            continue
+                        parent = by_pid.get((child['computer'], child['parent_pid']))
+                        found = self._parent_elsewhere(s, child)
+                        if parent is not None and found is not None and found[0] is shard \
+                                and found[1]['event_ref'] == parent['event_ref']:
+                            out.append((s, child, parent))
+            finally:
+                conn.close()
+        return out
+
+    def process(self, ident: str) -> Optional[Dict[str, Any]]:
+        found = self._find_process(ident)
+        return self._global_node(*found) if found else None
+
+    def process_ancestors(self, ident: str, max_depth: int) -> Optional[Dict[str, Any]]:
+        found = self._find_process(ident)
+        if found is None:
+            return None
+        chain = self._ancestry(found[0], found[1], max_depth)
+        process = self._global_node(*found)
+        if chain:
+            process['parent_ref'] = chain[0]['event_ref']
+        return {'process': process, 'items': chain,
+                'truncated': len(chain) >= max_depth and chain[-1].get('parent_ref') is not None}
+
+    def process_descendants(self, ident: str, max_depth: int, limit: int) -> Optional[Dict[str, Any]]:
+        from .process_tree import descendants
+        found = self._find_process(ident)
+        if found is None:
+            return None
+        items: List[Dict[str, Any]] = []
+        frontier = [(found[0], found[1], 0)]
+        seen = {(found[0].index, found[1]['event_ref'])}
+        while frontier and len(items) < limit:
+            shard, node, depth = frontier.pop(0)
+            if depth >= max_depth:
+                continue
+            part = self._map(lambda _s, conn: descendants(conn, node['event_ref'], max_depth - depth,
+                                                           limit - len(items)), [shard])[0]
+            for n in part:
+                seen.add((shard.index, n['event_ref']))
+                items.append({**self._global_node(shard, n), 'depth': n['depth'] + depth})
+            if len(self.shards) < 2:
+                continue
+            depths = {node['event_ref']: depth, **{n['event_ref']: n['depth'] + depth for n in part}}
+            for s, child, parent in self._children_elsewhere(shard, [node] + part):
+                d = depths[parent['event_ref']] + 1
+                if d > max_depth or (s.index, child['event_ref']) in seen or len(items) >= limit:
+                    continue
+                seen.add((s.index, child['event_ref']))
+                item = self._global_node(s, child)
+                item['parent_ref'] = shard.index * ID_STRIDE + int(parent['event_ref'])
+                items.append({**item, 'depth': d})
+                frontier.append((s, child, d))
+        items.sort(key=lambda n: (n['depth'], n.get('timestamp') or ''))
+        return {'process': self._global_node(*found), 'items': items[:limit], 'truncated': len(items) >= limit}
+
+    def finding_lineage(self, items: List[Dict[str, Any]], max_depth: int) -> None:
+        # Root-first process chain of each finding's process (see process_tree.lineage)
+        from .process_tree import lineage
+        for item in items:
+            item['lineage'] = None
+            if not item.get('process_key'):
+                continue
+            shard, _local = self._shard_for(item['id'])
+            found = self._find_process(item['process_key'], prefer=shard)
+            if found is None:
+                continue
+            chain = [self._global_node(*found)] + self._ancestry(found[0], found[1], max_depth)
+            item['lineage'] = lineage(chain)
+
+    # Logon sessions: resolved per shard. When one host's logs were split
+    # over distributed jobs, a 4624 in one shard continues as a partial
+    # session (same computer and LogonId, no 4624) in the others; parts that
+    # start inside the session are folded into it.
+    def _global_session(self, shard: _Shard, session: Dict[str, Any]) -> Dict[str, Any]:
+        session = dict(session)
+        for k in ('id', 'logon_ref', 'end_ref'):
+            if session.get(k) is not None:
+                session[k] = shard.index * ID_STRIDE + int(session[k])
+        session['host'] = shard.host
+        return session
+
+    def _session_parts(self, items: List[Dict[str, Any]]) -> Dict[int, List[Tuple[_Shard, Dict[str, Any]]]]:
+        # Global session id -> (shard, local row) of its parts in other
+        # shards; each part goes to the latest session of its key it falls in.
+        # The parts' counts, end and privileges are folded into `items`.
+        from .logon_sessions import COLUMNS
+        full = [i for i in items if i.get('logon_ref') is not None and i.get('start_time')]
+        out: Dict[int, List[Tuple[_Shard, Dict[str, Any]]]] = {}
+        if not full or len(self.shards) < 2:
+            return out
+        keys = sorted({(i['computer'], i['logon_id']) for i in full})
+        sql = (f"SELECT {', '.join(COLUMNS)} FROM logon_sessions WHERE logon_ref IS NULL AND first_seen IS NOT NULL "
+               f"AND (computer, logon_id) IN (VALUES {','.join('(?, ?)' for _ in keys)})")
+        params = [v for key in keys for v in key]
+
+        def query(shard: _Shard, conn: sqlite3.Connection) -> List[Tuple[_Shard, Dict[str, Any]]]:
+            try:
+                return [(shard, dict(zip(COLUMNS, r))) for r in conn.execute(sql, params)]
+            except sqlite3.OperationalError:
+                return []
+
+        for shard, part in [p for found in self._map(query, self.shards) for p in found]:
+            home = [i for i in full if (i['computer'], i['logon_id']) == (part['computer'], part['logon_id'])
+                    and self._shard_for(i['id'])[0] is not shard and i['start_time'] <= part['first_seen']
+                    and (i.get('end_time') is None or part['first_seen'] <= i['end_time'])]
+            if home:
+                out.setdefault(max(home, key=lambda i: i['start_time'])['id'], []).append((shard, part))
+        for item in full:
+            for shard, part in out.get(item['id'], []):
+                item['event_count'] = (item.get('event_count') or 0) + (part.get('event_count') or 0)
+                item['last_seen'] = max(item.get('last_seen') or '', part.get('last_seen') or '') or None
+                if part.get('end_time') and (item.get('end_time') is None or part['end_time'] > item['end_time']):
+                    item['end_time'] = part['end_time']
+                    item['end_ref'] = shard.index * ID_STRIDE + int(part['end_ref'])
+                if part.get('privileged'):
+                    item['privileged'] = 1
+                    item['privileges'] = item.get('privileges') or part.get('privileges')
+            item['parts'] = [shard.index * ID_STRIDE + int(part['id']) for shard, part in out.get(item['id'], [])]
+        return out
+
+    def list_sessions(self, where: str, params: List[Any], limit: int, offset: int, sort_by: str,
+                      sort_dir: str) -> Dict[str, Any]:
+        from .logon_sessions import SESSION_SORT_COLS
+        sort_by, sort_dir = order_by(sort_by, sort_dir, SESSION_SORT_COLS, 'start_time')
+        # Shards from before the session index have no logon_sessions table
+        shards = [s for s, ok in zip(self.shards, self._map(
+            lambda _s, conn: conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'logon_sessions'").fetchone()
+            is not None, self.shards)) if ok]
+        result = self._page('logon_sessions', where, params, shards, sort_by, sort_dir, limit, offset,
+                            lambda shard, row: self._global_session(shard, dict(row)))
+        self._session_parts(result['items'])
+        return result
+
+    def _find_session(self, session_id: int) -> Optional[Tuple[_Shard, Dict[str, Any]]]:
+        from .logon_sessions import get_session
+        shard, local = self._shard_for(session_id)
+        if shard is None:
+            return None
+        try:
+            session = self._map(lambda _s, conn: get_session(conn, local), [shard])[0]
+        except sqlite3.OperationalError:
+            return None
+        return (shard, session) if session else None
+
+    def get_session(self, session_id: int) -> Optional[Dict[str, Any]]:
+        found = self._find_session(session_id)
+        if found is None:
+            return None
+        session = self._global_session(*found)
+        self._session_parts([session])
+        return session
+
+    def session_events(self, session_id: int, limit: int, offset: int) -> Optional[Dict[str, Any]]:
+        # The session's events and those of its parts, merged in time order
+        found = self._find_session(session_id)
+        if found is None:
+            return None
+        session = self._global_session(*found)
+        sources = [found] + self._session_parts([session]).get(session['id'], [])
+        sql = ('SELECT e.*, x.role AS session_role FROM session_events x JOIN events e ON e.id = x.event_ref '
+               'WHERE x.session_id = ? ORDER BY x.timestamp, x.event_ref LIMIT ?')
+        items: List[Dict[str, Any]] = []
+        total = 0
+        for shard, part in sources:
+            local = int(part['id'])
+            rows = self._map(lambda _s, conn: conn.execute(sql, (local, offset + limit)).fetchall(), [shard])[0]
+            items.extend(_decode_event(shard, r) for r in rows)
+            total += self._map(lambda _s, conn: conn.execute(
+                'SELECT COUNT(*) FROM session_events WHERE session_id = ?', (local,)).fetchone()[0], [shard])[0]
+        items.sort(key=lambda e: (e.get('timestamp') or '', e['id']))
+        return {'session': session, 'items': items[offset:offset + limit], 'total': total}
+
+    def _grouped(self, select: str) -> Counter:
+        sql = f'SELECT {select} AS label, COUNT(*) FROM events GROUP BY label'
+
+        def query(_shard: _Shard, conn: sqlite3.Connection) -> List[Tuple[Any, int]]:
+            return [(r[0], r[1]) for r in conn.execute(sql)]
+
+        counts: Counter = Counter()
+        for part in self._map(query, self.shards):
+            for label, n in part:
+                counts[label] += n
+        return counts
+
+    def top_counts(self, column: str, limit: int) -> List[Dict[str, Any]]:
+        if column == 'channel':
+            # Already in the manifest, no need to touch the shards
+            counts: Counter = Counter()
+            for s in self.shards:
+                counts.update(s.meta.get('channels') or {})
+        else:
+            counts = self._grouped(column)
+        return [{"label": k, "value": v} for k, v in counts.most_common(limit)]
+
+    def trend(self, bucket: str) -> List[Dict[str, Any]]:
+        select = "substr(timestamp,1,13) || ':00:00Z'" if bucket == 'hour' else 'substr(timestamp,1,10)'
+        counts = self._grouped(select)
+        return [{"ts": k, "value": counts[k]} for k in sorted(counts, key=lambda x: (x is not None, x or ''))]
+
+    def hosts(self) -> List[Dict[str, Any]]:
+        return [{'host': s.host, **{k: v for k, v in s.meta.items() if k != 'fingerprint'}} for s in self.shards]
+
+    def sketches(self) -> Optional[Any]:
+        # Per-shard ingest sketches merged into one case-wide (or host) view
+        from .sketches import SketchSet, SUMMARY_SUFFIX
+        merged = None
+        for s in self.shards:
+            path = os.path.join(os.path.dirname(s.db_path), SHARD_PREFIX + SUMMARY_SUFFIX)
+            if not os.path.exists(path):
+                continue
+            sketch = SketchSet.load(path)
+            if merged is None:
+                merged = sketch
+            else:
+                merged.merge(sketch)
+        return merged
+
+    def schema(self) -> Optional[Any]:
+        # Per-shard schema catalogs merged the same way
+        from .schema_catalog import SchemaCatalog, SCHEMA_SUFFIX
+        merged = None
+        for s in self.shards:
+            path = os.path.join(os.path.dirname(s.db_path), SHARD_PREFIX + SCHEMA_SUFFIX)
+            if not os.path.exists(path):
+                continue
+            catalog = SchemaCatalog.load(path)
+            if merged is None:
+                merged = catalog
+            else:
+                merged.merge(catalog)
+        return merged
+
+    def stacks(self) -> Optional[Dict[str, Any]]:
+        # One host: its own bottom-N. Whole case: re-stack every shard's full
+        # group aggregate, cached in <case>/stacks.json until a shard changes.
+        from .stacking import restack, STACKS_SUFFIX, STACKS_VERSION, GROUPS_SUFFIX
+        found = [(os.path.join(os.path.dirname(s.db_path), SHARD_PREFIX), s) for s in self.shards]
+        found = [(p, s) for p, s in found if os.path.exists(p + GROUPS_SUFFIX)]
+        if not found:
+            return None
+        prefixes = [p for p, _s in found]
+        # Example event ids are shard-local; served with the case's global ids
+        offsets = [s.index * ID_STRIDE for _p, s in found]
+        if self.host is not None:
+            with open(prefixes[0] + STACKS_SUFFIX, 'r', encoding='utf-8') as fh:
+                summary = json.load(fh)
+            for stack in summary.get('stacks') or []:
+                for group in stack.get('bottom') or []:
+                    for e in group.get('examples') or []:
+                        if e.get('id') is not None:
+                            e['id'] += offsets[0]
+            return summary
+        signature = hashlib.sha256('\n'.join(
+            f'{p}\0{os.path.getmtime(p + GROUPS_SUFFIX)}' for p in prefixes).encode('utf-8')).hexdigest()
+        cache_path = os.path.join(self.manifest.case_dir, 'stacks.json')
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as fh:
+                cached = json.load(fh)
+            if cached.get('signature') == signature and cached.get('version') == STACKS_VERSION:
+                return cached
+        with open(prefixes[0] + STACKS_SUFFIX, 'r', encoding='utf-8') as fh:
+            bottom_n = int(json.load(fh).get('bottom_n') or 50)
+        return restack(prefixes, cache_path, bottom_n=bottom_n, signature=signature, id_offsets=offsets)
@@ -1,21 +1,25 @@
 import os
 import sys
-import json
+import time
+import threading
 import click
-from rich.console import Console
-from rich.progress import Progress
-from .parser import parse_evtx_file
-from .filters import EventFilter
-from .exporters import JsonlExporter, CsvExporter
 from .profiles import get_profile
-from .utils import iter_evtx_paths, parse_iso8601_utc, iter_vss_evtx_paths
-from .storage import init_db as storage_init_db, insert_events, insert_findings
-from .maps import EventMapper
-from .rules import RuleSet
-from .safelists import Safelist
-from .sigma import SigmaLoader
+from .utils import parse_iso8601_utc, iter_vss_evtx_paths
 
-console = Console()
+
+class _LazyConsole:
+    # rich costs ~70ms to import; defer it until something is actually printed
+    def __init__(self) -> None:
+        self._console = None
+
+    def __getattr__(self, name: str):
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console()
+        return getattr(self._console, name)
+
+
+console = _LazyConsole()
 
 EXTENDED_HELP = """
 Profiles:
@@ -28,13 +32,31 @@ Examples:
   python main.py --input logs/ --output outputs/run --only-event-id 4624
   python main.py --input logs/ --output outputs/run --only-event-id 1@Microsoft-Windows-Sysmon/Operational
   python main.py --input logs/ --output outputs/run --serve --host 127.0.0.1 --port 8000
+  python main.py --input logs/ --output outputs/run --serve --serve-backend parquet
+  python main.py --input logs/ --output outputs/run --live
+  python main.py --input triage/ --output cases/acme --case --serve
+  python main.py --input logs/ --output outputs/run --sigma-dir sigma/ --rule-engine arrow
+  python main.py --input case30g/ --output outputs/run --event-cache /fast/evcache --sigma-dir sigma/
+  python main.py --input triage/ --output outputs/timeline --formats jsonl,parquet --timeline
+  python main.py --input outputs/events.db --output outputs/hunt --retrohunt --rules-dir rules/ --sigma-dir sigma/
+  python main.py --input logs/ --output runs/dist --coordinator 0.0.0.0:8765 --local-workers 4 --serve
+  python main.py --input /mnt/logs --output /mnt/runs/dist --worker http://coordinator:8765
 
 Env vars:
   WIN_EVTX_PROFILE: set default profile (e.g., WIN_EVTX_PROFILE=forensics-all)
+  EVENTHOUND_DIST_TOKEN: shared secret required by the coordinator and sent by workers
 """
 
+def _show_extended_help(ctx: click.Context, _param: click.Parameter, value: bool) -> None:
+    # Eager, so it works without the otherwise required --input/--output
+    if not value or ctx.resilient_parsing:
+        return
+    click.echo(EXTENDED_HELP)
+    ctx.exit()
+
+
 @click.command()
-@click.option('--input', 'input_path', required=True, type=click.Path(exists=True), help='EVTX file or directory')
+@click.option('--input', 'input_path', required=True, type=click.Path(exists=True), help='EVTX file, archive (zip/7z/tar.gz) or directory')
 @click.option('--output', 'output_prefix', required=True, type=str, help='Output prefix/dir')
 @click.option('--formats', default='jsonl,csv', type=str, help='Output formats: jsonl,csv,parquet')
 @click.option('--profile', default=None, type=str, help='Event profile (overrides env if set)')
@@ -57,34 +79,103 @@ Env vars:
 @click.option('--serve', is_flag=True, help='Start local web server to visualize results')
 @click.option('--host', default='127.0.0.1', type=str, help='Web server host')
 @click.option('--port', default=8000, type=int, help='Web server port')
-@click.option('--help-all', is_flag=True, help='Show extended help with profiles, examples, env vars')
+@click.option('--serve-backend', default='sqlite', type=click.Choice(['sqlite', 'parquet']), help='Serve from SQLite (ingested) or directly from the Parquet outputs')
+@click.option('--live', is_flag=True, help='Start the web server immediately and stream events/findings while parsing (implies --serve)')
+@click.option('--read-mode', default='auto', type=click.Choice(['auto', 'mmap', 'ram']), help='EVTX read strategy: mmap, whole file in RAM, or auto (RAM below --ram-threshold-mb)')
+@click.option('--ram-threshold-mb', default=32, type=int, help='With --read-mode auto, read files up to this size into RAM')
+@click.option('--madvise', 'madvise_hint', default='sequential', type=click.Choice(['sequential', 'willneed', 'normal']), help='madvise hint for memory-mapped EVTX files')
+@click.option('--readahead', default=8, type=int, help='Chunks (64KB each) to prefetch ahead of the parser in mmap mode, 0 to disable')
+@click.option('--archive-ram-mb', default=256, type=int, help='Archive members up to this size are parsed from memory; larger ones are spooled')
+@click.option('--spool-dir', default='', type=str, help='Where to spool large archive members (default: /dev/shm if writable, else the temp dir)')
+@click.option('--case', is_flag=True, help='Multi-host case: --input is a directory with one entry (dir/archive/.evtx) per host, --output a case directory with per-host shards and a manifest')
+@click.option('--case-reprocess', is_flag=True, help='With --case, reprocess hosts even if their inputs are unchanged')
+@click.option('--coordinator', default='', type=str, help='Distributed mode: serve file/chunk-range jobs on HOST:PORT and collect worker shards into --output')
+@click.option('--worker', 'worker_url', default='', type=str, help='Distributed mode: process jobs from the coordinator at this URL, writing shards under --output')
+@click.option('--local-workers', default=0, type=int, help='With --coordinator, also start this many worker processes on this machine')
+@click.option('--job-chunks', default=512, type=int, help='With --coordinator, split loose .evtx files into jobs of this many 64KB chunks (0 = whole files)')
+@click.option('--lease-timeout', default=120, type=int, help='With --coordinator, seconds without a worker heartbeat before a job is handed out again')
+@click.option('--job-retries', default=2, type=int, help='With --coordinator, times a failed or lost job is retried')
+@click.option('--sketch-fields', default='', type=str, help='Keep top-K/distinct sketches for these fields, e.g. computer,data.IpAddress,data.ParentImage+data.Image, or "triage" for a triage set (default: off)')
+@click.option('--sketch-top-k', default=50, type=int, help='Top values kept per sketched field')
+@click.option('--schema', 'build_schema', is_flag=True, help='Build the EventData schema catalog (<output>.schema.json: fields, fill rate, distinct count and sample values per channel/event ID)')
+@click.option('--stacks-dir', default='', type=str, help='Enable stacking (least-frequent key tuples per channel/event) with stack definitions (YAML) from this directory')
+@click.option('--stack-bottom', default=50, type=int, help='Rarest groups reported per stack')
+@click.option('--stack-max-groups', default=200000, type=int, help='Groups held in memory before stacking spills to disk')
+@click.option('--rule-engine', default='python', type=click.Choice(['python', 'arrow']), help='Evaluate rules per event (python) or in vectorized batches with pyarrow compute kernels (arrow; same findings, faster with large rule packs)')
+@click.option('--rule-batch-size', default=10000, type=int, help='With --rule-engine arrow, events per evaluation batch')
+@click.option('--store-pointers', is_flag=True, help='SQLite keeps the header columns plus a (source, chunk, record) pointer instead of the EventData JSON; event details re-decode the record on demand')
+@click.option('--compress-data', is_flag=True, help='Store EventData zstd-compressed with dictionaries trained per (channel, event_id): SQLite data_json (decompressed transparently by the server) and the Parquet data column')
+@click.option('--index-fields', default='', type=str, help='EventData fields SQLite keeps as indexed generated columns, exposed as API filters (default: TargetUserName,IpAddress,LogonType,Image,ParentImage; "maps" stands for the rename targets of the loaded maps; "none" to disable)')
+@click.option('--timeline', is_flag=True, help='Write events and findings in global time order across all inputs (external merge sort, bounded memory)')
+@click.option('--timeline-buffer-mb', default=256, type=int, help='With --timeline, serialized events held in memory before a sorted run is spilled to disk')
+@click.option('--retrohunt', is_flag=True, help='Re-evaluate only added/changed rules against the events stored by an earlier run (--input: its events.db or events .parquet) and drop findings of deleted rules')
+@click.option('--event-cache', 'event_cache_dir', default='', type=str, help='Cache normalized events per input file (Arrow IPC, keyed by content) in this directory; later runs replay them instead of re-parsing EVTX')
+@click.option('--rebuild-cache', is_flag=True, help='Ignore and rebuild the compiled rules/sigma/safelists/maps cache (and the --event-cache entries)')
+@click.option('--help-all', is_flag=True, is_eager=True, expose_value=False, callback=_show_extended_help,
+              help='Show extended help with profiles, examples, env vars')
 def main(input_path: str, output_prefix: str, formats: str, profile: str, event_ids: str, only_event_id: str,
          channels: str, since: str, until: str, workers: int, dedup: bool, dsl: str, maps_dir: str, maps_sync: str,
          rules_dir: str, sigma_dir: str, safelists_dir: str, findings_output: str, vss: bool, vss_drives: str,
-         serve: bool, host: str, port: int, help_all: bool) -> None:
-    if help_all:
-        console.print(EXTENDED_HELP)
-        sys.exit(0)
+         serve: bool, host: str, port: int, serve_backend: str, live: bool, read_mode: str, ram_threshold_mb: int, madvise_hint: str,
+         readahead: int, archive_ram_mb: int, spool_dir: str, case: bool, case_reprocess: bool,
+         coordinator: str, worker_url: str, local_workers: int, job_chunks: int, lease_timeout: int,
+         job_retries: int, sketch_fields: str, sketch_top_k: int, build_schema: bool, stacks_dir: str, stack_bottom: int,
+         stack_max_groups: int, rule_engine: str, rule_batch_size: int, store_pointers: bool, compress_data: bool, index_fields: str, timeline: bool,
+         timeline_buffer_mb: int, retrohunt: bool, event_cache_dir: str,
+         rebuild_cache: bool) -> None:
+    # Heavier modules (Evtx, xmltodict, yaml, requests, sqlite) load only once
+    # we know a real run is happening, so --help and argument errors stay fast.
+    from .filters import EventFilter
+    from .pipeline import Pipeline
+    from .maps import EventMapper
+    from .rules import RuleSet
+    from .safelists import Safelist
+    from .reader import EvtxReader
+    from .archives import ArchiveWalker, iter_inputs
+    from .sketches import SketchSet, parse_fields, SUMMARY_SUFFIX
+    from .stacking import STACKS_SUFFIX
+    from .schema_catalog import SchemaCatalog, SCHEMA_SUFFIX
 
-    os.makedirs(os.path.dirname(output_prefix) or '.', exist_ok=True)
+    serve = serve or live
+    if live and serve_backend != 'sqlite':
+        console.print('[red]--live requires the sqlite serve backend[/red]')
+        sys.exit(1)
+    if case and live:
+        console.print('[red]--live is not supported with --case[/red]')
+        sys.exit(1)
+    if case and not os.path.isdir(input_path):
+        console.print('[red]--case expects --input to be a directory with one entry per host[/red]')
+        sys.exit(1)
+    distributed = bool(coordinator or worker_url)
+    if coordinator and worker_url:
+        console.print('[red]--coordinator and --worker are mutually exclusive[/red]')
+        sys.exit(1)
+    if distributed and (case or live or vss):
+        console.print('[red]--coordinator/--worker cannot be combined with --case, --live or --vss[/red]')
+        sys.exit(1)
+    if worker_url and serve:
+        console.print('[red]--serve belongs on the coordinator, not on workers[/red]')
+        sys.exit(1)
+    if retrohunt and (case or distributed or serve or vss):
+        console.print('[red]--retrohunt cannot be combined with --case, --coordinator/--worker, --serve/--live or --vss[/red]')
+        sys.exit(1)
+    if retrohunt and not os.path.isfile(input_path):
+        console.print('[red]--retrohunt expects --input to be an events.db or events .parquet file[/red]')
+        sys.exit(1)
 
-    selected_formats = {f.strip().lower() for f in formats.split(',') if f.strip()}
-    exporters = []
-    if 'jsonl' in selected_formats:
-        exporters.append(JsonlExporter(output_prefix + '.jsonl'))
-    if 'csv' in selected_formats:
-        exporters.append(CsvExporter(output_prefix + '.csv'))
-    if 'parquet' in selected_formats:
-        from .exporters import ParquetExporter
-        exporters.append(ParquetExporter(output_prefix + '.parquet'))
+    if compress_data:
+        import importlib.util
+        if importlib.util.find_spec('zstandard') is None:
+            console.print('[red]--compress-data requires zstandard (pip install zstandard)[/red]')
+            sys.exit(1)
 
-    findings_jsonl = None
-    findings_csv = None
-    if findings_output:
-        from .exporters import FindingsJsonlExporter, FindingsCsvExporter
-        findings_jsonl = FindingsJsonlExporter(findings_output + '.findings.jsonl')
-        findings_csv = FindingsCsvExporter(findings_output + '.findings.csv')
+    os.makedirs((output_prefix if case or distributed else os.path.dirname(output_prefix)) or '.', exist_ok=True)
 
+    selected_formats = {f.strip().lower() for f in formats.split(',') if f.strip()}
+    serve_parquet = serve and serve_backend == 'parquet'
+    store_sqlite = serve and not serve_parquet
+    if serve_parquet:
+        selected_formats.add('parquet')
     effective_profile = profile or os.environ.get('WIN_EVTX_PROFILE') or 'ir-default'
     profile_filter = get_profile(effective_profile)
 
@@ -106,99 +197,498 @@ def main(input_path: str, output_prefix: str, formats: str, profile: str, event_
 
     event_filter = EventFilter(profile_filter.ids_by_channel, custom_ids, channel_filter, start_ts, end_ts, dsl or None)
 
+    startup = []
+
+    def timed(label: str, loader, load) -> None:
+        t0 = time.perf_counter()
+        load()
+        source = 'cache' if loader.from_cache else 'built'
+        startup.append(f"{label} {(time.perf_counter() - t0) * 1000:.0f}ms ({source})")
+
     mapper = EventMapper(maps_dir or None)
-    mapper.load_local()
+    timed('maps', mapper, lambda: mapper.load_local(rebuild_cache=rebuild_cache))
     if maps_sync:
         mapper.sync_remote(maps_sync)
 
     rule_set = RuleSet()
     if rules_dir:
-        rule_set.load_dir(rules_dir)
+        timed('rules', rule_set, lambda: rule_set.load_dir(rules_dir, rebuild_cache=rebuild_cache))
     if sigma_dir:
-        SigmaLoader().load_dir(rule_set, sigma_dir)
+        from .sigma import SigmaLoader
+        sigma_loader = SigmaLoader(rebuild_cache=rebuild_cache)
+        timed('sigma', sigma_loader, lambda: sigma_loader.load_dir(rule_set, sigma_dir))
     safelist = Safelist()
     if safelists_dir:
-        safelist.load_dir(safelists_dir)
+        timed('safelists', safelist, lambda: safelist.load_dir(safelists_dir, rebuild_cache=rebuild_cache))
+    console.print(f"[dim]Startup: {', '.join(startup)}; {len(rule_set.rules)} rules, {len(rule_set.correlations)} correlations[/dim]")
+
+    reader = EvtxReader(mode=read_mode, advice=madvise_hint, readahead_chunks=readahead,
+                        ram_threshold=ram_threshold_mb * 1024 * 1024)
+    archives = ArchiveWalker(max_member_ram=archive_ram_mb * 1024 * 1024, spool_dir=spool_dir or None)
+    event_cache = None
+    if event_cache_dir:
+        from .event_cache import EventCache
+        event_cache = EventCache(event_cache_dir, rebuild=rebuild_cache)
+
+    sketched = parse_fields(sketch_fields)
+
+    def new_sketches():
+        return SketchSet(sketched, top_k=sketch_top_k) if sketched else None
+
+    def new_schema():
+        return SchemaCatalog() if build_schema else None
+
+    stack_defs = []
+    if stacks_dir:
+        from .stacking import load_stack_defs
+        stack_defs = load_stack_defs(stacks_dir)
+
+    def new_stacker(prefix):
+        if not stack_defs:
+            return None
+        from .stacking import StackAggregator
+        return StackAggregator(stack_defs, prefix, bottom_n=stack_bottom, max_groups=stack_max_groups)
+
+    def new_rule_batch():
+        if rule_engine != 'arrow' or not rule_set.rules:
+            return None
+        from .batch_rules import BatchRuleEngine
+        return BatchRuleEngine(rule_set, batch_size=rule_batch_size)
+
+    hot_fields = _index_fields(index_fields, mapper)
+
+    def new_codec(db_path):
+        if not compress_data:
+            return None
+        from .payload_codec import PayloadCodec
+        return PayloadCodec(db_path)
+
+    def sorted_outputs(exporters, findings_exporters, prefix):
+        # --timeline: exporters see the run's records once, merged by time, at close
+        if not timeline:
+            return exporters, findings_exporters
+        from .timeline import wrap_timeline, event_time, finding_time
+        buffer_bytes = timeline_buffer_mb * 1024 * 1024
+        return (wrap_timeline(exporters, prefix + '.timeline.tmp', event_time, buffer_bytes),
+                wrap_timeline(findings_exporters, prefix + '.findings-timeline.tmp', finding_time, buffer_bytes))
+
+    def make_pipeline(exporters, findings_exporters, db_path, prefix):
+        # Shard pipelines (case hosts, distributed jobs) always keep SQLite
+        exporters, findings_exporters = sorted_outputs(exporters, findings_exporters, prefix)
+        return Pipeline(event_filter, mapper, rule_set, safelist, exporters=exporters,
+                        findings_exporters=findings_exporters, dedup=dedup, store_sqlite=True,
+                        reader=reader, archives=archives, db_path=db_path, sketches=new_sketches(),
+                        summary_path=prefix + SUMMARY_SUFFIX, schema=new_schema(), schema_path=prefix + SCHEMA_SUFFIX,
+                        stacker=new_stacker(prefix),
+                        rule_batch=new_rule_batch(), event_cache=event_cache,
+                        store_pointers=store_pointers, payload_codec=new_codec(db_path),
+                        index_fields=hot_fields)
 
-    evtx_paths = list(iter_evtx_paths(input_path))
+    if retrohunt:
+        if not rule_set.rules and not rule_set.correlations:
+            console.print('[red]--retrohunt needs the rule pack (--rules-dir and/or --sigma-dir)[/red]')
+            sys.exit(1)
+
+        def hunt_batch(rules):
+            from .batch_rules import BatchRuleEngine
+            return BatchRuleEngine(rules, batch_size=rule_batch_size)
+        _run_retrohunt(input_path, output_prefix, findings_output, rule_set, safelist, mapper,
+                       hunt_batch if rule_engine == 'arrow' else None)
+        return
+
+    if worker_url:
+        _run_worker(worker_url, input_path, output_prefix, selected_formats, make_pipeline, reader, archives)
+        return
+    if coordinator:
+        _run_coordinator(coordinator, input_path, output_prefix, job_chunks, lease_timeout, job_retries,
+                         local_workers)
+        if serve:
+            _start_server(host, port, backend='case', case_dir=output_prefix)
+        return
+
+    if case:
+        _run_case(input_path, output_prefix, selected_formats, make_pipeline, reader, archives, case_reprocess)
+        if serve:
+            _start_server(host, port, backend='case', case_dir=output_prefix)
+        return
+
+    evtx_paths = list(iter_inputs(input_path))
     if vss:
         drives = [d.strip() for d in vss_drives.split(',') if d.strip()]
         vss_paths = list(iter_vss_evtx_paths(drives))
         evtx_paths.extend(vss_paths)
     if not evtx_paths:
-        console.print('[yellow]No .evtx files found[/yellow]')
+        console.print('[yellow]No .evtx files or archives found[/yellow]')
         sys.exit(1)
 
-    total_matched = 0
-    total_findings = 0
-    buffered_for_db = []
-    buffered_findings: list = []
-
-    if serve:
+    if store_sqlite:
+        from .storage import init_db as storage_init_db
         storage_init_db()
 
+    live_feed = None
+    if live:
+        from .live import LiveFeed
+        live_feed = LiveFeed(files_total=len(evtx_paths))
+
+    exporters, findings_exporters, findings_parquet_path = _build_exporters(
+        output_prefix, selected_formats, findings_output, serve_parquet, rule_hashes=rule_set.content_hashes(),
+        compress_data=compress_data)
+    exporters, findings_exporters = sorted_outputs(exporters, findings_exporters, output_prefix)
+    pipeline = Pipeline(event_filter, mapper, rule_set, safelist, exporters=exporters,
+                        findings_exporters=findings_exporters, dedup=dedup, store_sqlite=store_sqlite,
+                        live=live_feed, reader=reader, archives=archives, sketches=new_sketches(),
+                        summary_path=output_prefix + SUMMARY_SUFFIX, schema=new_schema(),
+                        schema_path=output_prefix + SCHEMA_SUFFIX, stacker=new_stacker(output_prefix),
+                        rule_batch=new_rule_batch(), event_cache=event_cache,
+                        store_pointers=store_pointers, payload_codec=new_codec(None) if store_sqlite else None,
+                        index_fields=hot_fields)
+
+    if live_feed is not None:
+        def ingest_worker() -> None:
+            reader.stats.start()
+            try:
+                for path in evtx_paths:
+                    pipeline.process_file(path)
+            except Exception as e:
+                console.print(f'[red]Ingest error: {e}[/red]')
+            finally:
+                pipeline.close()
+                reader.stats.stop()
+            console.print(f'[green]Done.[/green] Extracted events: {pipeline.total_matched}. Findings: {pipeline.total_findings}. Profile: {effective_profile}')
+            console.print(f'[dim]{reader.stats.summary()}[/dim]')
+            if event_cache is not None:
+                console.print(f'[dim]{event_cache.summary()}[/dim]')
+            if pipeline.payload_codec is not None:
+                console.print(f'[dim]{pipeline.payload_codec.summary()}[/dim]')
+            _report_archive_errors(archives)
+
+        threading.Thread(target=ingest_worker, name='ingest', daemon=True).start()
+        _start_server(host, port, live_feed=live_feed, sketches=pipeline.sketches, schema=pipeline.schema,
+                      stacks_path=output_prefix + STACKS_SUFFIX)
+        return
+
+    from rich.progress import Progress
+    reader.stats.start()
     with Progress() as progress:
         task = progress.add_task('Parsing EVTX...', total=len(evtx_paths))
         for path in evtx_paths:
-            for evt in parse_evtx_file(path, event_filter, mapper=mapper, dedup=dedup):
-                total_matched += 1
-                if rule_set.rules and not safelist.is_event_safelisted(evt):
-                    hits = rule_set.evaluate(evt)
-                    for h in hits:
-                        if safelist.is_finding_safelisted(h):
-                            continue
-                        finding_row = {
-                            'event_timestamp': evt.get('timestamp'),
-                            'channel': evt.get('channel'),
-                            'event_id': evt.get('event_id'),
-                            'rule_id': h.get('rule_id'),
-                            'severity': h.get('severity'),
-                            'description': h.get('description'),
-                            'tags': h.get('tags') or [],
-                            'event_ref': None,
-                        }
-                        total_findings += 1
-                        buffered_findings.append(finding_row)
-                        if findings_jsonl:
-                            findings_jsonl.write(finding_row)
-                        if findings_csv:
-                            findings_csv.write(finding_row)
-
-                if serve:
-                    buffered_for_db.append(evt)
-                    if len(buffered_for_db) >= 1000:
-                        insert_events(buffered_for_db)
-                        buffered_for_db.clear()
-                    if len(buffered_findings) >= 500:
-                        insert_findings(buffered_findings)
-                        buffered_findings.clear()
-                for ex in exporters:
-                    ex.write(evt)
+            pipeline.process_file(path)
             progress.advance(task)
+    pipeline.close()
+    reader.stats.stop()
 
-    if buffered_for_db:
-        insert_events(buffered_for_db)
-        buffered_for_db.clear()
-    if buffered_findings:
-        insert_findings(buffered_findings)
-        buffered_findings.clear()
+    console.print(f'[green]Done.[/green] Extracted events: {pipeline.total_matched}. Findings: {pipeline.total_findings}. Profile: {effective_profile}')
+    console.print(f'[dim]{reader.stats.summary()}[/dim]')
+    if event_cache is not None:
+        console.print(f'[dim]{event_cache.summary()}[/dim]')
+    if pipeline.payload_codec is not None:
+        console.print(f'[dim]{pipeline.payload_codec.summary()}[/dim]')
+    _report_archive_errors(archives)
 
-    for ex in exporters:
-        ex.close()
-    if findings_jsonl:
-        findings_jsonl.close()
-    if findings_csv:
-        findings_csv.close()
+    if serve:
+        if serve_parquet:
+            _start_server(host, port, backend='parquet', events_parquet=output_prefix + '.parquet',
+                          findings_parquet=findings_parquet_path, summary_path=output_prefix + SUMMARY_SUFFIX,
+                          schema_path=output_prefix + SCHEMA_SUFFIX, stacks_path=output_prefix + STACKS_SUFFIX)
+        else:
+            _start_server(host, port, summary_path=output_prefix + SUMMARY_SUFFIX,
+                          schema_path=output_prefix + SCHEMA_SUFFIX, stacks_path=output_prefix + STACKS_SUFFIX)
 
-    console.print(f'[green]Done.[/green] Extracted events: {total_matched}. Findings: {total_findings}. Profile: {effective_profile}')
 
-    if serve:
+def _index_fields(spec: str, mapper) -> list:
+    # --index-fields: names, "maps" for every rename target, "none"
+    from .storage import DEFAULT_INDEX_FIELDS
+    spec = spec.strip()
+    if spec.lower() == 'none':
+        return []
+    names = [s.strip() for s in spec.split(',') if s.strip()] if spec else list(DEFAULT_INDEX_FIELDS)
+    out = []
+    for name in names:
+        if name.lower() == 'maps':
+            targets = [str(dst) for m in mapper.maps.values() if isinstance(m, dict)
+                       for dst in (m.get('rename') or {}).values()]
+            out.extend(targets)
+        else:
+            out.append(name)
+    return list(dict.fromkeys(out))
+
+
+def _build_exporters(output_prefix: str, selected_formats, findings_output: str, serve_parquet: bool,
+                     rule_hashes=None, compress_data: bool = False):
+    from .exporters import JsonlExporter, CsvExporter
+    exporters = []
+    if 'jsonl' in selected_formats:
+        exporters.append(JsonlExporter(output_prefix + '.jsonl'))
+    if 'csv' in selected_formats:
+        exporters.append(CsvExporter(output_prefix + '.csv'))
+    if 'parquet' in selected_formats:
+        from .exporters import ParquetExporter
+        exporters.append(ParquetExporter(output_prefix + '.parquet', compression='zstd' if compress_data else None))
+
+    findings_exporters = []
+    if findings_output:
+        from .exporters import FindingsJsonlExporter, FindingsCsvExporter
+        findings_exporters.append(FindingsJsonlExporter(findings_output + '.findings.jsonl'))
+        findings_exporters.append(FindingsCsvExporter(findings_output + '.findings.csv'))
+    findings_parquet_path = None
+    if 'parquet' in selected_formats and (findings_output or serve_parquet):
+        from .exporters import FindingsParquetExporter
+        findings_parquet_path = (findings_output or output_prefix) + '.findings.parquet'
+        findings_exporters.append(FindingsParquetExporter(findings_parquet_path, rule_hashes=rule_hashes))
+    return exporters, findings_exporters, findings_parquet_path
+
+
+def _run_retrohunt(input_path: str, output_prefix: str, findings_output: str, rule_set, safelist, mapper,
+                   rule_batch) -> None:
+    # --input is the store of an earlier run: SQLite (findings in the same
+    # database) or the events .parquet (findings in <prefix>.findings.parquet)
+    import json
+    import sqlite3
+    from .retrohunt import SqliteHunt, ParquetHunt, retrohunt
+    if input_path.lower().endswith('.parquet'):
+        store = ParquetHunt(input_path, (findings_output or output_prefix) + '.findings.parquet')
+    else:
+        store = SqliteHunt(input_path)
+    try:
+        report = retrohunt(store, rule_set, safelist, mapper=mapper, rule_batch=rule_batch)
+    except sqlite3.DatabaseError as e:
+        console.print(f'[red]Cannot read {input_path}: {e}[/red]')
+        sys.exit(1)
+    with open(output_prefix + '.retrohunt.json', 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, indent=1)
+    counts = report['rules']
+    scope = 'all events' if report['scope'] is None else f"{len(report['scope'])} channel/event id scopes"
+    console.print(f"[green]Retrohunt done.[/green] Rules: {counts['added']} added, {counts['changed']} changed, "
+                  f"{counts['deleted']} deleted, {counts['unchanged']} unchanged. "
+                  f"Scanned {report['events_scanned']} events ({scope}); findings -{report['findings_removed']} "
+                  f"+{report['findings_added']} in {report['seconds']:.2f}s")
+
+
+def _run_case(input_dir: str, case_dir: str, selected_formats, make_pipeline, reader, archives,
+              reprocess: bool) -> None:
+    # One shard per host under <case_dir>/hosts/<host>/ (SQLite + the selected
+    # export formats) and a manifest.json index. Hosts whose inputs have not
+    # changed since the last run are skipped, so adding a host only costs
+    # that host.
+    import shutil
+    from rich.progress import Progress
+    from .archives import iter_inputs
+    from .case import CaseManifest, iter_hosts, fingerprint_inputs, shard_stats, SHARD_DB, SHARD_PREFIX
+    from .storage import init_db as storage_init_db, seal_db
+
+    manifest = CaseManifest.load(case_dir)
+    hosts = list(iter_hosts(input_dir))
+    if not hosts:
+        console.print('[yellow]No host inputs found[/yellow]')
+        sys.exit(1)
+    todo = []
+    for host_id, path in hosts:
+        fingerprint = fingerprint_inputs(path)
+        if reprocess or not manifest.is_current(host_id, fingerprint):
+            todo.append((host_id, path, fingerprint))
+    console.print(f'[dim]Case: {len(hosts)} hosts, {len(todo)} to process, {len(hosts) - len(todo)} up to date[/dim]')
+
+    total_events = total_findings = 0
+    reader.stats.start()
+    with Progress() as progress:
+        task = progress.add_task('Processing hosts...', total=len(todo))
+        for host_id, path, fingerprint in todo:
+            shard_dir = manifest.shard_dir(host_id)
+            shutil.rmtree(shard_dir, ignore_errors=True)
+            os.makedirs(shard_dir)
+            db_path = os.path.join(shard_dir, SHARD_DB)
+            storage_init_db(db_path)
+            prefix = os.path.join(shard_dir, SHARD_PREFIX)
+            exporters, findings_exporters, _ = _build_exporters(prefix, selected_formats, prefix, False)
+            pipeline = make_pipeline(exporters, findings_exporters, db_path, prefix)
+            for inp in iter_inputs(path):
+                pipeline.process_file(inp)
+            pipeline.close()
+            seal_db(db_path)
+            # Saved after every host so an interrupted run keeps finished shards
+            manifest.record(host_id, path, fingerprint, shard_stats(db_path))
+            manifest.save()
+            total_events += pipeline.total_matched
+            total_findings += pipeline.total_findings
+            progress.advance(task)
+    reader.stats.stop()
+
+    totals = manifest.totals()
+    console.print(f'[green]Done.[/green] Processed {len(todo)} hosts: {total_events} events, {total_findings} findings. '
+                  f"Case total: {totals['hosts']} hosts, {totals['events']} events, {totals['findings']} findings")
+    console.print(f'[dim]{reader.stats.summary()}[/dim]')
+    _report_archive_errors(archives)
+
+
+def _run_worker(url: str, input_path: str, output_dir: str, selected_formats, make_pipeline, reader,
+                archives) -> None:
+    # Each job becomes a shard under <output>/shards/<job>.<attempt>/ in the
+    # same layout as a case host, so the coordinator can index it directly.
+    # Job paths are relative to --input, which may be a different mount of
+    # the same evidence than the coordinator's.
+    import shutil
+    from .distributed import WorkerClient, input_root, TOKEN_ENV
+    from .case import shard_stats, SHARD_DB, SHARD_PREFIX
+    from .storage import init_db as storage_init_db, seal_db
+
+    root = input_root(input_path)
+
+    def process(job):
+        shard_dir = os.path.join(output_dir, job['shard'])
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        os.makedirs(shard_dir)
+        db_path = os.path.join(shard_dir, SHARD_DB)
+        storage_init_db(db_path)
+        prefix = os.path.join(shard_dir, SHARD_PREFIX)
+        exporters, findings_exporters, _ = _build_exporters(prefix, selected_formats, prefix, False)
+        pipeline = make_pipeline(exporters, findings_exporters, db_path, prefix)
+        errors_before = len(archives.errors)
         try:
-            from .server import app, init_db as server_init
+            pipeline.process_file(os.path.join(root, job['path']), tuple(job['chunks']) if job['chunks'] else None)
+        finally:
+            pipeline.close()
+        seal_db(db_path)
+        return {**shard_stats(db_path), 'archive_errors': [list(e) for e in archives.errors[errors_before:]]}
+
+    def on_job(job, error) -> None:
+        chunks = f" chunks {job['chunks'][0]}-{job['chunks'][1]}" if job['chunks'] else ''
+        if error:
+            console.print(f"[red]{job['id']} {job['path']}{chunks}: {error}[/red]")
+        else:
+            console.print(f"[dim]{job['id']} {job['path']}{chunks} done[/dim]")
+
+    client = WorkerClient(url, token=os.environ.get(TOKEN_ENV))
+    console.print(f'[dim]Worker {client.worker_id} taking jobs from {url}[/dim]')
+    reader.stats.start()
+    done = client.run(process, on_job)
+    reader.stats.stop()
+    console.print(f'[green]Done.[/green] Worker {client.worker_id} completed {done} jobs')
+    console.print(f'[dim]{reader.stats.summary()}[/dim]')
+
+
+def _local_worker_cmd(url: str) -> list:
+    # Re-run this command line as a worker, minus the coordinator/server options
+    strip_values = {'--coordinator', '--local-workers', '--job-chunks', '--lease-timeout', '--job-retries',
+                    '--host', '--port', '--serve-backend'}
+    strip_flags = {'--serve', '--live'}
+    args = []
+    argv = sys.argv[1:]
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        name = arg.split('=', 1)[0]
+        if name in strip_flags or (name in strip_values and '=' in arg):
+            i += 1
+        elif name in strip_values:
+            i += 2
+        else:
+            args.append(arg)
+            i += 1
+    exe = [sys.executable] if getattr(sys, 'frozen', False) else [sys.executable, os.path.abspath(sys.argv[0])]
+    return exe + args + ['--worker', url]
+
+
+def _run_coordinator(bind: str, input_path: str, output_dir: str, job_chunks: int, lease_timeout: int,
+                     job_retries: int, local_workers: int) -> None:
+    # Hands out jobs until every one is done or out of retries, then writes a
+    # case manifest over the finished shards (one entry per job), so the
+    # result is served and queried exactly like a --case directory. Remote
+    # workers must write to the same --output (e.g. a shared mount).
+    import shutil
+    import subprocess
+    from rich.progress import Progress
+    from .distributed import Coordinator, JobQueue, plan_jobs, input_root, SHARDS_DIR, TOKEN_ENV
+    from .case import CaseManifest
+
+    host, _, port = bind.rpartition(':')
+    jobs = plan_jobs(input_path, job_chunks)
+    if not jobs:
+        console.print('[yellow]No .evtx files or archives found[/yellow]')
+        sys.exit(1)
+    shards_root = os.path.join(output_dir, SHARDS_DIR)
+    shutil.rmtree(shards_root, ignore_errors=True)
+    queue = JobQueue(jobs, lease_timeout=lease_timeout, max_attempts=job_retries + 1)
+    server = Coordinator(queue, host or '127.0.0.1', int(port or 0), token=os.environ.get(TOKEN_ENV))
+    server.start()
+    console.print(f'[blue]Coordinator at {server.url}: {len(jobs)} jobs[/blue]')
+
+    procs = [subprocess.Popen(_local_worker_cmd(server.url), stdout=subprocess.DEVNULL)
+             for _ in range(max(0, local_workers))]
+    try:
+        with Progress() as progress:
+            task = progress.add_task('Waiting for workers...', total=len(jobs))
+            while not queue.finished:
+                st = queue.status()
+                progress.update(task, completed=st['done'] + st['failed'],
+                                description=f"Jobs ({st['workers']} workers, {st['leased']} running)...")
+                if procs and all(p.poll() is not None for p in procs):
+                    queue.abandon('all local workers exited')
+                    break
+                time.sleep(0.5)
+            progress.update(task, completed=len(jobs))
+        if procs:
+            for p in procs:
+                p.wait()
+        else:
+            # Let polling remote workers see "done" before the queue goes away
+            time.sleep(3)
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+        raise
+    finally:
+        server.stop()
+
+    root = input_root(input_path)
+    manifest = CaseManifest(output_dir)
+    keep = set()
+    failed = []
+    archive_errors = []
+    for job in queue.results():
+        if job['state'] != 'done':
+            failed.append(job)
+            continue
+        result = dict(job['result'] or {})
+        archive_errors.extend(result.pop('archive_errors', []))
+        shard = JobQueue.shard_for(job['id'], job['attempt'])
+        manifest.record(job['id'], os.path.join(root, job['path']), '', {**result, 'chunks': job['chunks']},
+                        shard=shard)
+        keep.add(os.path.basename(shard))
+    manifest.save()
+    # Shards of lost or superseded attempts
+    if os.path.isdir(shards_root):
+        for name in os.listdir(shards_root):
+            if name not in keep:
+                shutil.rmtree(os.path.join(shards_root, name), ignore_errors=True)
+
+    totals = manifest.totals()
+    console.print(f"[green]Done.[/green] {len(jobs) - len(failed)}/{len(jobs)} jobs: "
+                  f"{totals['events']} events, {totals['findings']} findings")
+    for job in failed[:10]:
+        console.print(f"[red]  {job['id']} {job['path']}: {(job['errors'] or ['failed'])[-1]}[/red]")
+    if archive_errors:
+        console.print(f'[yellow]{len(archive_errors)} archive member(s) could not be read[/yellow]')
+        for source, err in archive_errors[:10]:
+            console.print(f'[dim]  {source}: {err}[/dim]')
+
+
+def _report_archive_errors(archives) -> None:
+    if not archives.errors:
+        return
+    console.print(f'[yellow]{len(archives.errors)} archive member(s) could not be read[/yellow]')
+    for source, err in archives.errors[:10]:
+        console.print(f'[dim]  {source}: {err}[/dim]')
+
+
+def _start_server(host: str, port: int, **settings) -> None:
+    try:
+        from .server import app, init_db as server_init, configure as server_configure
+        server_configure(**settings)
+        if settings.get('backend', 'sqlite') == 'sqlite':
             server_init()
-            import uvicorn
-            console.print(f'[blue]Starting web server at http://{host}:{port}[/blue]')
-            uvicorn.run(app, host=host, port=port)
-        except Exception as e:
-            console.print(f'[red]Server start error: {e}[/red]')
-            sys.exit(1)
+        import uvicorn
+        console.print(f'[blue]Starting web server at http://{host}:{port}[/blue]')
+        uvicorn.run(app, host=host, port=port)
+    except Exception as e:
+        console.print(f'[red]Server start error: {e}[/red]')
+        sys.exit(1)
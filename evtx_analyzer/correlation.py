@@ -0,0 +1,278 @@
+import heapq
+import re
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from .rules import Rule, RuleCondition, content_hash
+
+_TIMESPAN_RE = re.compile(r'^\s*(\d+)\s*([smhd]?)\s*$', re.IGNORECASE)
+_TIMESPAN_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_timespan(value: Any) -> timedelta:
+    # "30s", "5m", "1h", "2d" or plain seconds
+    m = _TIMESPAN_RE.match(str(value))
+    if not m:
+        raise ValueError(f"Invalid timespan: {value}")
+    return timedelta(seconds=int(m.group(1)) * _TIMESPAN_UNITS[m.group(2).lower()])
+
+
+def _get_field(evt: Dict[str, Any], field: str) -> Optional[str]:
+    if field in evt:
+        v = evt.get(field)
+    else:
+        v = (evt.get('data') or {}).get(field)
+    if v is None:
+        return None
+    return str(v)
+
+
+class CorrelationStep:
+    def __init__(self, group_by: List[str], count: int = 1,
+                 any_of: Optional[List[RuleCondition]] = None,
+                 all_of: Optional[List[RuleCondition]] = None) -> None:
+        self.group_by = group_by
+        self.count = max(1, int(count))
+        self.selector = Rule(rule_id='', any_of=any_of, all_of=all_of)
+
+    def match(self, evt: Dict[str, Any]) -> bool:
+        return self.selector.match(evt)
+
+    def key(self, evt: Dict[str, Any]) -> Optional[Tuple[str, ...]]:
+        values = []
+        for field in self.group_by:
+            v = _get_field(evt, field)
+            # Missing or placeholder values would lump unrelated events together
+            if v is None or v in ('', '-'):
+                return None
+            values.append(v)
+        return tuple(values)
+
+
+class CorrelationRule:
+    def __init__(self, rule_id: str, timespan: timedelta, steps: List[CorrelationStep],
+                 description: str = '', severity: str = 'info', tags: Optional[List[str]] = None,
+                 content_hash: str = '') -> None:
+        self.rule_id = rule_id
+        self.timespan = timespan
+        self.steps = steps
+        self.description = description
+        self.severity = severity
+        self.tags = tags or []
+        self.content_hash = content_hash
+
+    @staticmethod
+    def _conditions(items: Any) -> List[RuleCondition]:
+        return [RuleCondition(str(c.get('field')), str(c.get('op')), c.get('value')) for c in (items or [])]
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> Optional['CorrelationRule']:
+        rule_id = str(item.get('id') or '')
+        if not rule_id:
+            return None
+        group_by = [str(f) for f in (item.get('group_by') or [])]
+        timespan = parse_timespan(item.get('timespan') or '5m')
+        steps: List[CorrelationStep] = []
+        sequence = item.get('sequence')
+        if sequence:
+            for step in sequence:
+                steps.append(CorrelationStep(
+                    group_by=[str(f) for f in (step.get('group_by') or group_by)],
+                    count=step.get('count') or 1,
+                    any_of=cls._conditions(step.get('any')),
+                    all_of=cls._conditions(step.get('all')),
+                ))
+        else:
+            steps.append(CorrelationStep(
+                group_by=group_by,
+                count=item.get('count') or 1,
+                any_of=cls._conditions(item.get('any')),
+                all_of=cls._conditions(item.get('all')),
+            ))
+        return cls(rule_id=rule_id, timespan=timespan, steps=steps,
+                   description=str(item.get('description') or ''),
+                   severity=str(item.get('severity') or 'info'),
+                   tags=list(item.get('tags') or []), content_hash=content_hash(item))
+
+
+class _GroupState:
+    __slots__ = ('stage', 'hits', 'started', 'last_seen')
+
+    def __init__(self, steps: List[CorrelationStep]) -> None:
+        self.stage = 0
+        self.hits: List[Deque[datetime]] = [deque(maxlen=s.count) for s in steps]
+        self.started: Optional[datetime] = None
+        self.last_seen: Optional[datetime] = None
+
+
+class StateStore:
+    # Per-rule group state, kept in least-recently-touched order. Groups idle
+    # for longer than the TTL (the rule's timespan) can never complete and are
+    # evicted; max_keys caps memory under high-cardinality keys.
+    def __init__(self, ttl: timedelta, max_keys: int) -> None:
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.items: 'OrderedDict[Tuple[str, ...], _GroupState]' = OrderedDict()
+
+    def get(self, key: Tuple[str, ...]) -> Optional[_GroupState]:
+        st = self.items.get(key)
+        if st is not None:
+            self.items.move_to_end(key)
+        return st
+
+    def put(self, key: Tuple[str, ...], st: _GroupState) -> None:
+        self.items[key] = st
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_keys:
+            self.items.popitem(last=False)
+
+    def drop(self, key: Tuple[str, ...]) -> None:
+        self.items.pop(key, None)
+
+    def evict_expired(self, watermark: datetime) -> int:
+        evicted = 0
+        cutoff = watermark - self.ttl
+        while self.items:
+            key, st = next(iter(self.items.items()))
+            if st.last_seen is None or st.last_seen >= cutoff:
+                break
+            self.items.popitem(last=False)
+            evicted += 1
+        return evicted
+
+
+class CorrelationEngine:
+    # Streams events through correlation rules in timestamp_dt order. A small
+    # reorder buffer absorbs local disorder (e.g. records written slightly out
+    # of sequence) before events reach the window logic. Inputs are read one
+    # after another and their time ranges can come in any order, so each
+    # source keeps its own watermark and a group only expires once every
+    # source still being read has moved past it; end_source() retires a
+    # source's watermark once its last event has been processed.
+    def __init__(self, rules: List[CorrelationRule], max_keys: int = 100000,
+                 reorder_buffer: int = 10000, evict_every: int = 1000) -> None:
+        self.rules = rules
+        self.stores = {r.rule_id: StateStore(r.timespan, max_keys) for r in rules}
+        self.reorder_buffer = reorder_buffer
+        self.evict_every = evict_every
+        self.watermarks: Dict[Any, datetime] = {}
+        # Events per source still in the reorder buffer, and sources whose
+        # input is exhausted
+        self._pending: Dict[Any, int] = {}
+        self._ended: Set[Any] = set()
+        self._heap: List[Tuple[datetime, int, Dict[str, Any]]] = []
+        self._seq = 0
+        self._processed = 0
+
+    def push(self, evt: Dict[str, Any]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        ts = evt.get('timestamp_dt')
+        if ts is None:
+            return []
+        source = evt.get('source')
+        self._pending[source] = self._pending.get(source, 0) + 1
+        self._ended.discard(source)
+        heapq.heappush(self._heap, (ts, self._seq, evt))
+        self._seq += 1
+        out: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        while len(self._heap) > self.reorder_buffer:
+            _ts, _seq, ready = heapq.heappop(self._heap)
+            out.extend(self._process(ready))
+        return out
+
+    def end_source(self, source: Any) -> None:
+        # No more events will come from `source`
+        if self._pending.get(source):
+            self._ended.add(source)
+        else:
+            self._retire(source)
+
+    def _retire(self, source: Any) -> None:
+        self._pending.pop(source, None)
+        self._ended.discard(source)
+        self.watermarks.pop(source, None)
+
+    def state_size(self) -> int:
+        return sum(len(store.items) for store in self.stores.values())
+
+    def flush(self) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        out: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        while self._heap:
+            _ts, _seq, ready = heapq.heappop(self._heap)
+            out.extend(self._process(ready))
+        return out
+
+    def _process(self, evt: Dict[str, Any]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        ts = evt['timestamp_dt']
+        source = evt.get('source')
+        mark = self.watermarks.get(source)
+        if mark is None or ts > mark:
+            self.watermarks[source] = ts
+        self._processed += 1
+        if self._processed % self.evict_every == 0:
+            watermark = min(self.watermarks.values())
+            for store in self.stores.values():
+                store.evict_expired(watermark)
+        self._pending[source] -= 1
+        if not self._pending[source] and source in self._ended:
+            self._retire(source)
+        out = []
+        for rule in self.rules:
+            try:
+                if self._advance(rule, evt, ts):
+                    out.append((evt, {
+                        'rule_id': rule.rule_id,
+                        'severity': rule.severity,
+                        'description': rule.description,
+                        'tags': rule.tags,
+                    }))
+            except Exception:
+                continue
+        return out
+
+    def _advance(self, rule: CorrelationRule, evt: Dict[str, Any], ts: datetime) -> bool:
+        store = self.stores[rule.rule_id]
+        fired = False
+        for i, step in enumerate(rule.steps):
+            if not step.match(evt):
+                continue
+            key = step.key(evt)
+            if key is None:
+                continue
+            st = store.get(key)
+            if st is not None and st.started is not None and ts - st.started > rule.timespan:
+                store.drop(key)
+                st = None
+            if st is None:
+                if i != 0:
+                    continue
+                st = _GroupState(rule.steps)
+                store.put(key, st)
+            st.last_seen = ts
+            if i == 0 and st.stage == 1:
+                # Still waiting for step 2: keep sliding the first window so
+                # it always covers the latest `count` hits.
+                st.hits[0].append(ts)
+                st.started = st.hits[0][0]
+                continue
+            if i != st.stage:
+                continue
+            hits = st.hits[i]
+            hits.append(ts)
+            while hits and ts - hits[0] > rule.timespan:
+                hits.popleft()
+            if len(hits) < step.count:
+                continue
+            if i == 0:
+                st.started = hits[0]
+            st.stage += 1
+            if st.stage == len(rule.steps):
+                fired = True
+                if len(rule.steps) == 1:
+                    store.drop(key)
+                    continue
+                # Back to "first step done": a later final step in the same
+                # window (another 4624 after the burst) fires again
+                st.stage = 1
+                for later in st.hits[1:]:
+                    later.clear()
+        return fired
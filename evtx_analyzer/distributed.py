@@ -0,0 +1,317 @@
+import os
+import json
+import time
+import socket
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from .archives import is_evtx, iter_inputs
+
+JOB_PENDING = 'pending'
+JOB_LEASED = 'leased'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+SHARDS_DIR = 'shards'
+TOKEN_HEADER = 'X-EventHound-Token'
+TOKEN_ENV = 'EVENTHOUND_DIST_TOKEN'
+
+
+def input_root(input_path: str) -> str:
+    # Job paths are relative to this, so workers can mount the evidence elsewhere
+    return input_path if os.path.isdir(input_path) else (os.path.dirname(input_path) or '.')
+
+
+def plan_jobs(input_path: str, job_chunks: int = 0) -> List[Dict[str, Any]]:
+    # One job per archive or loose .evtx file; loose files with more than
+    # `job_chunks` chunks are split into chunk ranges so one large Security.evtx
+    # does not serialise the whole run on a single worker.
+    from .reader import EvtxReader
+    root = input_root(input_path)
+    jobs: List[Dict[str, Any]] = []
+    for path in sorted(iter_inputs(input_path)):
+        rel = os.path.relpath(path, root)
+        ranges: List[Optional[List[int]]] = [None]
+        if job_chunks > 0 and is_evtx(path):
+            try:
+                count = EvtxReader.chunk_count(path)
+            except Exception:
+                count = 0
+            if count > job_chunks:
+                ranges = [[start, min(start + job_chunks, count)] for start in range(0, count, job_chunks)]
+        for chunks in ranges:
+            jobs.append({'id': f'j{len(jobs) + 1:05d}', 'path': rel, 'chunks': chunks})
+    return jobs
+
+
+class JobQueue:
+    # In-memory job table for the coordinator. A lease is (job, attempt) with
+    # a deadline; workers extend it with heartbeats. Expired leases and
+    # reported failures go back to pending until max_attempts is used up.
+    # Results from a superseded attempt are rejected, so a worker that was
+    # presumed dead cannot overwrite the shard of the attempt that replaced it.
+    def __init__(self, jobs: List[Dict[str, Any]], lease_timeout: float = 120.0, max_attempts: int = 3) -> None:
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.lock = threading.Lock()
+        self.order = [j['id'] for j in jobs]
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        for j in jobs:
+            self.jobs[j['id']] = {**j, 'state': JOB_PENDING, 'attempt': 0, 'worker': None, 'deadline': 0.0,
+                                  'failed_on': [], 'errors': [], 'result': None}
+        self.workers: Set[str] = set()
+
+    @staticmethod
+    def shard_for(job_id: str, attempt: int) -> str:
+        return os.path.join(SHARDS_DIR, f'{job_id}.{attempt}')
+
+    def _expire(self, now: float) -> None:
+        for job in self.jobs.values():
+            if job['state'] == JOB_LEASED and job['deadline'] < now:
+                self._retry(job, f"lease expired on {job['worker']}")
+
+    def _retry(self, job: Dict[str, Any], error: str) -> None:
+        job['errors'].append(error)
+        if job['worker']:
+            job['failed_on'].append(job['worker'])
+        job['worker'] = None
+        job['state'] = JOB_PENDING if job['attempt'] < self.max_attempts else JOB_FAILED
+
+    def _current(self, job_id: str, attempt: int) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is None or job['state'] != JOB_LEASED or job['attempt'] != attempt:
+            return None
+        return job
+
+    def lease(self, worker: str) -> Dict[str, Any]:
+        now = time.time()
+        with self.lock:
+            self.workers.add(worker)
+            self._expire(now)
+            pending = [self.jobs[i] for i in self.order if self.jobs[i]['state'] == JOB_PENDING]
+            if not pending:
+                if self.finished_locked():
+                    return {'done': True}
+                return {'wait': True}
+            # Prefer a worker that has not already failed this job
+            job = next((j for j in pending if worker not in j['failed_on']), pending[0])
+            job['state'] = JOB_LEASED
+            job['attempt'] += 1
+            job['worker'] = worker
+            job['deadline'] = now + self.lease_timeout
+            return {'job': {'id': job['id'], 'path': job['path'], 'chunks': job['chunks'],
+                            'attempt': job['attempt'], 'shard': self.shard_for(job['id'], job['attempt'])},
+                    'lease_timeout': self.lease_timeout}
+
+    def heartbeat(self, job_id: str, attempt: int) -> bool:
+        with self.lock:
+            job = self._current(job_id, attempt)
+            if job is None:
+                return False
+            job['deadline'] = time.time() + self.lease_timeout
+            return True
+
+    def complete(self, job_id: str, attempt: int, result: Dict[str, Any]) -> bool:
+        with self.lock:
+            job = self._current(job_id, attempt)
+            if job is None:
+                return False
+            job['state'] = JOB_DONE
+            job['result'] = result
+            return True
+
+    def fail(self, job_id: str, attempt: int, error: str) -> bool:
+        with self.lock:
+            job = self._current(job_id, attempt)
+            if job is None:
+                return False
+            self._retry(job, error)
+            return True
+
+    def finished_locked(self) -> bool:
+        return all(j['state'] in (JOB_DONE, JOB_FAILED) for j in self.jobs.values())
+
+    @property
+    def finished(self) -> bool:
+        with self.lock:
+            self._expire(time.time())
+            return self.finished_locked()
+
+    def abandon(self, error: str) -> None:
+        # Nobody is left to run the remaining jobs (e.g. every local worker exited)
+        with self.lock:
+            for job in self.jobs.values():
+                if job['state'] in (JOB_PENDING, JOB_LEASED):
+                    job['errors'].append(error)
+                    job['state'] = JOB_FAILED
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            counts = {JOB_PENDING: 0, JOB_LEASED: 0, JOB_DONE: 0, JOB_FAILED: 0}
+            for job in self.jobs.values():
+                counts[job['state']] += 1
+            return {'jobs': len(self.jobs), 'workers': len(self.workers), **counts}
+
+    def results(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [dict(self.jobs[i]) for i in self.order]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: 'Coordinator'
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - BaseHTTPRequestHandler signature
+        pass
+
+    def _reply(self, code: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorised(self) -> bool:
+        token = self.server.token
+        if token and self.headers.get(TOKEN_HEADER) != token:
+            self._reply(403, {'error': 'bad token'})
+            return False
+        return True
+
+    def do_GET(self) -> None:
+        if not self._authorised():
+            return
+        if self.path == '/status':
+            self._reply(200, self.server.queue.status())
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def do_POST(self) -> None:
+        if not self._authorised():
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except (ValueError, json.JSONDecodeError):
+            self._reply(400, {'error': 'invalid JSON'})
+            return
+        queue = self.server.queue
+        if self.path == '/lease':
+            self._reply(200, queue.lease(str(body.get('worker') or self.client_address[0])))
+        elif self.path == '/heartbeat':
+            self._reply(200, {'ok': queue.heartbeat(str(body.get('id')), int(body.get('attempt') or 0))})
+        elif self.path == '/complete':
+            self._reply(200, {'ok': queue.complete(str(body.get('id')), int(body.get('attempt') or 0),
+                                                   body.get('result') or {})})
+        elif self.path == '/fail':
+            self._reply(200, {'ok': queue.fail(str(body.get('id')), int(body.get('attempt') or 0),
+                                               str(body.get('error') or 'failed'))})
+        else:
+            self._reply(404, {'error': 'not found'})
+
+
+class Coordinator(ThreadingHTTPServer):
+    # Job queue served over plain HTTP/JSON (stdlib only):
+    #   POST /lease {worker} -> {job} | {wait} | {done}
+    #   POST /heartbeat|/complete|/fail {id, attempt, ...}
+    #   GET  /status
+    daemon_threads = True
+
+    def __init__(self, queue: JobQueue, host: str = '127.0.0.1', port: int = 0, token: Optional[str] = None) -> None:
+        super().__init__((host, port), _Handler)
+        self.queue = queue
+        self.token = token
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        if host in ('0.0.0.0', '::', ''):
+            host = '127.0.0.1'
+        return f'http://{host}:{port}'
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.serve_forever, name='coordinator', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class WorkerClient:
+    # Lease/heartbeat/report loop against a Coordinator. `process` runs one
+    # job and returns its result dict; exceptions are reported as failures
+    # and the job is retried elsewhere.
+    def __init__(self, url: str, worker_id: Optional[str] = None, token: Optional[str] = None,
+                 poll_interval: float = 1.0, connect_timeout: float = 30.0) -> None:
+        self.url = url.rstrip('/')
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.token = token
+        self.poll_interval = poll_interval
+        self.connect_timeout = connect_timeout
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        req = urllib.request.Request(self.url + path, data=json.dumps(payload).encode('utf-8'), method='POST',
+                                     headers={'Content-Type': 'application/json'})
+        if self.token:
+            req.add_header(TOKEN_HEADER, self.token)
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return json.loads(resp.read() or b'{}')
+
+    def _call(self, path: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Retries connection errors until connect_timeout: the coordinator may
+        # still be starting, or already gone once all jobs are done
+        deadline = time.time() + self.connect_timeout
+        while True:
+            try:
+                return self._post(path, payload)
+            except urllib.error.HTTPError:
+                raise
+            except (urllib.error.URLError, OSError):
+                if time.time() >= deadline:
+                    return None
+                time.sleep(self.poll_interval)
+
+    def run(self, process: Callable[[Dict[str, Any]], Dict[str, Any]],
+            on_job: Optional[Callable[[Dict[str, Any], Optional[str]], None]] = None) -> int:
+        done = 0
+        while True:
+            reply = self._call('/lease', {'worker': self.worker_id})
+            if reply is None or reply.get('done'):
+                return done
+            if reply.get('wait'):
+                time.sleep(self.poll_interval)
+                continue
+            job = reply['job']
+            ref = {'id': job['id'], 'attempt': job['attempt']}
+            stop = threading.Event()
+            beat = threading.Thread(target=self._heartbeat, args=(ref, float(reply.get('lease_timeout') or 120), stop),
+                                    name='heartbeat', daemon=True)
+            beat.start()
+            error = None
+            result: Dict[str, Any] = {}
+            try:
+                result = process(job)
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+            finally:
+                stop.set()
+                beat.join()
+            if error is None:
+                self._call('/complete', {**ref, 'result': result})
+                done += 1
+            else:
+                self._call('/fail', {**ref, 'error': error})
+            if on_job is not None:
+                on_job(job, error)
+
+    def _heartbeat(self, ref: Dict[str, Any], lease_timeout: float, stop: threading.Event) -> None:
+        while not stop.wait(max(1.0, lease_timeout / 3)):
+            try:
+                self._post('/heartbeat', ref)
+            except Exception:
+                pass
@@ -0,0 +1,124 @@
+import re
+import json
+import sqlite3
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from .filters import DSL_SPLIT, parse_clause
+
+# DSL field names that resolve to an events column, as they resolve to a
+# top-level event key in EventFilter._get_field; anything else is EventData
+EVENT_FIELDS = ('timestamp', 'channel', 'event_id', 'computer', 'provider', 'record_id', 'user_sid', 'source')
+INDEXED_FIELDS = ('timestamp', 'channel', 'event_id')
+# EventData as JSON text: stored data_json, else decompressed (--compress-data)
+# or re-decoded from the source record (--store-pointers) by event_data()
+DATA_EXPR = 'COALESCE(data_json, event_data(data_zstd, data_dict, ptr_path, ptr_chunk, ptr_record))'
+# What free-text `q` searches: compressed payloads are decompressed in
+# process, but pointer rows only offer their promoted fields (hot_json), so a
+# search never re-reads the evidence
+SEARCH_EXPR = ('COALESCE(data_json, CASE WHEN data_zstd IS NOT NULL '
+               'THEN event_data(data_zstd, data_dict, NULL, NULL, NULL) END, hot_json)')
+
+
+@lru_cache(maxsize=256)
+def _regex(pattern: str) -> Optional[Any]:
+    try:
+        return re.compile(pattern, flags=re.IGNORECASE)
+    except re.error:
+        return None
+
+
+def _dsl_search(pattern: str, value: str) -> Optional[int]:
+    # 1/0 for a (case-insensitive) re.search hit/miss, NULL for an invalid
+    # pattern, which ~= treats as no match and !~ as a match (like EventFilter)
+    rx = _regex(pattern)
+    if rx is None:
+        return None
+    return 1 if rx.search(value or '') else 0
+
+
+def register_functions(conn: sqlite3.Connection, db_path: str) -> None:
+    # SQL functions compiled DSL queries rely on; cheap, done per connection
+    def event_data(blob: Any, dict_id: Any, ptr_path: Any, ptr_chunk: Any, ptr_record: Any) -> Optional[str]:
+        from .payload_codec import load_payload
+        from .pointers import resolve_data
+        item = {'data_zstd': blob, 'data_dict': dict_id, 'ptr_path': ptr_path, 'ptr_chunk': ptr_chunk,
+                'ptr_record': ptr_record}
+        load_payload(item, db_path)
+        if item.get('data_json') is not None:
+            return item['data_json']
+        resolve_data(item)
+        return json.dumps(item['data']) if item.get('data') is not None else None
+
+    conn.create_function('dsl_search', 2, _dsl_search, deterministic=True)
+    # Not deterministic: pointer rows are re-read from their source files
+    conn.create_function('event_data', 5, event_data)
+
+
+def _target(field: str, columns: Dict[str, str]) -> Tuple[str, List[Any], str]:
+    # (SQL for str(value) with None as '', its params, where it comes from)
+    if field in EVENT_FIELDS:
+        return f"COALESCE({field}, '')", [], 'column'
+    if field in columns:
+        return f"COALESCE({columns[field]}, '')", [], 'generated'
+    return f"COALESCE(CAST(json_extract({DATA_EXPR}, ?) AS TEXT), '')", ['$."' + field.replace('"', '\\"') + '"'], \
+        'event_data'
+
+
+def compile_clause(clause: str, columns: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    # One `field OP value` clause as a parameterized SQL predicate with the
+    # same result as EventFilter._eval_clause
+    parsed = parse_clause(clause)
+    if parsed is None:
+        return {'clause': clause, 'sql': '0', 'params': [], 'target': None, 'pushdown': 'constant (unparsed clause)'}
+    return compile_condition(*parsed, columns=columns, clause=clause)
+
+
+def compile_condition(field: str, op: str, value: str, columns: Optional[Dict[str, str]] = None,
+                      clause: Optional[str] = None) -> Dict[str, Any]:
+    # Also used for the API's per-field equality filters
+    columns = columns or {}
+    expr, params, target = _target(field, columns)
+    pushdown = 'sql'
+    if op == '==' and value != '' and target in ('column', 'generated'):
+        # Plain equality so SQLite can seek an index on the column
+        col = field if target == 'column' else columns[field]
+        sql, params = f'{col} = ?', [value]
+        pushdown = 'index' if target == 'generated' or field in INDEXED_FIELDS else 'sql'
+    elif op == '==':
+        sql, params = f'{expr} = ?', params + [value]
+    elif op == '!=':
+        sql, params = f'{expr} != ?', params + [value]
+    elif op == 'contains':
+        sql, params = f'instr({expr}, ?) > 0', params + [value]
+    elif op == '!contains':
+        sql, params = f'instr({expr}, ?) = 0', params + [value]
+    else:
+        # Python's regex flavour has no SQLite equivalent: run re.search as a
+        # SQL function, still inside the query
+        want = 1 if op == '~=' else 0
+        sql, params = f'COALESCE(dsl_search(?, {expr}), 0) = {want}', [value] + params
+        pushdown = 'sql function (python re)'
+    if target == 'event_data' and pushdown == 'sql':
+        pushdown = 'sql (json_extract)'
+    return {'clause': clause or f'{field}{op}{value}', 'field': field, 'op': op, 'value': value, 'target': target,
+            'sql': sql, 'params': params, 'pushdown': pushdown}
+
+
+def compile_dsl(dsl: str, columns: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    # Whole DSL as one predicate. AND/OR fold left to right without
+    # precedence, exactly like EventFilter._match_dsl, so every step nests.
+    # `columns` maps EventData fields to indexed columns that hold them.
+    sql = None
+    params: List[Any] = []
+    clauses = []
+    op = None
+    for tok in DSL_SPLIT.split(dsl):
+        if tok in ('AND', 'OR'):
+            op = tok
+            continue
+        c = compile_clause(tok.strip(), columns)
+        clauses.append(c)
+        sql = c['sql'] if sql is None else f"({sql} {op} {c['sql']})"
+        params += c['params']
+    return {'sql': f'({sql})', 'params': params, 'clauses': clauses}
@@ -0,0 +1,276 @@
+import os
+import mmap
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import orjson
+
+from .reader import CHUNK_SIZE
+
+# Bump when the columns or the way events are normalized change, so stale
+# cache files are never read back
+EVENT_CACHE_VERSION = 2
+BATCH_ROWS = 8192
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+HEADER_FIELDS = ('timestamp', 'channel', 'event_id', 'computer', 'provider', 'record_id', 'user_sid')
+FILE_HEADER = 0x1000
+CHUNK_HEADER = 0x200
+
+
+def _schema() -> Any:
+    import pyarrow as pa
+    return pa.schema([pa.field(f, pa.string()) for f in HEADER_FIELDS] + [
+        pa.field('timestamp_us', pa.int64()),
+        # Record location for pointer storage (see pointers.py)
+        pa.field('ptr_chunk', pa.int64()),
+        pa.field('ptr_record', pa.int64()),
+        pa.field('data', pa.binary()),
+        pa.field('raw', pa.binary()),
+        # Whole event as JSON when a header value is not a plain string
+        pa.field('event', pa.binary()),
+    ])
+
+
+def _fingerprint_buffer(h: Any, buf: Any, size: int) -> None:
+    # The file header plus every chunk header: chunk headers carry CRC32s of
+    # their event records, so this tracks content without hashing every byte
+    h.update(buf[:FILE_HEADER])
+    ofs = FILE_HEADER
+    while ofs + CHUNK_HEADER <= size:
+        h.update(buf[ofs:ofs + CHUNK_HEADER])
+        ofs += CHUNK_SIZE
+
+
+def fingerprint_source(src: Any) -> Optional[str]:
+    # Content key of an EvtxSource (file on disk or in-memory archive member);
+    # the same log copied elsewhere or extracted from an archive hits the same entry
+    h = hashlib.blake2b(f'v{EVENT_CACHE_VERSION}'.encode(), digest_size=16)
+    if src.data is not None:
+        size = len(src.data)
+        h.update(str(size).encode())
+        _fingerprint_buffer(h, memoryview(src.data), size)
+    else:
+        try:
+            size = os.path.getsize(src.path)
+            if size == 0:
+                return None
+            with open(src.path, 'rb') as fh:
+                buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    h.update(str(size).encode())
+                    _fingerprint_buffer(h, buf, size)
+                finally:
+                    buf.close()
+        except (OSError, ValueError):
+            return None
+    if getattr(src, 'chunks', None) is not None:
+        h.update(f'chunks:{src.chunks[0]}:{src.chunks[1]}'.encode())
+    return h.hexdigest()
+
+
+def _to_us(dt: Optional[datetime]) -> Optional[int]:
+    if dt is None:
+        return None
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_us(us: Optional[int]) -> Optional[datetime]:
+    if us is None:
+        return None
+    return EPOCH + timedelta(microseconds=us)
+
+
+class _Writer:
+    # Appends normalized events to <path>.<pid>.tmp as Arrow IPC record
+    # batches; commit() moves it into place, abort() drops it
+    def __init__(self, path: str) -> None:
+        import pyarrow as pa
+        self.pa = pa
+        self.path = path
+        self.tmp = f'{path}.{os.getpid()}.tmp'
+        self.schema = _schema()
+        self.sink = pa.OSFile(self.tmp, 'wb')
+        self.writer = pa.ipc.new_file(self.sink, self.schema)
+        self.rows: Dict[str, List[Any]] = {f: [] for f in self.schema.names}
+        self.count = 0
+
+    def add(self, evt: Dict[str, Any]) -> None:
+        rows = self.rows
+        headers = [evt.get(f) for f in HEADER_FIELDS]
+        rows['timestamp_us'].append(_to_us(evt.get('timestamp_dt')))
+        ptr = evt.get('record_ptr')
+        rows['ptr_chunk'].append(ptr[0] if ptr else None)
+        rows['ptr_record'].append(ptr[1] if ptr else None)
+        if all(v is None or isinstance(v, str) for v in headers):
+            for f, v in zip(HEADER_FIELDS, headers):
+                rows[f].append(v)
+            rows['data'].append(orjson.dumps(evt.get('data')))
+            rows['raw'].append(orjson.dumps(evt.get('raw')))
+            rows['event'].append(None)
+        else:
+            for f in HEADER_FIELDS:
+                rows[f].append(None)
+            rows['data'].append(None)
+            rows['raw'].append(None)
+            rows['event'].append(orjson.dumps({k: v for k, v in evt.items() if k not in ('timestamp_dt', 'record_ptr')}))
+        self.count += 1
+        if len(rows['timestamp_us']) >= BATCH_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self.rows['timestamp_us']:
+            return
+        self.writer.write_batch(self.pa.record_batch(
+            [self.pa.array(self.rows[f], type=self.schema.field(f).type) for f in self.schema.names],
+            schema=self.schema))
+        for values in self.rows.values():
+            values.clear()
+
+    def commit(self) -> None:
+        self._flush()
+        self.writer.close()
+        self.sink.close()
+        os.replace(self.tmp, self.path)
+
+    def abort(self) -> None:
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+        self.sink.close()
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
+
+
+class EventCache:
+    # Parse-once cache of normalized events (normalize_event output, before
+    # filtering and mapping) in Arrow IPC files keyed by fingerprint_source().
+    # Later runs memory-map the file and rebuild events from it instead of
+    # decoding EVTX/XML again; filters, maps and rules can change freely
+    # between runs without invalidating it.
+    def __init__(self, cache_dir: str, rebuild: bool = False) -> None:
+        self.cache_dir = cache_dir
+        self.rebuild = rebuild
+        self.hits = 0
+        self.written = 0
+        self.events_read = 0
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'events-v{EVENT_CACHE_VERSION}-{key}.arrow')
+
+    def events(self, src: Any, decode: Callable[[], Iterable[Dict[str, Any]]],
+               prefilter: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Iterator[Dict[str, Any]]:
+        # Events of `src` from the cache, or from decode() while writing the
+        # cache entry. `prefilter` sees only channel, event_id and
+        # timestamp_dt, so rows it rejects are never JSON-decoded; callers
+        # still apply their full filter to what comes back.
+        key = fingerprint_source(src)
+        if key is None:
+            yield from decode()
+            return
+        path = self.path_for(key)
+        if not self.rebuild and os.path.exists(path):
+            import pyarrow as pa
+            try:
+                source = pa.memory_map(path, 'r')
+                reader = pa.ipc.open_file(source)
+            except (OSError, pa.ArrowException):
+                reader = None
+            if reader is not None and reader.schema.equals(_schema()):
+                self.hits += 1
+                try:
+                    for i in range(reader.num_record_batches):
+                        yield from self._rows(reader.get_batch(i), prefilter)
+                finally:
+                    source.close()
+                return
+        yield from self._write(path, decode())
+
+    def _write(self, path: str, events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        writer = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            writer = _Writer(path)
+        except OSError:
+            pass
+        done = False
+        try:
+            for evt in events:
+                if writer is not None:
+                    try:
+                        writer.add(evt)
+                    except Exception:
+                        # e.g. cache disk full: keep parsing, just stop caching
+                        writer.abort()
+                        writer = None
+                yield evt
+            done = True
+        finally:
+            # A consumer that stops early (or an error) leaves no partial entry
+            if writer is not None:
+                if done:
+                    try:
+                        writer.commit()
+                        self.written += 1
+                    except Exception:
+                        writer.abort()
+                else:
+                    writer.abort()
+
+    def _rows(self, batch: Any, prefilter: Optional[Callable[[Dict[str, Any]], bool]]) -> Iterator[Dict[str, Any]]:
+        n = batch.num_rows
+        cols = {f: batch.column(f).to_pylist() for f in HEADER_FIELDS}
+        ts_us = batch.column('timestamp_us').to_pylist()
+        ptr_chunks = batch.column('ptr_chunk').to_pylist()
+        ptr_records = batch.column('ptr_record').to_pylist()
+        full = batch.column('event')
+        has_full = full.null_count < n
+        full_valid = full.is_valid().to_pylist() if has_full else None
+        channels = cols['channel']
+        event_ids = cols['event_id']
+        keep = []
+        dts: List[Optional[datetime]] = []
+        for i in range(n):
+            dt = _from_us(ts_us[i])
+            if prefilter is None or (has_full and full_valid[i]) or \
+                    prefilter({'channel': channels[i], 'event_id': event_ids[i], 'timestamp_dt': dt}):
+                keep.append(i)
+                dts.append(dt)
+        if not keep:
+            return
+        if len(keep) == n:
+            picked = batch
+        else:
+            import pyarrow as pa
+            picked = batch.take(pa.array(keep, type=pa.int32()))
+        datas = picked.column('data').to_pylist()
+        raws = picked.column('raw').to_pylist()
+        fulls = picked.column('event').to_pylist() if has_full else None
+        loads = orjson.loads
+        self.events_read += len(keep)
+        for j, i in enumerate(keep):
+            if fulls is not None and fulls[j] is not None:
+                evt = loads(fulls[j])
+                evt = {'timestamp': evt.pop('timestamp', None), 'timestamp_dt': dts[j], **evt}
+            else:
+                evt = {
+                    'timestamp': cols['timestamp'][i],
+                    'timestamp_dt': dts[j],
+                    'channel': channels[i],
+                    'event_id': event_ids[i],
+                    'computer': cols['computer'][i],
+                    'provider': cols['provider'][i],
+                    'record_id': cols['record_id'][i],
+                    'user_sid': cols['user_sid'][i],
+                    'data': loads(datas[j]),
+                    'raw': loads(raws[j]),
+                }
+            if ptr_chunks[i] is not None:
+                evt['record_ptr'] = (ptr_chunks[i], ptr_records[i])
+            yield evt
+
+    def summary(self) -> str:
+        return f"Event cache: {self.hits} hits, {self.written} written, {self.events_read} events read"
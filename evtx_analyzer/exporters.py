@@ -2,13 +2,16 @@ import csv
 import orjson
 from typing import Dict, Optional, List
 
+# In-memory only event keys: the parsed datetime and the storage pointer
+INTERNAL_KEYS = ('timestamp_dt', 'record_ptr')
+
 
 class JsonlExporter:
     def __init__(self, path: str) -> None:
         self.f = open(path, 'wb')
 
     def write(self, evt: Dict) -> None:
-        data = {k: v for k, v in evt.items() if k != 'timestamp_dt'}
+        data = {k: v for k, v in evt.items() if k not in INTERNAL_KEYS}
         self.f.write(orjson.dumps(data))
         self.f.write(b"\n")
 
@@ -22,9 +25,9 @@ class CsvExporter:
         self.writer = None
 
     def write(self, evt: Dict) -> None:
-        data = {k: v for k, v in evt.items() if k != 'timestamp_dt'}
+        data = {k: v for k, v in evt.items() if k not in INTERNAL_KEYS}
         if self.writer is None:
-            fieldnames = ['timestamp', 'channel', 'event_id', 'computer', 'provider', 'record_id', 'user_sid', 'data']
+            fieldnames = ['timestamp', 'channel', 'event_id', 'computer', 'provider', 'record_id', 'user_sid', 'data', 'source']
             self.writer = csv.DictWriter(self.f, fieldnames=fieldnames)
             self.writer.writeheader()
         row = {
@@ -35,7 +38,8 @@ class CsvExporter:
             'provider': data.get('provider'),
             'record_id': data.get('record_id'),
             'user_sid': data.get('user_sid'),
-            'data': orjson.dumps(data.get('data')).decode('utf-8') if data.get('data') is not None else ''
+            'data': orjson.dumps(data.get('data')).decode('utf-8') if data.get('data') is not None else '',
+            'source': data.get('source'),
         }
         self.writer.writerow(row)
 
@@ -44,15 +48,19 @@ class CsvExporter:
 
 
 class ParquetExporter:
-    def __init__(self, path: str, batch_size: int = 5000) -> None:
+    def __init__(self, path: str, batch_size: int = 5000, compression: Optional[str] = None) -> None:
         import pyarrow as pa
         import pyarrow.parquet as pq
         self.pa = pa
         self.pq = pq
         self.path = path
         self.batch_size = batch_size
+        # Parquet codec (pyarrow default: snappy); zstd with --compress-data
+        self.compression = compression or 'snappy'
         self.rows: List[Dict] = []
+        self.next_id = 1
         self.schema = pa.schema([
+            pa.field('id', pa.int64()),
             pa.field('timestamp', pa.string()),
             pa.field('channel', pa.string()),
             pa.field('event_id', pa.string()),
@@ -61,12 +69,15 @@ class ParquetExporter:
             pa.field('record_id', pa.string()),
             pa.field('user_sid', pa.string()),
             pa.field('data', pa.string()),
+            pa.field('source', pa.string()),
         ])
         self.writer = None
 
     def write(self, evt: Dict) -> None:
-        data = {k: v for k, v in evt.items() if k != 'timestamp_dt'}
+        data = {k: v for k, v in evt.items() if k not in INTERNAL_KEYS}
+        pk = data.get('event_pk')
         row = {
+            'id': pk if pk is not None else self.next_id,
             'timestamp': data.get('timestamp'),
             'channel': data.get('channel'),
             'event_id': str(data.get('event_id')) if data.get('event_id') is not None else None,
@@ -75,7 +86,9 @@ class ParquetExporter:
             'record_id': str(data.get('record_id')) if data.get('record_id') is not None else None,
             'user_sid': data.get('user_sid'),
             'data': orjson.dumps(data.get('data')).decode('utf-8') if data.get('data') is not None else None,
+            'source': data.get('source'),
         }
+        self.next_id += 1
         self.rows.append(row)
         if len(self.rows) >= self.batch_size:
             self._flush()
@@ -85,7 +98,7 @@ class ParquetExporter:
             return
         table = self.pa.Table.from_pylist(self.rows, schema=self.schema)
         if self.writer is None:
-            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+            self.writer = self.pq.ParquetWriter(self.path, table.schema, compression=self.compression)
         self.writer.write_table(table)
         self.rows.clear()
 
@@ -127,3 +140,66 @@ class FindingsCsvExporter:
 
     def close(self) -> None:
         self.f.close()
+
+
+# Parquet schema metadata key holding {rule_id: content hash} of the rule pack
+RULE_HASHES_KEY = b'eventhound.rule_hashes'
+
+
+class FindingsParquetExporter:
+    def __init__(self, path: str, batch_size: int = 5000, rule_hashes: Optional[Dict[str, str]] = None) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.batch_size = batch_size
+        self.rows: List[Dict] = []
+        self.next_id = 1
+        self.schema = pa.schema([
+            pa.field('id', pa.int64()),
+            pa.field('event_timestamp', pa.string()),
+            pa.field('channel', pa.string()),
+            pa.field('event_id', pa.string()),
+            pa.field('rule_id', pa.string()),
+            pa.field('severity', pa.string()),
+            pa.field('description', pa.string()),
+            pa.field('tags', pa.string()),
+            pa.field('event_ref', pa.int64()),
+        ])
+        if rule_hashes is not None:
+            self.schema = self.schema.with_metadata({RULE_HASHES_KEY: orjson.dumps(rule_hashes)})
+        self.writer = None
+
+    def write(self, finding: Dict) -> None:
+        row = {
+            'id': self.next_id,
+            'event_timestamp': finding.get('event_timestamp'),
+            'channel': finding.get('channel'),
+            'event_id': str(finding.get('event_id')) if finding.get('event_id') is not None else None,
+            'rule_id': finding.get('rule_id'),
+            'severity': finding.get('severity'),
+            'description': finding.get('description'),
+            'tags': ','.join(finding.get('tags') or []),
+            'event_ref': finding.get('event_ref'),
+        }
+        self.next_id += 1
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self.rows:
+            return
+        table = self.pa.Table.from_pylist(self.rows, schema=self.schema)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+        self.rows.clear()
+
+    def close(self) -> None:
+        self._flush()
+        if self.writer is None:
+            # Always leave a readable file behind, even with zero findings
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        self.writer.close()
@@ -1,7 +1,22 @@
-from typing import Dict, Set, List, Optional
+from typing import Dict, Set, List, Optional, Tuple
 from datetime import datetime
 import re
 
+# DSL grammar, shared with the SQL compiler in dsl_sql.py:
+# field OP value; multiple clauses with AND/OR, folded left to right
+# OP: ==, !=, contains, !contains, ~= (regex), !~ (neg regex)
+DSL_SPLIT = re.compile(r"\s+(AND|OR)\s+")
+DSL_CLAUSE = re.compile(r"^([^!=~\s]+)\s*(==|!=|~=|!~|contains|!contains)\s*(.+)$")
+
+
+def parse_clause(clause: str) -> Optional[Tuple[str, str, str]]:
+    # (field, op, value), or None for a clause that never matches
+    m = DSL_CLAUSE.match(clause)
+    if not m:
+        return None
+    field, op, value = m.groups()
+    return field, op, value.strip().strip('"\'')
+
 
 class EventFilter:
     def __init__(self, ids_by_channel: Dict[str, Set[str]], custom_ids: List[str],
@@ -15,6 +30,14 @@ class EventFilter:
         self.dsl = dsl
 
     def match(self, evt: Dict) -> bool:
+        if not self.match_header(evt):
+            return False
+        if self.dsl and not self._match_dsl(evt, self.dsl):
+            return False
+        return True
+
+    def match_header(self, evt: Dict) -> bool:
+        # Channel, event id and time window only; needs no EventData
         channel = evt.get('channel') or ''
         event_id = str(evt.get('event_id')) if evt.get('event_id') is not None else ''
         ts = evt.get('timestamp_dt')
@@ -32,9 +55,6 @@ class EventFilter:
         if self.end_ts and (ts is None or ts > self.end_ts):
             return False
 
-        if self.dsl and not self._match_dsl(evt, self.dsl):
-            return False
-
         return True
 
     def _get_field(self, evt: Dict, field: str):
@@ -44,10 +64,8 @@ class EventFilter:
         return data.get(field)
 
     def _match_dsl(self, evt: Dict, dsl: str) -> bool:
-        # Simple grammar: field OP value; multiple clauses with AND/OR
-        # OP: ==, !=, contains, !contains, ~= (regex), !~ (neg regex)
         # Example: channel==Security AND event_id==4624 AND TargetUserName~=^admin
-        tokens = re.split(r"\s+(AND|OR)\s+", dsl)
+        tokens = DSL_SPLIT.split(dsl)
         result = None
         op = None
         for tok in tokens:
@@ -62,11 +80,10 @@ class EventFilter:
         return bool(result)
 
     def _eval_clause(self, evt: Dict, clause: str) -> bool:
-        m = re.match(r"^([^!=~\s]+)\s*(==|!=|~=|!~|contains|!contains)\s*(.+)$", clause)
-        if not m:
+        parsed = parse_clause(clause)
+        if parsed is None:
             return False
-        field, op, value = m.groups()
-        value = value.strip().strip('"\'')
+        field, op, value = parsed
         val = self._get_field(evt, field)
         s = '' if val is None else str(val)
         if op == '==':
@@ -0,0 +1,67 @@
+import json
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+
+class LiveFeed:
+    # Fan-out of ingest progress and new findings to Server-Sent Events
+    # subscribers. Each subscriber gets a bounded queue; a slow browser drops
+    # messages instead of making the parser wait or memory grow.
+    def __init__(self, files_total: int = 0, max_queue: int = 1000, progress_interval: float = 0.5) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: List[queue.Queue] = []
+        self.max_queue = max_queue
+        self.progress_interval = progress_interval
+        self._last_progress = 0.0
+        self.state: Dict[str, Any] = {
+            'events': 0,
+            'findings': 0,
+            'files_done': 0,
+            'files_total': files_total,
+            'done': False,
+        }
+
+    def subscribe(self) -> queue.Queue:
+        q: queue.Queue = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def publish(self, kind: str, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait((kind, payload))
+            except queue.Full:
+                continue
+
+    def update_progress(self, done: bool = False, **counts: Any) -> None:
+        self.state.update(counts)
+        self.state['done'] = done
+        now = time.monotonic()
+        if not done and now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+        self.publish('progress', dict(self.state))
+
+    def stream(self, keepalive_sec: float = 15.0) -> Iterator[str]:
+        q = self.subscribe()
+        try:
+            yield f"event: progress\ndata: {json.dumps(self.state)}\n\n"
+            while True:
+                try:
+                    kind, payload = q.get(timeout=keepalive_sec)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {kind}\ndata: {json.dumps(payload, default=str)}\n\n"
+        finally:
+            self.unsubscribe(q)
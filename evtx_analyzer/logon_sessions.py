@@ -0,0 +1,301 @@
+import sqlite3
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Logon sessions by LogonId: a Security 4624 opens one (TargetLogonId),
+# 4634/4647 end it and 4672 records the special privileges it was given.
+# Every event that carries a SubjectLogonId/TargetLogonId/LogonId goes to
+# session_events (the inverted index) and is tied to its session at the end
+# of ingest: the latest 4624 with that LogonId on the same computer at or
+# before the event (LogonIds are reused after a reboot).
+SECURITY_CHANNEL = 'Security'
+LOGON_FIELDS = ('TargetLogonId', 'SubjectLogonId', 'LogonId')
+# SYSTEM, NETWORK SERVICE and LOCAL SERVICE (and "none") are on most events
+# of a host and never end: not sessions anyone scopes
+SYSTEM_LOGON_IDS = {0x0, 0x3e4, 0x3e5, 0x3e7}
+# 4672 is written just before its 4624 and may carry a slightly earlier time
+START_SLACK_SECONDS = 2
+LOGOFF_EVENTS = ('4634', '4647')
+COLUMNS = ['id', 'logon_ref', 'computer', 'logon_id', 'logon_type', 'user', 'user_sid', 'source_ip', 'source_port',
+           'workstation', 'logon_process', 'auth_package', 'elevated', 'linked_logon_id', 'start_time', 'end_time',
+           'end_ref', 'privileged', 'privileges', 'event_count', 'first_seen', 'last_seen']
+# What serves a session's events in time order; built by resolve_sessions()
+SESSION_INDEX = ('CREATE INDEX IF NOT EXISTS idx_session_events_session '
+                 'ON session_events(session_id, timestamp, event_ref)')
+SESSION_SORT_COLS = {'start_time', 'end_time', 'first_seen', 'last_seen', 'computer', 'user', 'logon_type',
+                     'source_ip', 'event_count'}
+
+
+def init_tables(conn: sqlite3.Connection) -> None:
+    # logon_sessions: one row per 4624, plus one per LogonId seen without
+    # its 4624 (logon_ref NULL, e.g. the logon rolled out of the log)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS logon_sessions (
+            id INTEGER PRIMARY KEY,
+            logon_ref INTEGER UNIQUE,
+            computer TEXT,
+            logon_id TEXT,
+            logon_type INTEGER,
+            user TEXT,
+            user_sid TEXT,
+            source_ip TEXT,
+            source_port TEXT,
+            workstation TEXT,
+            logon_process TEXT,
+            auth_package TEXT,
+            elevated INTEGER,
+            linked_logon_id TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            end_ref INTEGER,
+            privileged INTEGER DEFAULT 0,
+            privileges TEXT,
+            event_count INTEGER DEFAULT 0,
+            first_seen TEXT,
+            last_seen TEXT
+        )
+        """
+    )
+    # role: logon (4624), logoff (4634/4647), privileges (4672) or NULL;
+    # session_id is filled in by resolve_sessions()
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS session_events (
+            computer TEXT,
+            logon_id TEXT,
+            event_ref INTEGER,
+            timestamp TEXT,
+            role TEXT,
+            privileges TEXT,
+            session_id INTEGER
+        )
+        """
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logon_sessions_key ON logon_sessions(computer, logon_id, start_time)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logon_sessions_start ON logon_sessions(start_time)')
+    # The few logon/logoff/privileges entries, for a session's end and privileges
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_session_events_role ON session_events(session_id, role, timestamp) '
+                 'WHERE role IS NOT NULL')
+
+
+@lru_cache(maxsize=65536)
+def _parse_logon_id(text: str) -> Optional[str]:
+    text = text.strip().lower()
+    try:
+        n = int(text, 16) if text.startswith('0x') else int(text)
+    except ValueError:
+        return None
+    if n in SYSTEM_LOGON_IDS:
+        return None
+    return f'0x{n:x}'
+
+
+def parse_logon_id(value: Any) -> Optional[str]:
+    # Canonical 0x-hex LogonId, None for missing/unparsable/system ones
+    # (cached: a host logs the same few LogonIds over and over)
+    if value is None:
+        return None
+    return _parse_logon_id(value if isinstance(value, str) else str(value))
+
+
+def _text(value: Any) -> Optional[str]:
+    # '-' is how Security events write "no value"
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text if text and text != '-' else None
+
+
+def _int(value: Any) -> Optional[int]:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def session_row(evt: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
+    # logon_sessions row (without id) for a Security 4624, else None
+    data = evt.get('data')
+    if str(evt.get('event_id')) != '4624' or evt.get('channel') != SECURITY_CHANNEL or not isinstance(data, dict):
+        return None
+    lid = parse_logon_id(data.get('TargetLogonId'))
+    if lid is None or not evt.get('computer'):
+        return None
+    user = _text(data.get('TargetUserName'))
+    if user and _text(data.get('TargetDomainName')):
+        user = f"{data['TargetDomainName']}\\{user}"
+    elevated = _text(data.get('ElevatedToken'))
+    linked = data.get('TargetLinkedLogonId')
+    return (evt.get('event_pk'), evt['computer'], lid, _int(data.get('LogonType')), user,
+            _text(data.get('TargetUserSid')), _text(data.get('IpAddress')), _text(data.get('IpPort')),
+            _text(data.get('WorkstationName')), _text(data.get('LogonProcessName')),
+            _text(data.get('AuthenticationPackageName')),
+            None if elevated is None else int(elevated in ('%%1842', 'Yes')),
+            parse_logon_id(linked) if linked is not None else None, evt.get('timestamp'))
+
+
+def session_entries(evt: Dict[str, Any]) -> List[Tuple[Any, ...]]:
+    # session_events rows: one per distinct (non-system) LogonId on the event
+    data = evt.get('data')
+    computer = evt.get('computer')
+    if not isinstance(data, dict) or not computer:
+        return []
+    role = privileges = None
+    fields: Tuple[str, ...] = LOGON_FIELDS
+    if evt.get('channel') == SECURITY_CHANNEL:
+        event_id = str(evt.get('event_id'))
+        if event_id == '4624':
+            role = 'logon'
+        elif event_id in LOGOFF_EVENTS:
+            role, fields = 'logoff', ('TargetLogonId',)
+        elif event_id == '4672':
+            role, fields = 'privileges', ('SubjectLogonId',)
+            privileges = ' '.join(str(data.get('PrivilegeList') or '').split()) or None
+    out: List[Tuple[Any, ...]] = []
+    seen: List[str] = []
+    for field in fields:
+        value = data.get(field)
+        if value is None:
+            continue
+        lid = parse_logon_id(value)
+        if lid is None or lid in seen:
+            continue
+        seen.append(lid)
+        # A 4624 only opens the target session; in the subject's it is activity
+        entry_role = role if role != 'logon' or field == 'TargetLogonId' else None
+        out.append((computer, lid, evt.get('event_pk'), evt.get('timestamp'), entry_role,
+                    privileges if entry_role else None))
+    return out
+
+
+def insert_sessions(conn: sqlite3.Connection, events: List[Dict[str, Any]]) -> None:
+    sessions = [r for r in (session_row(e) for e in events) if r is not None]
+    if sessions:
+        conn.executemany('INSERT OR IGNORE INTO logon_sessions (logon_ref, computer, logon_id, logon_type, user, '
+                         'user_sid, source_ip, source_port, workstation, logon_process, auth_package, elevated, '
+                         'linked_logon_id, start_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', sessions)
+    entries = [r for e in events for r in session_entries(e)]
+    if entries:
+        conn.executemany('INSERT INTO session_events (computer, logon_id, event_ref, timestamp, role, privileges) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', entries)
+
+
+def resolve_sessions(conn: sqlite3.Connection) -> None:
+    # Only entries without a session are looked at, so a later run into the
+    # same database adds to the sessions already there. Entries are only
+    # appended, so those are the rowids from the first unresolved one on.
+    # (Partial sessions have no start_time, so the start_time tests skip
+    # them off the key index alone; `+s.logon_ref` and NOT INDEXED keep
+    # SQLite on that index and on a plain rowid range.)
+    row = conn.execute('SELECT MIN(rowid) FROM session_events WHERE session_id IS NULL').fetchone()
+    if row[0] is None:
+        conn.execute(SESSION_INDEX)
+        return
+    first = row[0]
+    # One transaction (DDL included): building the session index once beats
+    # updating it for every entry (about 5x on a million), and readers never
+    # see the database without it
+    conn.execute('SAVEPOINT resolve_sessions')
+    conn.execute('DROP INDEX IF EXISTS idx_session_events_session')
+    # A session starting just after the event (its 4672) wins over an older
+    # one with the same LogonId: that one must have ended by then
+    conn.execute(
+        f"""
+        UPDATE session_events SET session_id = COALESCE(
+            (SELECT s.id FROM logon_sessions s
+             WHERE s.computer = session_events.computer AND s.logon_id = session_events.logon_id
+               AND s.start_time > session_events.timestamp
+               AND julianday(s.start_time) - julianday(session_events.timestamp) <= {START_SLACK_SECONDS} / 86400.0
+             ORDER BY s.start_time LIMIT 1),
+            (SELECT s.id FROM logon_sessions s
+             WHERE s.computer = session_events.computer AND s.logon_id = session_events.logon_id
+               AND s.start_time <= session_events.timestamp
+             ORDER BY s.start_time DESC LIMIT 1))
+        WHERE rowid >= ? AND session_id IS NULL
+        """, (first,)
+    )
+    # Activity of a LogonId whose 4624 is not in the data: one partial
+    # session per computer and LogonId
+    conn.execute(
+        """
+        INSERT INTO logon_sessions (computer, logon_id)
+        SELECT DISTINCT e.computer, e.logon_id FROM session_events e NOT INDEXED
+        WHERE e.rowid >= ? AND e.session_id IS NULL AND NOT EXISTS (
+            SELECT 1 FROM logon_sessions s
+            WHERE s.computer = e.computer AND s.logon_id = e.logon_id AND +s.logon_ref IS NULL)
+        """, (first,)
+    )
+    conn.execute(
+        """
+        UPDATE session_events SET session_id = (
+            SELECT s.id FROM logon_sessions s
+            WHERE s.computer = session_events.computer AND s.logon_id = session_events.logon_id
+              AND +s.logon_ref IS NULL ORDER BY s.id LIMIT 1)
+        WHERE rowid >= ? AND session_id IS NULL
+        """, (first,)
+    )
+    conn.execute(SESSION_INDEX)
+    conn.execute(
+        """
+        UPDATE logon_sessions SET
+            (event_count, first_seen, last_seen) = (
+                SELECT COUNT(*), MIN(x.timestamp), MAX(x.timestamp) FROM session_events x
+                WHERE x.session_id = logon_sessions.id),
+            (end_time, end_ref) = (
+                SELECT MAX(x.timestamp), x.event_ref FROM session_events x
+                WHERE x.session_id = logon_sessions.id AND x.role = 'logoff'),
+            (privileged, privileges) = (
+                SELECT COUNT(*) > 0, MAX(x.privileges) FROM session_events x
+                WHERE x.session_id = logon_sessions.id AND x.role = 'privileges')
+        WHERE id IN (SELECT e.session_id FROM session_events e WHERE e.rowid >= ?)
+        """, (first,)
+    )
+    conn.execute('RELEASE resolve_sessions')
+
+
+def sessions_where(computer: Optional[str] = None, user: Optional[str] = None, logon_type: Optional[int] = None,
+                   source_ip: Optional[str] = None, logon_id: Optional[str] = None,
+                   privileged: Optional[bool] = None, since: Optional[str] = None,
+                   until: Optional[str] = None) -> Tuple[str, List[Any]]:
+    # `since`/`until` select sessions overlapping the window; `user` is a
+    # case-insensitive substring of DOMAIN\user
+    clauses: List[str] = []
+    params: List[Any] = []
+    if computer:
+        clauses.append('computer = ?')
+        params.append(computer)
+    if user:
+        clauses.append('instr(lower(user), lower(?)) > 0')
+        params.append(user)
+    if logon_type is not None:
+        clauses.append('logon_type = ?')
+        params.append(logon_type)
+    if source_ip:
+        clauses.append('source_ip = ?')
+        params.append(source_ip)
+    if logon_id:
+        clauses.append('logon_id = ?')
+        params.append(parse_logon_id(logon_id) or logon_id)
+    if privileged is not None:
+        clauses.append('privileged = ?')
+        params.append(int(privileged))
+    if since:
+        clauses.append('COALESCE(end_time, last_seen, start_time) >= ?')
+        params.append(since)
+    if until:
+        clauses.append('COALESCE(start_time, first_seen) <= ?')
+        params.append(until)
+    return ('WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+def get_session(conn: sqlite3.Connection, session_id: int) -> Optional[Dict[str, Any]]:
+    row = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM logon_sessions WHERE id = ?", (session_id,)).fetchone()
+    return dict(zip(COLUMNS, row)) if row else None
+
+
+def session_event_refs(conn: sqlite3.Connection, session_id: int, limit: int,
+                       offset: int = 0) -> List[Tuple[int, Optional[str], Optional[str]]]:
+    # (event_ref, timestamp, role) of a session in time order, one index range
+    return conn.execute('SELECT event_ref, timestamp, role FROM session_events WHERE session_id = ? '
+                        'ORDER BY timestamp, event_ref LIMIT ? OFFSET ?', (session_id, limit, offset)).fetchall()
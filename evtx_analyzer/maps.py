@@ -1,9 +1,7 @@
 import os
 import json
 import time
-import yaml
-import requests
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 
 DEFAULT_MAPS_DIR = os.path.join(os.getcwd(), 'maps')
 
@@ -12,12 +10,26 @@ class EventMapper:
     def __init__(self, maps_dir: Optional[str] = None) -> None:
         self.maps_dir = maps_dir or DEFAULT_MAPS_DIR
         self.maps: Dict[str, Dict[str, Any]] = {}
+        self.from_cache = False
 
-    def load_local(self) -> int:
+    def load_local(self, use_cache: bool = True, cache_dir: Optional[str] = None, rebuild_cache: bool = False) -> int:
         os.makedirs(self.maps_dir, exist_ok=True)
+        if use_cache:
+            from .cache import load_or_build
+            (maps, count), self.from_cache = load_or_build(
+                'maps', self.maps_dir, ('.yml', '.yaml'), self._read_dir,
+                cache_dir=cache_dir, rebuild=rebuild_cache)
+        else:
+            maps, count = self._read_dir()
+        self.maps.update(maps)
+        return count
+
+    def _read_dir(self) -> Tuple[Dict[str, Dict[str, Any]], int]:
+        import yaml
+        maps: Dict[str, Dict[str, Any]] = {}
         count = 0
         for root, _dirs, files in os.walk(self.maps_dir):
-            for f in files:
+            for f in sorted(files):
                 if not f.lower().endswith(('.yml', '.yaml')):
                     continue
                 path = os.path.join(root, f)
@@ -27,13 +39,15 @@ class EventMapper:
                         if isinstance(data, dict):
                             for key, value in data.items():
                                 # key format: "Channel:EventID" or just "EventID"
-                                self.maps[str(key)] = value or {}
+                                maps[str(key)] = value or {}
                             count += 1
                 except Exception:
                     continue
-        return count
+        return maps, count
 
     def sync_remote(self, url: str, timeout_sec: int = 20) -> bool:
+        import yaml
+        import requests
         try:
             r = requests.get(url, timeout=timeout_sec)
             r.raise_for_status()
@@ -0,0 +1,181 @@
+import os
+import json
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from .storage import EVENT_SORT_COLS, FINDING_SORT_COLS
+
+
+def _and(expr: Optional[ds.Expression], other: ds.Expression) -> ds.Expression:
+    return other if expr is None else expr & other
+
+
+def _like_any(fields: List[str], q: str) -> ds.Expression:
+    # Case-insensitive substring match, mirroring SQLite LIKE '%q%'
+    expr = None
+    for f in fields:
+        m = pc.match_substring(ds.field(f), pattern=q, ignore_case=True)
+        expr = m if expr is None else expr | m
+    return expr
+
+
+def _decode_data(row: Dict[str, Any]) -> Dict[str, Any]:
+    raw = row.get('data')
+    row['data_json'] = raw
+    try:
+        row['data'] = json.loads(raw) if isinstance(raw, str) else None
+    except Exception:
+        row['data'] = None
+    return row
+
+
+# Serves the web API straight from the Parquet outputs. Filters on channel,
+# event_id and timestamp are pushed down into the dataset scan, so row groups
+# whose statistics cannot match are skipped without being decoded.
+class ParquetStore:
+    def __init__(self, events_path: str, findings_path: Optional[str] = None) -> None:
+        self.events_path = events_path
+        self.findings_path = findings_path
+
+    def _dataset(self, path: Optional[str]) -> Optional[ds.Dataset]:
+        if not path or not os.path.exists(path):
+            return None
+        return ds.dataset(path, format='parquet')
+
+    def indexed_fields(self) -> Dict[str, str]:
+        # EventData field columns are a SQLite feature (--index-fields)
+        return {}
+
+    def event_filter(self, q: Optional[str] = None, channel: Optional[str] = None, event_id: Optional[str] = None,
+                     since: Optional[str] = None, until: Optional[str] = None,
+                     dsl: Optional[str] = None, fields: Optional[Dict[str, str]] = None) -> Optional[ds.Expression]:
+        # `dsl` is only compiled for SQLite; the server rejects it up front
+        expr = None
+        if channel:
+            expr = _and(expr, ds.field('channel') == channel)
+        if event_id:
+            expr = _and(expr, ds.field('event_id') == str(event_id))
+        if since:
+            expr = _and(expr, ds.field('timestamp') >= since)
+        if until:
+            expr = _and(expr, ds.field('timestamp') <= until)
+        if q:
+            expr = _and(expr, _like_any(['data', 'computer', 'provider', 'user_sid'], q))
+        return expr
+
+    def finding_filter(self, q: Optional[str] = None, rule_id: Optional[str] = None, severity: Optional[str] = None,
+                       channel: Optional[str] = None, event_id: Optional[str] = None) -> Optional[ds.Expression]:
+        expr = None
+        if rule_id:
+            expr = _and(expr, ds.field('rule_id') == rule_id)
+        if severity:
+            expr = _and(expr, ds.field('severity') == severity)
+        if channel:
+            expr = _and(expr, ds.field('channel') == channel)
+        if event_id:
+            expr = _and(expr, ds.field('event_id') == str(event_id))
+        if q:
+            expr = _and(expr, _like_any(['description', 'tags', 'rule_id'], q))
+        return expr
+
+    def _page(self, dataset: Optional[ds.Dataset], expr: Optional[ds.Expression], sort_by: str, sort_dir: str,
+              limit: int, offset: int) -> Dict[str, Any]:
+        if dataset is None:
+            return {"items": [], "total": 0}
+        order = 'ascending' if str(sort_dir).lower() == 'asc' else 'descending'
+        sort_keys = [(sort_by, order), ('id', 'ascending')]
+        k = offset + limit
+        # Streaming top-k: only offset+limit rows are ever held in memory
+        best: Optional[pa.Table] = None
+        for batch in dataset.to_batches(filter=expr):
+            if batch.num_rows == 0:
+                continue
+            cand = pa.Table.from_batches([batch])
+            if best is not None:
+                cand = pa.concat_tables([best, cand])
+            idx = pc.select_k_unstable(cand, k=min(k, cand.num_rows), sort_keys=sort_keys)
+            best = cand.take(idx)
+        total = dataset.count_rows(filter=expr)
+        if best is None:
+            return {"items": [], "total": total}
+        rows = best.sort_by(sort_keys).slice(offset, limit).to_pylist()
+        return {"items": rows, "total": total}
+
+    def list_events(self, q: Optional[str], channel: Optional[str], event_id: Optional[str],
+                    since: Optional[str], until: Optional[str], limit: int, offset: int,
+                    sort_by: str, sort_dir: str, dsl: Optional[str] = None,
+                    fields: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        if sort_by not in EVENT_SORT_COLS:
+            sort_by = 'timestamp'
+        expr = self.event_filter(q, channel, event_id, since, until)
+        page = self._page(self._dataset(self.events_path), expr, sort_by, sort_dir, limit, offset)
+        page['items'] = [_decode_data(r) for r in page['items']]
+        return page
+
+    def get_event(self, event_pk: int) -> Optional[Dict[str, Any]]:
+        dataset = self._dataset(self.events_path)
+        if dataset is None:
+            return None
+        # ids are assigned in write order, so row-group statistics on id
+        # narrow this down to a single row group
+        rows = dataset.to_table(filter=ds.field('id') == event_pk).slice(0, 1).to_pylist()
+        return _decode_data(rows[0]) if rows else None
+
+    def get_finding_event(self, finding_pk: int) -> Optional[Dict[str, Any]]:
+        # Finding id -> event_ref -> event: two id lookups, no scan by content
+        dataset = self._dataset(self.findings_path)
+        if dataset is None:
+            return None
+        refs = dataset.to_table(columns=['event_ref'], filter=ds.field('id') == finding_pk).column('event_ref')
+        if len(refs) == 0 or not refs[0].is_valid:
+            return None
+        return self.get_event(refs[0].as_py())
+
+    def iter_events(self, expr: Optional[ds.Expression], batch_size: int, sort_by: Optional[str] = None,
+                    sort_dir: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        # Streams in storage order (sort_by/sort_dir are ignored); a global
+        # sort would need the whole result set in memory.
+        dataset = self._dataset(self.events_path)
+        if dataset is None:
+            return
+        for batch in dataset.to_batches(filter=expr, batch_size=batch_size):
+            if batch.num_rows:
+                yield [_decode_data(r) for r in batch.to_pylist()]
+
+    def list_findings(self, q: Optional[str], rule_id: Optional[str], severity: Optional[str],
+                      channel: Optional[str], event_id: Optional[str], limit: int, offset: int,
+                      sort_by: str, sort_dir: str) -> Dict[str, Any]:
+        if sort_by not in FINDING_SORT_COLS:
+            sort_by = 'event_timestamp'
+        expr = self.finding_filter(q, rule_id, severity, channel, event_id)
+        return self._page(self._dataset(self.findings_path), expr, sort_by, sort_dir, limit, offset)
+
+    def _value_counts(self, column: str, transform=None) -> Counter:
+        counts: Counter = Counter()
+        dataset = self._dataset(self.events_path)
+        if dataset is None:
+            return counts
+        for batch in dataset.to_batches(columns=[column]):
+            arr = batch.column(0)
+            if transform is not None:
+                arr = transform(arr)
+            for vc in pc.value_counts(arr).to_pylist():
+                counts[vc['values']] += vc['counts']
+        return counts
+
+    def top_counts(self, column: str, limit: int) -> List[Dict[str, Any]]:
+        counts = self._value_counts(column)
+        return [{"label": k, "value": v} for k, v in counts.most_common(limit)]
+
+    def trend(self, bucket: str) -> List[Dict[str, Any]]:
+        width = 13 if bucket == 'hour' else 10
+        counts = self._value_counts('timestamp', lambda a: pc.utf8_slice_codeunits(a, 0, width))
+        items = []
+        for k in sorted(counts, key=lambda x: (x is not None, x or '')):
+            ts = (k + ':00:00Z' if bucket == 'hour' else k) if k is not None else None
+            items.append({"ts": ts, "value": counts[k]})
+        return items
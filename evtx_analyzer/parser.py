@@ -1,29 +1,52 @@
-from typing import Dict, Iterator
-from Evtx.Evtx import Evtx
+from typing import Dict, Iterator, Optional, Union
 import xmltodict
 from .utils import normalize_event
 from .filters import EventFilter
 from .maps import EventMapper
+from .reader import EvtxReader
+from .archives import EvtxSource
+from .pointers import pointer_path, record_pointer
 
 
-def parse_evtx_file(path: str, event_filter: EventFilter, mapper: EventMapper = None, dedup: bool = False) -> Iterator[Dict]:
-    seen = set()
-    with Evtx(path) as log:
-        for record in log.records():
-            try:
-                xml = record.xml()
-                obj = xmltodict.parse(xml)
-            except Exception:
-                continue
+def _decode(src: EvtxSource, reader: EvtxReader) -> Iterator[Dict]:
+    for record in reader.records_for(src):
+        try:
+            xml = record.xml()
+            obj = xmltodict.parse(xml)
+        except Exception:
+            continue
+        evt = normalize_event(obj, record)
+        evt['record_ptr'] = record_pointer(record)
+        yield evt
+
 
-            evt = normalize_event(obj, record)
-            if event_filter.match(evt):
-                if mapper is not None:
-                    evt = mapper.enrich(evt)
-                if dedup:
-                    # Basic dedup key: channel|event_id|record_id|timestamp
-                    key = f"{evt.get('channel')}|{evt.get('event_id')}|{evt.get('record_id')}|{evt.get('timestamp')}"
-                    if key in seen:
-                        continue
-                    seen.add(key)
-                yield evt
+def parse_evtx_file(path: Union[str, EvtxSource], event_filter: EventFilter, mapper: EventMapper = None,
+                    dedup: bool = False, reader: Optional[EvtxReader] = None, cache=None,
+                    pointers: bool = False) -> Iterator[Dict]:
+    # `cache` is an event_cache.EventCache: normalized events come from (or
+    # are written to) its Arrow file instead of being decoded every run.
+    # With `pointers`, events keep record_ptr = (path, chunk offset, record
+    # offset) so storage can re-decode the record instead of keeping its data.
+    seen = set()
+    reader = reader or EvtxReader()
+    src = path if isinstance(path, EvtxSource) else EvtxSource(path, path=path)
+    if cache is not None:
+        events = cache.events(src, lambda: _decode(src, reader), prefilter=event_filter.match_header)
+    else:
+        events = _decode(src, reader)
+    ptr_path = pointer_path(src.source) if pointers else None
+    for evt in events:
+        ptr = evt.pop('record_ptr', None)
+        evt['source'] = src.source
+        if ptr_path is not None and ptr is not None:
+            evt['record_ptr'] = (ptr_path, ptr[0], ptr[1])
+        if event_filter.match(evt):
+            if mapper is not None:
+                evt = mapper.enrich(evt)
+            if dedup:
+                # Basic dedup key: channel|event_id|record_id|timestamp
+                key = f"{evt.get('channel')}|{evt.get('event_id')}|{evt.get('record_id')}|{evt.get('timestamp')}"
+                if key in seen:
+                    continue
+                seen.add(key)
+            yield evt
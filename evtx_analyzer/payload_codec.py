@@ -0,0 +1,255 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Payloads of a (channel, event_id) collected before its dictionary is
+# trained; keys that end the run with fewer than MIN_TRAIN_SAMPLES stay text
+TRAIN_SAMPLES = 256
+MIN_TRAIN_SAMPLES = 16
+DICT_SIZE = 16 * 1024
+COMPRESS_LEVEL = 6
+LATENCY_SAMPLE = 500
+
+Key = Tuple[Optional[str], Optional[str]]
+
+
+def _zstd() -> Any:
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError('--compress-data requires zstandard (pip install zstandard)')
+    return zstandard
+
+
+def init_tables(conn: sqlite3.Connection) -> None:
+    # One row per trained dictionary, with running totals of what it encoded
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS payload_dicts (
+            id INTEGER PRIMARY KEY,
+            channel TEXT,
+            event_id TEXT,
+            dict BLOB,
+            payloads INTEGER DEFAULT 0,
+            raw_bytes INTEGER DEFAULT 0,
+            stored_bytes INTEGER DEFAULT 0
+        )
+        """
+    )
+
+
+class PayloadCodec:
+    # Ingest side of --compress-data: data_json of each (channel, event_id)
+    # is stored as text until TRAIN_SAMPLES payloads were seen, then a zstd
+    # dictionary is trained on them, those rows are rewritten compressed and
+    # later payloads of the key are compressed with it as they are inserted.
+    # Dictionaries already in the database are reused by later runs.
+    def __init__(self, db_path: Optional[str] = None, samples: int = TRAIN_SAMPLES,
+                 dict_size: int = DICT_SIZE, level: int = COMPRESS_LEVEL) -> None:
+        self.zstd = _zstd()
+        self.db_path = db_path
+        self.samples = samples
+        self.dict_size = dict_size
+        self.level = level
+        self.compressors: Dict[Key, Tuple[int, Any]] = {}
+        self.pending: Dict[Key, List[Tuple[int, bytes]]] = {}
+        # Keys whose samples could not train a dictionary: their payloads stay text
+        self.untrainable: set = set()
+        # dict id -> [payloads, raw bytes, stored bytes] not yet saved
+        self.totals: Dict[int, List[int]] = {}
+        self.trained = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.loaded = False
+
+    def _load(self, conn: sqlite3.Connection) -> None:
+        init_tables(conn)
+        for dict_id, channel, event_id, data in conn.execute('SELECT id, channel, event_id, dict FROM payload_dicts'):
+            self.compressors[(channel, event_id)] = (dict_id, self._compressor(data))
+        self.loaded = True
+
+    def _compressor(self, data: bytes) -> Any:
+        d = self.zstd.ZstdCompressionDict(data)
+        return self.zstd.ZstdCompressor(level=self.level, dict_data=d, write_checksum=False,
+                                        write_content_size=True, write_dict_id=False)
+
+    def encode(self, conn: sqlite3.Connection, channel: Optional[str], event_id: Optional[str], pk: int,
+               text: str) -> Tuple[Optional[str], Optional[bytes], Optional[int]]:
+        # (data_json, data_zstd, data_dict) to store for one payload
+        if not self.loaded:
+            self._load(conn)
+        key = (channel, event_id)
+        found = self.compressors.get(key)
+        if found is None:
+            if key not in self.untrainable:
+                self.pending.setdefault(key, []).append((pk, text.encode('utf-8')))
+            return text, None, None
+        dict_id, cctx = found
+        raw = text.encode('utf-8')
+        blob = cctx.compress(raw)
+        self._count(dict_id, len(raw), len(blob))
+        return None, blob, dict_id
+
+    def _count(self, dict_id: int, raw: int, stored: int) -> None:
+        t = self.totals.setdefault(dict_id, [0, 0, 0])
+        t[0] += 1
+        t[1] += raw
+        t[2] += stored
+        self.raw_bytes += raw
+        self.stored_bytes += stored
+
+    def flush(self, conn: sqlite3.Connection, final: bool = False) -> None:
+        # Trains the keys that have enough samples (at the end of a run: any
+        # key with MIN_TRAIN_SAMPLES) and rewrites their text rows; caller commits
+        if not self.loaded:
+            self._load(conn)
+        need = MIN_TRAIN_SAMPLES if final else self.samples
+        for key in [k for k, v in self.pending.items() if len(v) >= need]:
+            self._train(conn, key, self.pending.pop(key))
+        if final:
+            self.pending.clear()
+        for dict_id, (n, raw, stored) in self.totals.items():
+            conn.execute('UPDATE payload_dicts SET payloads = payloads + ?, raw_bytes = raw_bytes + ?, '
+                         'stored_bytes = stored_bytes + ? WHERE id = ?', (n, raw, stored, dict_id))
+        self.totals.clear()
+
+    def _train(self, conn: sqlite3.Connection, key: Key, rows: List[Tuple[int, bytes]]) -> None:
+        samples = [raw for _pk, raw in rows]
+        total = sum(len(s) for s in samples)
+        try:
+            # zstd wants far more sample bytes than dictionary bytes
+            trained = self.zstd.train_dictionary(max(256, min(self.dict_size, total // 8)), samples)
+            data = trained.as_bytes()
+        except self.zstd.ZstdError:
+            self.untrainable.add(key)
+            return
+        cctx = self._compressor(data)
+        blobs = [cctx.compress(s) for s in samples]
+        if sum(len(b) for b in blobs) >= total:
+            self.untrainable.add(key)
+            return
+        cur = conn.execute('INSERT INTO payload_dicts (channel, event_id, dict) VALUES (?, ?, ?)',
+                           (key[0], key[1], data))
+        dict_id = cur.lastrowid
+        self.compressors[key] = (dict_id, cctx)
+        self.trained += 1
+        conn.executemany('UPDATE events SET data_json = NULL, data_zstd = ?, data_dict = ? WHERE id = ?',
+                         [(blob, dict_id, pk) for (pk, _raw), blob in zip(rows, blobs)])
+        for raw, blob in zip(samples, blobs):
+            self._count(dict_id, len(raw), len(blob))
+
+    def summary(self) -> str:
+        ratio = self.raw_bytes / self.stored_bytes if self.stored_bytes else 0.0
+        return (f"Payload codec: {self.trained} dictionaries trained, {self.raw_bytes / 1e6:.1f} MB of EventData "
+                f"stored as {self.stored_bytes / 1e6:.1f} MB ({ratio:.1f}x)")
+
+
+# Read side: decompressors per (database, inode, dictionary id), shared by
+# all request threads; zstd contexts are not thread safe, hence the lock
+_decompressors: Dict[Tuple[str, int, int], Any] = {}
+_lock = threading.Lock()
+_served = {'payloads': 0, 'seconds': 0.0}
+
+
+def _decompressor(db_path: str, dict_id: int) -> Any:
+    key = (db_path, os.stat(db_path).st_ino, dict_id)
+    dctx = _decompressors.get(key)
+    if dctx is None:
+        zstd = _zstd()
+        conn = sqlite3.connect(db_path)
+        try:
+            row = conn.execute('SELECT dict FROM payload_dicts WHERE id = ?', (dict_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            raise KeyError(dict_id)
+        dctx = zstd.ZstdDecompressor(dict_data=zstd.ZstdCompressionDict(row[0]))
+        _decompressors[key] = dctx
+    return dctx
+
+
+def _decompress(db_path: str, blob: bytes, dict_id: int) -> str:
+    dctx = _decompressor(db_path, dict_id)
+    with _lock:
+        return dctx.decompress(blob).decode('utf-8')
+
+
+def load_payload(item: Dict[str, Any], db_path: str) -> None:
+    # Turns data_zstd/data_dict of a stored row back into data_json
+    blob = item.pop('data_zstd', None)
+    dict_id = item.pop('data_dict', None)
+    if blob is None or dict_id is None:
+        return
+    t0 = time.perf_counter()
+    try:
+        item['data_json'] = _decompress(db_path, blob, int(dict_id))
+    except Exception:
+        item['data_json'] = None
+    _served['payloads'] += 1
+    _served['seconds'] += time.perf_counter() - t0
+
+
+def storage_report(db_path: str, sample: int = LATENCY_SAMPLE) -> Dict[str, Any]:
+    # Sizes of the events table and its payloads, plus decompression latency
+    # over `sample` stored payloads (dictionaries loaded first)
+    conn = sqlite3.connect(db_path)
+    try:
+        # Databases from before --compress-data / --store-pointers lack some columns
+        cols = {r[1] for r in conn.execute('PRAGMA table_info(events)')}
+        zstd_col = 'data_zstd' if 'data_zstd' in cols else 'NULL'
+        ptr_col = 'ptr_path' if 'ptr_path' in cols else 'NULL'
+        events, text_rows, text_bytes, zstd_rows, zstd_bytes, pointer_rows = conn.execute(
+            f'SELECT COUNT(*), COUNT(data_json), SUM(LENGTH(CAST(data_json AS BLOB))), COUNT({zstd_col}), '
+            f'SUM(LENGTH({zstd_col})), COUNT({ptr_col}) FROM events').fetchone()
+        try:
+            table_bytes = conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = 'events'").fetchone()[0]
+        except sqlite3.OperationalError:
+            table_bytes = None
+        try:
+            dicts, dict_bytes, raw_bytes = conn.execute(
+                'SELECT COUNT(*), SUM(LENGTH(dict)), SUM(raw_bytes) FROM payload_dicts').fetchone()
+        except sqlite3.OperationalError:
+            dicts, dict_bytes, raw_bytes = 0, 0, 0
+        blobs = conn.execute('SELECT data_zstd, data_dict FROM events WHERE data_zstd IS NOT NULL LIMIT ?',
+                             (sample,)).fetchall() if zstd_rows else []
+    finally:
+        conn.close()
+    timings = []
+    for blob, dict_id in blobs:
+        _decompressor(db_path, dict_id)
+        t0 = time.perf_counter()
+        _decompress(db_path, blob, dict_id)
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    zstd_bytes = zstd_bytes or 0
+    raw_bytes = raw_bytes or 0
+    report: Dict[str, Any] = {
+        'db_bytes': sum(os.path.getsize(p) for p in (db_path, db_path + '-wal') if os.path.exists(p)),
+        'events': events,
+        'events_table_bytes': table_bytes,
+        # What the table would take with every compressed payload stored as text
+        'events_table_bytes_uncompressed': table_bytes - zstd_bytes + raw_bytes if table_bytes is not None else None,
+        'payloads': {
+            'text': text_rows,
+            'text_bytes': text_bytes or 0,
+            'compressed': zstd_rows,
+            'compressed_bytes': zstd_bytes,
+            'compressed_raw_bytes': raw_bytes,
+            'ratio': round(raw_bytes / zstd_bytes, 2) if zstd_bytes else None,
+            'pointers': pointer_rows,
+        },
+        'dictionaries': {'count': dicts, 'bytes': dict_bytes or 0},
+        'decompress_us': {
+            'sampled': len(timings),
+            'mean': round(sum(timings) / len(timings) * 1e6, 1) if timings else None,
+            'p50': round(timings[len(timings) // 2] * 1e6, 1) if timings else None,
+            'p99': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6, 1) if timings else None,
+        },
+        'served': {
+            'payloads': _served['payloads'],
+            'mean_us': round(_served['seconds'] / _served['payloads'] * 1e6, 1) if _served['payloads'] else None,
+        },
+    }
+    return report
@@ -0,0 +1,207 @@
+from typing import Any, Dict, List, Optional, Tuple, Union
+from .archives import ArchiveWalker, EvtxSource, is_archive
+from .parser import parse_evtx_file
+from .filters import EventFilter
+from .maps import EventMapper
+from .rules import RuleSet
+from .safelists import Safelist
+from .process_tree import process_key
+from .storage import (finish_payloads, finish_processes, finish_sessions, insert_events, insert_findings,
+                      max_event_pk, promote_fields, save_rule_hashes)
+
+
+def finding_row(evt: Dict[str, Any], hit: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'event_timestamp': evt.get('timestamp'),
+        'channel': evt.get('channel'),
+        'event_id': evt.get('event_id'),
+        'rule_id': hit.get('rule_id'),
+        'severity': hit.get('severity'),
+        'description': hit.get('description'),
+        'tags': hit.get('tags') or [],
+        'event_ref': evt.get('event_pk'),
+        'process_key': process_key(evt),
+    }
+
+
+class Pipeline:
+    def __init__(self, event_filter: EventFilter, mapper: EventMapper, rule_set: RuleSet, safelist: Safelist,
+                 exporters: Optional[List[Any]] = None, findings_exporters: Optional[List[Any]] = None,
+                 dedup: bool = False, store_sqlite: bool = False, live=None, reader=None,
+                 archives=None, db_path: Optional[str] = None, sketches=None,
+                 summary_path: Optional[str] = None, stacker=None, rule_batch=None,
+                 event_cache=None, store_pointers: bool = False, payload_codec=None,
+                 index_fields: Optional[List[str]] = None, schema=None, schema_path: Optional[str] = None) -> None:
+        self.event_filter = event_filter
+        self.mapper = mapper
+        self.rule_set = rule_set
+        self.safelist = safelist
+        self.exporters = exporters or []
+        self.findings_exporters = findings_exporters or []
+        self.dedup = dedup
+        self.store_sqlite = store_sqlite
+        self.db_path = db_path
+        self.live = live
+        self.reader = reader
+        self.archives = archives
+        # sketches.SketchSet, saved to summary_path on close
+        self.sketches = sketches
+        self.summary_path = summary_path
+        # schema_catalog.SchemaCatalog, saved to schema_path on close
+        self.schema = schema
+        self.schema_path = schema_path
+        # stacking.StackAggregator, finished (spills merged, outputs written) on close
+        self.stacker = stacker
+        # batch_rules.BatchRuleEngine: rules run a batch at a time, findings
+        # are emitted when a batch fills up and at the end of every source
+        self.rule_batch = rule_batch
+        # event_cache.EventCache: parse each input once, replay it on later runs
+        self.event_cache = event_cache
+        # SQLite keeps a (path, chunk, record) pointer instead of data_json
+        self.store_pointers = store_pointers and store_sqlite
+        # payload_codec.PayloadCodec: SQLite data_json compressed with per
+        # (channel, event_id) zstd dictionaries
+        self.payload_codec = payload_codec if store_sqlite else None
+        # EventData fields promoted to indexed generated columns on close
+        self.index_fields = list(index_fields or []) if store_sqlite else []
+        # Stable per-run event ids (events.id in SQLite, `id` in Parquet,
+        # `event_pk` in JSONL), assigned before rules run so every finding
+        # carries its event_ref. With SQLite they continue after stored rows.
+        self.next_event_pk = max_event_pk(db_path) if store_sqlite else 0
+        self.total_matched = 0
+        self.total_findings = 0
+        self.files_done = 0
+        self.buffered_for_db: List[Dict[str, Any]] = []
+        self.buffered_findings: List[Dict[str, Any]] = []
+        self.correlator = None
+        if rule_set.correlations:
+            from .correlation import CorrelationEngine
+            self.correlator = CorrelationEngine(rule_set.correlations)
+
+    def process_file(self, path: str, chunks: Optional[Tuple[int, int]] = None) -> None:
+        # A loose .evtx file or an archive of them (see archives.iter_inputs);
+        # `chunks` restricts a loose file to a range of chunk indexes
+        if chunks is not None:
+            self._process_source(EvtxSource(path, path=path, chunks=chunks))
+        elif is_archive(path):
+            if self.archives is None:
+                self.archives = ArchiveWalker()
+            for src in self.archives.iter_sources(path):
+                with src:
+                    try:
+                        self._process_source(src)
+                    except Exception as e:
+                        # One truncated member should not abort a whole triage package
+                        self.archives.errors.append((src.source, str(e)))
+        else:
+            self._process_source(path)
+        self.files_done += 1
+        self._publish_progress()
+
+    def _process_source(self, src: Union[str, EvtxSource]) -> None:
+        for evt in parse_evtx_file(src, self.event_filter, mapper=self.mapper, dedup=self.dedup,
+                                   reader=self.reader, cache=self.event_cache, pointers=self.store_pointers):
+            self.process_event(evt)
+        self.flush_rules()
+        if self.correlator is not None:
+            self.correlator.end_source(src.source if isinstance(src, EvtxSource) else src)
+
+    def process_event(self, evt: Dict[str, Any]) -> None:
+        self.total_matched += 1
+        self.next_event_pk += 1
+        evt['event_pk'] = self.next_event_pk
+        if self.sketches is not None:
+            self.sketches.update(evt)
+        if self.schema is not None:
+            self.schema.update(evt)
+        if self.stacker is not None:
+            self.stacker.add(evt)
+        if (self.rule_set.rules or self.correlator) and not self.safelist.is_event_safelisted(evt):
+            if self.rule_batch is not None:
+                self._emit_batch(self.rule_batch.add(evt))
+            else:
+                for h in self.rule_set.evaluate(evt):
+                    if self.safelist.is_finding_safelisted(h):
+                        continue
+                    self.emit_finding(finding_row(evt, h))
+            if self.correlator is not None:
+                self._emit_correlated(self.correlator.push(evt))
+
+        if self.store_sqlite:
+            self.buffered_for_db.append(evt)
+            if len(self.buffered_for_db) >= 1000:
+                self._flush_events()
+            if len(self.buffered_findings) >= 500:
+                self._flush_findings()
+        for ex in self.exporters:
+            ex.write(evt)
+
+    def _emit_correlated(self, hits: List[Any]) -> None:
+        for evt, h in hits:
+            if self.safelist.is_finding_safelisted(h):
+                continue
+            self.emit_finding(finding_row(evt, h))
+
+    def _emit_batch(self, results: List[Any]) -> None:
+        for evt, hits in results:
+            for h in hits:
+                if self.safelist.is_finding_safelisted(h):
+                    continue
+                self.emit_finding(finding_row(evt, h))
+
+    def flush_rules(self) -> None:
+        if self.rule_batch is not None:
+            self._emit_batch(self.rule_batch.flush())
+
+    def emit_finding(self, row: Dict[str, Any]) -> None:
+        self.total_findings += 1
+        if self.store_sqlite:
+            self.buffered_findings.append(row)
+        for fx in self.findings_exporters:
+            fx.write(row)
+        if self.live is not None:
+            self.live.publish('finding', row)
+
+    def _flush_events(self) -> None:
+        if self.buffered_for_db:
+            insert_events(self.buffered_for_db, db_path=self.db_path, pointers=self.store_pointers,
+                          codec=self.payload_codec, hot_fields=self.index_fields, processes=True,
+                          sessions=True)
+            self.buffered_for_db.clear()
+            self._publish_progress()
+
+    def _flush_findings(self) -> None:
+        if self.buffered_findings:
+            insert_findings(self.buffered_findings, db_path=self.db_path)
+            self.buffered_findings.clear()
+
+    def _publish_progress(self, done: bool = False) -> None:
+        if self.live is not None:
+            self.live.update_progress(events=self.total_matched, findings=self.total_findings,
+                                      files_done=self.files_done, done=done)
+
+    def close(self) -> None:
+        self.flush_rules()
+        if self.correlator is not None:
+            self._emit_correlated(self.correlator.flush())
+        self._flush_events()
+        self._flush_findings()
+        if self.payload_codec is not None:
+            finish_payloads(self.payload_codec, db_path=self.db_path)
+        if self.index_fields:
+            promote_fields(self.index_fields, db_path=self.db_path)
+        if self.store_sqlite:
+            finish_processes(db_path=self.db_path)
+            finish_sessions(db_path=self.db_path)
+            save_rule_hashes(self.rule_set.content_hashes(), db_path=self.db_path)
+        for ex in self.exporters:
+            ex.close()
+        for fx in self.findings_exporters:
+            fx.close()
+        if self.sketches is not None and self.summary_path:
+            self.sketches.save(self.summary_path)
+        if self.schema is not None and self.schema_path:
+            self.schema.save(self.schema_path)
+        if self.stacker is not None:
+            self.stacker.finish()
+        self._publish_progress(done=True)
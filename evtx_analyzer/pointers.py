@@ -0,0 +1,116 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .archives import ArchiveWalker, MEMBER_SEP
+from .reader import CHUNK_SIZE
+
+# Decoded records / raw chunks kept for detail views and downloads
+RECORD_CACHE_SIZE = 2048
+CHUNK_CACHE_SIZE = 64
+
+
+def pointer_path(source: str) -> str:
+    # Stable location of a source for later re-reads: the file (or outermost
+    # archive) made absolute, followed by the member path inside it
+    outer, sep, member = source.partition(MEMBER_SEP)
+    return os.path.abspath(outer) + sep + member
+
+
+class _LRU:
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.items: 'OrderedDict[Any, Any]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Any) -> Any:
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key: Any, value: Any) -> None:
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+_records = _LRU(RECORD_CACHE_SIZE)
+_chunks = _LRU(CHUNK_CACHE_SIZE)
+
+
+def _read_chunk(path: str, chunk_ofs: int) -> Optional[bytes]:
+    key = (path, chunk_ofs)
+    chunk = _chunks.get(key)
+    if chunk is not None:
+        return chunk
+    if os.path.isfile(path):
+        with open(path, 'rb') as fh:
+            fh.seek(chunk_ofs)
+            chunk = fh.read(CHUNK_SIZE)
+    else:
+        # Archive member: walk the archive to it again (the slow path the
+        # chunk cache is there for)
+        outer = path.split(MEMBER_SEP, 1)[0]
+        if not os.path.isfile(outer):
+            return None
+        for src in ArchiveWalker().iter_sources(outer):
+            with src:
+                if src.source != path:
+                    continue
+                if src.data is not None:
+                    chunk = bytes(src.data[chunk_ofs:chunk_ofs + CHUNK_SIZE])
+                else:
+                    with open(src.path, 'rb') as fh:
+                        fh.seek(chunk_ofs)
+                        chunk = fh.read(CHUNK_SIZE)
+                break
+    if not chunk or len(chunk) < CHUNK_SIZE:
+        return None
+    _chunks.put(key, chunk)
+    return chunk
+
+
+def decode_record(path: str, chunk_ofs: int, record_ofs: int) -> Optional[Dict[str, Any]]:
+    # normalize_event() output of one record, re-decoded from its chunk.
+    # Returns a copy; None if the source is gone or no longer matches.
+    key = (path, chunk_ofs, record_ofs)
+    evt = _records.get(key)
+    if evt is None:
+        chunk = _read_chunk(path, chunk_ofs)
+        if chunk is None:
+            return None
+        import xmltodict
+        from Evtx.Evtx import ChunkHeader, Record
+        from .utils import normalize_event
+        try:
+            record = Record(chunk, record_ofs, ChunkHeader(chunk, 0))
+            evt = normalize_event(xmltodict.parse(record.xml()), record)
+        except Exception:
+            return None
+        evt.pop('timestamp_dt', None)
+        _records.put(key, evt)
+    return dict(evt)
+
+
+def record_pointer(record: Any) -> Tuple[int, int]:
+    # (chunk offset in the file, record offset inside the chunk)
+    chunk_ofs = record._chunk.offset()
+    return chunk_ofs, record.offset() - chunk_ofs
+
+
+def resolve_data(row: Dict[str, Any]) -> None:
+    # For rows stored with --store-pointers: fill `data` from the source
+    # record and drop the pointer columns. Rows with data_json are untouched.
+    path = row.pop('ptr_path', None)
+    chunk_ofs = row.pop('ptr_chunk', None)
+    record_ofs = row.pop('ptr_record', None)
+    if row.get('data') is not None or isinstance(row.get('data_json'), str):
+        return
+    if path and chunk_ofs is not None and record_ofs is not None:
+        evt = decode_record(path, int(chunk_ofs), int(record_ofs))
+        row['data'] = evt.get('data') if evt else None
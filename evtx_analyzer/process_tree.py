@@ -0,0 +1,205 @@
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+# Process creation events the tree is built from: Sysmon 1 links children
+# by ParentProcessGuid; Security 4688 only has process ids, so a child links
+# to the latest process with its parent's pid on the same computer that
+# started at or before it (pids are reused)
+SYSMON_CHANNEL = 'Microsoft-Windows-Sysmon/Operational'
+SECURITY_CHANNEL = 'Security'
+MAX_DEPTH = 64
+MAX_DESCENDANTS = 5000
+COLUMNS = ['event_ref', 'proc_key', 'parent_key', 'parent_ref', 'computer', 'pid', 'parent_pid', 'image',
+           'parent_image', 'command_line', 'user', 'timestamp', 'kind']
+SELECT = ', '.join('p.' + c for c in COLUMNS)
+
+
+def init_tables(conn: sqlite3.Connection) -> None:
+    # One row per process creation event (event_ref = its events.id);
+    # parent_ref is the adjacency, filled in by resolve_parents()
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS processes (
+            event_ref INTEGER PRIMARY KEY,
+            proc_key TEXT,
+            parent_key TEXT,
+            parent_ref INTEGER,
+            computer TEXT,
+            pid INTEGER,
+            parent_pid INTEGER,
+            image TEXT,
+            parent_image TEXT,
+            command_line TEXT,
+            user TEXT,
+            timestamp TEXT,
+            kind TEXT
+        )
+        """
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_processes_key ON processes(proc_key)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_processes_parent ON processes(parent_ref)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_processes_parent_key ON processes(parent_key)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_processes_pid ON processes(computer, pid, timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_processes_parent_pid ON processes(computer, parent_pid)')
+
+
+def _guid(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    guid = str(value).strip().strip('{}').lower()
+    return guid or None
+
+
+def _pid(value: Any) -> Optional[int]:
+    # 4688 logs ids as hex (0x1a2c), Sysmon as decimal
+    if value is None:
+        return None
+    text = str(value).strip().lower()
+    try:
+        return int(text, 16) if text.startswith('0x') else int(text)
+    except ValueError:
+        return None
+
+
+def pid_key(computer: Any, pid: int, timestamp: Any) -> str:
+    return f'{computer}|{pid}|{timestamp}'
+
+
+def process_row(evt: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
+    # processes row for a Sysmon 1 / Security 4688 event, else None
+    data = evt.get('data')
+    if not isinstance(data, dict):
+        return None
+    channel = evt.get('channel')
+    event_id = str(evt.get('event_id'))
+    computer = evt.get('computer')
+    ts = evt.get('timestamp')
+    if event_id == '1' and channel == SYSMON_CHANNEL:
+        key = _guid(data.get('ProcessGuid'))
+        if key is None:
+            return None
+        return (evt.get('event_pk'), key, _guid(data.get('ParentProcessGuid')), None, computer,
+                _pid(data.get('ProcessId')), _pid(data.get('ParentProcessId')), data.get('Image'),
+                data.get('ParentImage'), data.get('CommandLine'), data.get('User'), ts, 'sysmon')
+    if event_id == '4688' and channel == SECURITY_CHANNEL:
+        pid = _pid(data.get('NewProcessId'))
+        if pid is None or not computer or not ts:
+            return None
+        user = data.get('SubjectUserName')
+        if user and data.get('SubjectDomainName'):
+            user = f"{data['SubjectDomainName']}\\{user}"
+        return (evt.get('event_pk'), pid_key(computer, pid, ts), None, None, computer, pid,
+                _pid(data.get('ProcessId')), data.get('NewProcessName'), data.get('ParentProcessName'),
+                data.get('CommandLine'), user, ts, '4688')
+    return None
+
+
+def process_key(evt: Dict[str, Any]) -> Optional[str]:
+    # The process an event belongs to, for finding lineage: the event's own
+    # node for creation events, else its Sysmon ProcessGuid, else
+    # computer|ProcessId|time (looked up like a 4688 parent)
+    row = process_row(evt)
+    if row is not None:
+        return row[1]
+    data = evt.get('data')
+    if not isinstance(data, dict):
+        return None
+    guid = _guid(data.get('ProcessGuid'))
+    if guid is not None:
+        return guid
+    pid = _pid(data.get('ProcessId'))
+    if pid and evt.get('computer') and evt.get('timestamp'):
+        return pid_key(evt['computer'], pid, evt['timestamp'])
+    return None
+
+
+def insert_processes(conn: sqlite3.Connection, events: List[Dict[str, Any]]) -> None:
+    rows = [r for r in (process_row(e) for e in events) if r is not None]
+    if rows:
+        conn.executemany(f"INSERT OR REPLACE INTO processes ({', '.join(COLUMNS)}) "
+                         f"VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+
+
+def resolve_parents(conn: sqlite3.Connection) -> None:
+    # Only unlinked rows are looked at, so a later run into the same
+    # database links earlier children to parents it brings
+    conn.execute(
+        """
+        UPDATE processes SET parent_ref = (
+            SELECT p.event_ref FROM processes p
+            WHERE p.proc_key = processes.parent_key AND p.event_ref != processes.event_ref
+            ORDER BY p.event_ref LIMIT 1)
+        WHERE parent_ref IS NULL AND parent_key IS NOT NULL
+        """
+    )
+    conn.execute(
+        """
+        UPDATE processes SET parent_ref = (
+            SELECT p.event_ref FROM processes p
+            WHERE p.computer = processes.computer AND p.pid = processes.parent_pid
+              AND p.timestamp <= processes.timestamp AND p.event_ref != processes.event_ref
+            ORDER BY p.timestamp DESC LIMIT 1)
+        WHERE parent_ref IS NULL AND parent_key IS NULL AND parent_pid IS NOT NULL
+        """
+    )
+
+
+def _node(row: Any, depth: Optional[int] = None) -> Dict[str, Any]:
+    node = dict(zip(COLUMNS, row))
+    if depth is not None:
+        node['depth'] = depth
+    return node
+
+
+def find_process(conn: sqlite3.Connection, ident: str) -> Optional[Dict[str, Any]]:
+    # By creation event id, ProcessGuid or process_key(); pid keys resolve
+    # to the latest process with that pid started at or before the time
+    ident = str(ident).strip()
+    if ident.isdigit():
+        row = conn.execute(f'SELECT {SELECT} FROM processes p WHERE p.event_ref = ?', (int(ident),)).fetchone()
+        return _node(row) if row else None
+    parts = ident.split('|')
+    if len(parts) == 3 and _pid(parts[1]) is not None:
+        row = conn.execute(f'SELECT {SELECT} FROM processes p WHERE p.computer = ? AND p.pid = ? AND p.timestamp <= ? '
+                           f'ORDER BY p.timestamp DESC LIMIT 1', (parts[0], _pid(parts[1]), parts[2])).fetchone()
+        return _node(row) if row else None
+    row = conn.execute(f'SELECT {SELECT} FROM processes p WHERE p.proc_key = ? ORDER BY p.event_ref LIMIT 1',
+                       (_guid(ident),)).fetchone()
+    return _node(row) if row else None
+
+
+def ancestors(conn: sqlite3.Connection, ref: int, max_depth: int = MAX_DEPTH) -> List[Dict[str, Any]]:
+    # Parent first, up to the oldest linked ancestor
+    rows = conn.execute(
+        f"""
+        WITH RECURSIVE chain(ref, depth) AS (
+            SELECT parent_ref, 1 FROM processes WHERE event_ref = ?
+            UNION ALL
+            SELECT p.parent_ref, c.depth + 1 FROM processes p JOIN chain c ON p.event_ref = c.ref
+            WHERE c.depth < ?
+        )
+        SELECT {SELECT}, c.depth FROM chain c JOIN processes p ON p.event_ref = c.ref ORDER BY c.depth
+        """, (ref, max_depth)).fetchall()
+    return [_node(r[:-1], r[-1]) for r in rows]
+
+
+def descendants(conn: sqlite3.Connection, ref: int, max_depth: int = MAX_DEPTH,
+                limit: int = MAX_DESCENDANTS) -> List[Dict[str, Any]]:
+    # Breadth first (children, grandchildren, ...), each level by start time
+    rows = conn.execute(
+        f"""
+        WITH RECURSIVE tree(ref, depth) AS (
+            SELECT event_ref, 1 FROM processes WHERE parent_ref = ?
+            UNION ALL
+            SELECT p.event_ref, t.depth + 1 FROM processes p JOIN tree t ON p.parent_ref = t.ref
+            WHERE t.depth < ?
+        )
+        SELECT {SELECT}, t.depth FROM tree t JOIN processes p ON p.event_ref = t.ref
+        ORDER BY t.depth, p.timestamp LIMIT ?
+        """, (ref, max_depth, limit)).fetchall()
+    return [_node(r[:-1], r[-1]) for r in rows]
+
+
+def lineage(chain: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Compact root-first view of [process, parent, grandparent, ...]
+    return [{'event_ref': n['event_ref'], 'pid': n['pid'], 'image': n['image']} for n in reversed(chain)]
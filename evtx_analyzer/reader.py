@@ -0,0 +1,225 @@
+import mmap
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 0x10000
+READ_MODES = ('auto', 'mmap', 'ram')
+ADVICE = {
+    'normal': 'MADV_NORMAL',
+    'sequential': 'MADV_SEQUENTIAL',
+    'willneed': 'MADV_WILLNEED',
+}
+
+
+class ReadStats:
+    # I/O wait is time the parser spent blocked on bytes it needed (whole-file
+    # reads in RAM mode, chunks not yet prefetched in mmap mode); CPU is
+    # process time over the same wall-clock window.
+    def __init__(self) -> None:
+        self.files = 0
+        self.files_ram = 0
+        self.bytes = 0
+        self.io_wait = 0.0
+        self._wall_start: Optional[float] = None
+        self._cpu_start = 0.0
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def start(self) -> None:
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    def stop(self) -> None:
+        if self._wall_start is None:
+            return
+        self.wall += time.perf_counter() - self._wall_start
+        self.cpu += time.process_time() - self._cpu_start
+        self._wall_start = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'files': self.files,
+            'files_ram': self.files_ram,
+            'bytes': self.bytes,
+            'wall_sec': round(self.wall, 3),
+            'io_wait_sec': round(self.io_wait, 3),
+            'cpu_sec': round(self.cpu, 3),
+        }
+
+    def summary(self) -> str:
+        mb = self.bytes / (1024 * 1024)
+        rate = mb / self.wall if self.wall > 0 else 0.0
+        io_pct = 100.0 * self.io_wait / self.wall if self.wall > 0 else 0.0
+        return (f"Read: {self.files} files ({self.files_ram} in RAM), {mb:.1f}MB in {self.wall:.2f}s "
+                f"({rate:.1f}MB/s); I/O wait {self.io_wait:.2f}s ({io_pct:.0f}%), CPU {self.cpu:.2f}s")
+
+
+class _Readahead:
+    # Keeps up to `depth` chunks ahead of the parser resident in the page
+    # cache. Reads go through a separate unbuffered handle: readinto() drops
+    # the GIL, whereas faulting mmap pages from the parser thread would hold it.
+    def __init__(self, path: str, offsets: List[int], depth: int) -> None:
+        self.offsets = offsets
+        self.depth = depth
+        self.ready = -1
+        self.cond = threading.Condition()
+        self.consumed = -1
+        self.stopped = False
+        self.fh = open(path, 'rb', buffering=0)
+        self.thread = threading.Thread(target=self._run, name='evtx-readahead', daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        scratch = bytearray(CHUNK_SIZE)
+        try:
+            for i, ofs in enumerate(self.offsets):
+                with self.cond:
+                    while not self.stopped and i > self.consumed + self.depth:
+                        self.cond.wait()
+                    if self.stopped:
+                        return
+                self.fh.seek(ofs)
+                self.fh.readinto(scratch)
+                with self.cond:
+                    self.ready = i
+                    self.cond.notify_all()
+        except Exception:
+            pass
+        finally:
+            with self.cond:
+                # On error let the parser fall through to plain mmap faults
+                self.ready = len(self.offsets)
+                self.cond.notify_all()
+
+    def wait_for(self, i: int) -> None:
+        with self.cond:
+            self.consumed = i - 1
+            self.cond.notify_all()
+            while self.ready < i:
+                self.cond.wait()
+
+    def close(self) -> None:
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        self.thread.join()
+        self.fh.close()
+
+
+class EvtxReader:
+    # Reader layer under parse_evtx_file. `mmap` maps the file with madvise
+    # hints and a readahead thread; `ram` reads the whole file up front (best
+    # for small logs and high-latency shares); `auto` picks `ram` below
+    # ram_threshold bytes.
+    def __init__(self, mode: str = 'auto', advice: str = 'sequential', readahead_chunks: int = 8,
+                 ram_threshold: int = 32 * 1024 * 1024, stats: Optional[ReadStats] = None) -> None:
+        if mode not in READ_MODES:
+            raise ValueError(f"Unsupported read mode: {mode}")
+        if advice not in ADVICE:
+            raise ValueError(f"Unsupported madvise: {advice}")
+        self.mode = mode
+        self.advice = advice
+        self.readahead_chunks = max(0, int(readahead_chunks))
+        self.ram_threshold = ram_threshold
+        self.stats = stats or ReadStats()
+
+    def records(self, path: str, chunks: Optional[Tuple[int, int]] = None) -> Iterator[Any]:
+        # chunks=(start, end) limits parsing to that range of chunk indexes,
+        # so one large file can be split into independent jobs
+        size = os.path.getsize(path)
+        if size < 0x1000:
+            return
+        self.stats.files += 1
+        if chunks is not None:
+            self.stats.bytes += (chunks[1] - chunks[0]) * CHUNK_SIZE
+        else:
+            self.stats.bytes += size
+        if chunks is None and (self.mode == 'ram' or (self.mode == 'auto' and size <= self.ram_threshold)):
+            t0 = time.perf_counter()
+            with open(path, 'rb') as fh:
+                data = fh.read()
+            self.stats.io_wait += time.perf_counter() - t0
+            self.stats.files_ram += 1
+            yield from self.records_from_buffer(data)
+            return
+        with open(path, 'rb') as fh:
+            buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                self._madvise(buf, self.advice)
+                yield from self._mmap_records(path, buf, chunks)
+            finally:
+                buf.close()
+
+    def records_for(self, src: Any) -> Iterator[Any]:
+        # EvtxSource from archives.py: in-memory member or a path on disk
+        if src.data is None:
+            yield from self.records(src.path, getattr(src, 'chunks', None))
+            return
+        if len(src.data) < 0x1000:
+            return
+        self.stats.files += 1
+        self.stats.files_ram += 1
+        self.stats.bytes += len(src.data)
+        yield from self.records_from_buffer(src.data)
+
+    def records_from_buffer(self, buf: Any) -> Iterator[Any]:
+        from Evtx.Evtx import FileHeader
+        fh = FileHeader(buf, 0)
+        for chunk in fh.chunks():
+            yield from chunk.records()
+
+    def _mmap_records(self, path: str, buf: mmap.mmap, chunks: Optional[Tuple[int, int]] = None) -> Iterator[Any]:
+        from Evtx.Evtx import FileHeader, ChunkHeader
+        fh = FileHeader(buf, 0)
+        offsets = self._chunk_offsets(fh, len(buf))
+        if chunks is not None:
+            offsets = offsets[chunks[0]:chunks[1]]
+        ra = _Readahead(path, offsets, self.readahead_chunks) if self.readahead_chunks and offsets else None
+        try:
+            for i, ofs in enumerate(offsets):
+                t0 = time.perf_counter()
+                if ra is not None:
+                    ra.wait_for(i)
+                else:
+                    # Fault the chunk in here so the stall is counted as I/O
+                    buf[ofs:ofs + CHUNK_SIZE]
+                self.stats.io_wait += time.perf_counter() - t0
+                yield from ChunkHeader(buf, ofs).records()
+        finally:
+            if ra is not None:
+                ra.close()
+
+    @staticmethod
+    def _chunk_offsets(fh: Any, length: int) -> List[int]:
+        # Same walk as FileHeader.chunks(), precomputed so the readahead
+        # thread knows what comes next
+        offsets: List[int] = []
+        ofs = fh.header_chunk_size()
+        count = fh.chunk_count()
+        while ofs + CHUNK_SIZE <= length and len(offsets) < count:
+            offsets.append(ofs)
+            ofs += CHUNK_SIZE
+        return offsets
+
+    @staticmethod
+    def chunk_count(path: str) -> int:
+        # Number of chunks parse would visit, from the file header alone
+        from Evtx.Evtx import FileHeader
+        size = os.path.getsize(path)
+        if size < 0x1000:
+            return 0
+        with open(path, 'rb') as fh:
+            header = fh.read(0x1000)
+        return len(EvtxReader._chunk_offsets(FileHeader(header, 0), size))
+
+    @staticmethod
+    def _madvise(buf: mmap.mmap, advice: str) -> None:
+        flag = getattr(mmap, ADVICE[advice], None)
+        if flag is None or not hasattr(buf, 'madvise'):
+            return  # e.g. Windows
+        try:
+            buf.madvise(flag)
+        except OSError:
+            pass
@@ -0,0 +1,292 @@
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import orjson
+
+from .correlation import CorrelationEngine
+from .exporters import RULE_HASHES_KEY
+from .pipeline import finding_row
+from .payload_codec import load_payload
+from .pointers import resolve_data
+from .rules import Rule, RuleSet
+from .storage import ensure_columns, get_conn, insert_findings, load_rule_hashes, save_rule_hashes
+from .utils import parse_iso8601_utc
+
+EVENT_COLUMNS = ['id', 'timestamp', 'channel', 'event_id', 'computer', 'provider', 'record_id', 'user_sid', 'source']
+FETCH_ROWS = 5000
+PAYLOAD_COLUMNS = ['ptr_path', 'ptr_chunk', 'ptr_record', 'data_zstd', 'data_dict']
+# (channel or None, event ids or None) pairs an event has to fall in; None = any
+Scope = List[Tuple[Optional[str], Optional[Set[str]]]]
+
+
+def diff_hashes(current: Dict[str, str], stored: Dict[str, str]) -> Dict[str, List[str]]:
+    return {
+        'added': sorted(r for r in current if r not in stored),
+        'changed': sorted(r for r in current if r in stored and stored[r] != current[r]),
+        'deleted': sorted(r for r in stored if r not in current),
+        'unchanged': sorted(r for r in current if stored.get(r) == current[r]),
+    }
+
+
+def _rule_scope(rule: Rule) -> Optional[Scope]:
+    # Sigma rules are gated by their logsource; native rules by `all`
+    # conditions of the form channel/event_id eq X
+    logsource = getattr(rule, 'logsource', None)
+    if hasattr(rule, 'condition'):
+        if logsource is None:
+            return None
+        return [(ch, set(ids) if ids is not None else None) for ch, ids in logsource.items()]
+    channel = None
+    ids = None
+    for c in rule.all_of:
+        if c.op != 'eq':
+            continue
+        if c.field == 'channel':
+            channel = str(c.value)
+        elif c.field == 'event_id':
+            ids = {str(c.value)}
+    if channel is None and ids is None:
+        return None
+    return [(channel, ids)]
+
+
+def rules_scope(rules: List[Rule]) -> Optional[Scope]:
+    # Union of the rules' scopes, or None when any rule can match anywhere
+    scope: Scope = []
+    for r in rules:
+        s = _rule_scope(r)
+        if s is None:
+            return None
+        scope.extend(s)
+    return scope
+
+
+class SqliteHunt:
+    # Events and findings in a SQLite database written with --serve (or a
+    # case/job shard); the pack hashes live in its rule_hashes table
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self.removed = 0
+
+    def stored_hashes(self) -> Dict[str, str]:
+        return load_rule_hashes(self.db_path)
+
+    def events(self, scope: Optional[Scope]) -> Iterator[Dict[str, Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        for channel, ids in scope or []:
+            parts = []
+            if channel is not None:
+                parts.append('channel = ?')
+                params.append(channel)
+            if ids is not None:
+                parts.append(f"event_id IN ({','.join('?' * len(ids))})")
+                params.extend(sorted(ids))
+            clauses.append('(' + ' AND '.join(parts) + ')' if parts else '1')
+        conn = get_conn(self.db_path)
+        # Pointer (--store-pointers) and compressed (--compress-data) payload
+        # columns, where the database has them
+        existing = {r[1] for r in conn.execute('PRAGMA table_info(events)')}
+        columns = EVENT_COLUMNS + [c for c in PAYLOAD_COLUMNS if c in existing]
+        sql = f"SELECT {', '.join(columns)}, data_json FROM events"
+        if scope is not None:
+            if not clauses:
+                conn.close()
+                return
+            sql += ' WHERE ' + ' OR '.join(clauses)
+        try:
+            if scope:
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_events_channel_event_id ON events(channel, event_id)')
+                conn.commit()
+            cur = conn.execute(sql + ' ORDER BY id', params)
+            while True:
+                rows = cur.fetchmany(FETCH_ROWS)
+                if not rows:
+                    break
+                for row in rows:
+                    evt = dict(zip(columns, row[:-1]))
+                    evt['event_pk'] = evt.pop('id')
+                    evt['data_json'] = row[-1]
+                    load_payload(evt, self.db_path)
+                    data_json = evt.pop('data_json', None)
+                    evt['data'] = orjson.loads(data_json) if data_json else None
+                    # --store-pointers rows: data comes from the source record
+                    resolve_data(evt)
+                    if evt['data'] is None:
+                        evt['data'] = {}
+                    yield evt
+        finally:
+            conn.close()
+
+    def begin(self, stale: Set[str]) -> None:
+        # Findings of deleted, changed and (re-)added rules go before anything
+        # is evaluated; hashes are saved last, so an interrupted hunt redoes them
+        conn = get_conn(self.db_path)
+        try:
+            # Databases from before findings carried their process
+            ensure_columns(conn, 'findings', {'process_key': 'TEXT'})
+            ids = sorted(stale)
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                cur = conn.execute(f"DELETE FROM findings WHERE rule_id IN ({','.join('?' * len(batch))})", batch)
+                self.removed += cur.rowcount or 0
+            conn.commit()
+        finally:
+            conn.close()
+
+    def add(self, rows: List[Dict[str, Any]]) -> None:
+        insert_findings(rows, db_path=self.db_path)
+
+    def commit(self, hashes: Dict[str, str]) -> None:
+        save_rule_hashes(hashes, db_path=self.db_path)
+
+
+class ParquetHunt:
+    # Events from a run's .parquet output; its .findings.parquet is rewritten
+    # with the pack hashes in the schema metadata
+    def __init__(self, events_path: str, findings_path: str) -> None:
+        self.events_path = events_path
+        self.findings_path = findings_path
+        self.stale: Set[str] = set()
+        self.new_rows: List[Dict[str, Any]] = []
+        self.removed = 0
+
+    def stored_hashes(self) -> Dict[str, str]:
+        import pyarrow.parquet as pq
+        if not os.path.exists(self.findings_path):
+            return {}
+        meta = pq.read_schema(self.findings_path).metadata or {}
+        raw = meta.get(RULE_HASHES_KEY)
+        return orjson.loads(raw) if raw else {}
+
+    def events(self, scope: Optional[Scope]) -> Iterator[Dict[str, Any]]:
+        import pyarrow.dataset as ds
+        expr = None
+        for channel, ids in scope or []:
+            part = None
+            if channel is not None:
+                part = ds.field('channel') == channel
+            if ids is not None:
+                cond = ds.field('event_id').isin(sorted(ids))
+                part = cond if part is None else part & cond
+            if part is None:
+                expr = None
+                scope = None
+                break
+            expr = part if expr is None else expr | part
+        if scope is not None and expr is None:
+            return
+        dataset = ds.dataset(self.events_path, format='parquet')
+        for batch in dataset.to_batches(columns=EVENT_COLUMNS + ['data'], filter=expr):
+            for row in batch.to_pylist():
+                row['event_pk'] = row.pop('id')
+                data = row.pop('data')
+                row['data'] = orjson.loads(data) if data else {}
+                yield row
+
+    def begin(self, stale: Set[str]) -> None:
+        self.stale = stale
+
+    def add(self, rows: List[Dict[str, Any]]) -> None:
+        self.new_rows.extend(rows)
+
+    def commit(self, hashes: Dict[str, str]) -> None:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+        from .exporters import FindingsParquetExporter
+        # Reuse the exporter's schema and row layout for the new findings
+        tmp = f'{self.findings_path}.{os.getpid()}.tmp'
+        out = FindingsParquetExporter(tmp, rule_hashes=hashes)
+        kept = None
+        if os.path.exists(self.findings_path):
+            table = pq.read_table(self.findings_path)
+            mask = pc.invert(pc.is_in(table['rule_id'], value_set=pa.array(sorted(self.stale), pa.string())))
+            kept = table.filter(pc.fill_null(mask, True)).cast(out.schema)
+            self.removed = table.num_rows - kept.num_rows
+            if table.num_rows:
+                out.next_id = int(pc.max(table['id']).as_py() or 0) + 1
+        out.writer = pq.ParquetWriter(tmp, out.schema)
+        if kept is not None and kept.num_rows:
+            out.writer.write_table(kept)
+        for row in self.new_rows:
+            out.write(row)
+        out.close()
+        os.replace(tmp, self.findings_path)
+
+
+def retrohunt(store: Any, rule_set: RuleSet, safelist: Any, mapper: Any = None,
+              rule_batch: Any = None) -> Dict[str, Any]:
+    # Evaluates only the rules whose content hash is new or different from
+    # the one stored with the findings, over the events their logsource or
+    # channel/event_id conditions can match. `rule_batch` is a factory for a
+    # batch_rules.BatchRuleEngine over the rules to run (or None). Correlation
+    # rules replay the events source by source, in stored order, through a
+    # CorrelationEngine the way ingest streams them.
+    t0 = time.perf_counter()
+    current = rule_set.content_hashes()
+    diff = diff_hashes(current, store.stored_hashes())
+    todo = set(diff['added']) | set(diff['changed'])
+    store.begin(todo | set(diff['deleted']))
+    hunt = RuleSet()
+    hunt.rules = [r for r in rule_set.rules if r.rule_id in todo]
+    hunt.correlations = [c for c in rule_set.correlations if c.rule_id in todo]
+    scope = rules_scope(hunt.rules + [step.selector for c in hunt.correlations for step in c.steps])
+    engine = rule_batch(hunt) if rule_batch is not None and hunt.rules else None
+    correlator = CorrelationEngine(hunt.correlations) if hunt.correlations else None
+    source = None
+    scanned = 0
+    added = 0
+    pending: List[Dict[str, Any]] = []
+
+    def emit(evt: Dict[str, Any], hits: List[Dict[str, Any]]) -> None:
+        nonlocal added
+        for h in hits:
+            if safelist.is_finding_safelisted(h):
+                continue
+            pending.append(finding_row(evt, h))
+            added += 1
+        if len(pending) >= 500:
+            store.add(pending)
+            pending.clear()
+
+    if hunt.rules or correlator is not None:
+        for evt in store.events(scope):
+            scanned += 1
+            if mapper is not None:
+                evt = mapper.enrich(evt)
+            if safelist.is_event_safelisted(evt):
+                continue
+            if engine is not None:
+                for e, hits in engine.add(evt):
+                    emit(e, hits)
+            elif hunt.rules:
+                emit(evt, hunt.evaluate(evt))
+            if correlator is not None and evt.get('timestamp'):
+                if evt.get('source') != source:
+                    correlator.end_source(source)
+                    source = evt.get('source')
+                evt['timestamp_dt'] = parse_iso8601_utc(evt['timestamp'])
+                for e, h in correlator.push(evt):
+                    emit(e, [h])
+        if engine is not None:
+            for e, hits in engine.flush():
+                emit(e, hits)
+        if correlator is not None:
+            for e, h in correlator.flush():
+                emit(e, [h])
+    if pending:
+        store.add(pending)
+    store.commit(current)
+    return {
+        'rules': {k: len(v) for k, v in diff.items()},
+        'added_rules': diff['added'],
+        'changed_rules': diff['changed'],
+        'deleted_rules': diff['deleted'],
+        'scope': None if scope is None else [[ch, sorted(ids) if ids is not None else None] for ch, ids in scope],
+        'events_scanned': scanned,
+        'findings_removed': store.removed,
+        'findings_added': added,
+        'seconds': round(time.perf_counter() - t0, 3),
+    }
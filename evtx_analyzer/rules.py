@@ -1,7 +1,8 @@
 import os
 import re
-import yaml
-from typing import Any, Dict, List, Optional, Union
+import json
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 
 SUPPORTED_OPS = {
@@ -10,6 +11,13 @@ SUPPORTED_OPS = {
 }
 
 
+def content_hash(item: Any) -> str:
+    # Hash of a rule's definition as loaded from YAML, independent of key
+    # order and formatting; retrohunt compares it across runs
+    raw = json.dumps(item, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
 class RuleCondition:
     def __init__(self, field: str, op: str, value: Any) -> None:
         if op not in SUPPORTED_OPS:
@@ -63,13 +71,14 @@ class Rule:
     def __init__(self, rule_id: str, description: str = '', severity: str = 'info',
                  any_of: Optional[List[RuleCondition]] = None,
                  all_of: Optional[List[RuleCondition]] = None,
-                 tags: Optional[List[str]] = None) -> None:
+                 tags: Optional[List[str]] = None, content_hash: str = '') -> None:
         self.rule_id = rule_id
         self.description = description
         self.severity = severity
         self.any_of = any_of or []
         self.all_of = all_of or []
         self.tags = tags or []
+        self.content_hash = content_hash
 
     def match(self, evt: Dict[str, Any]) -> bool:
         if self.all_of:
@@ -85,29 +94,44 @@ class Rule:
 class RuleSet:
     def __init__(self) -> None:
         self.rules: List[Rule] = []
+        # Multi-event rules (type: correlation), evaluated by correlation.CorrelationEngine
+        self.correlations: List[Any] = []
+        self.from_cache = False
+
+    def load_dir(self, rules_dir: str, use_cache: bool = True, cache_dir: Optional[str] = None,
+                 rebuild_cache: bool = False) -> int:
+        if use_cache:
+            from .cache import load_or_build
+            (rules, correlations), self.from_cache = load_or_build(
+                'rules', rules_dir, ('.yml', '.yaml'), lambda: self._compile_dir(rules_dir),
+                cache_dir=cache_dir, rebuild=rebuild_cache)
+        else:
+            rules, correlations = self._compile_dir(rules_dir)
+        self.rules.extend(rules)
+        self.correlations.extend(correlations)
+        return len(rules) + len(correlations)
 
-    def load_dir(self, rules_dir: str) -> int:
-        count = 0
+    def _compile_dir(self, rules_dir: str) -> Tuple[List[Rule], List[Any]]:
+        import yaml
+        compiled = RuleSet()
         for root, _dirs, files in os.walk(rules_dir):
-            for f in files:
+            for f in sorted(files):
                 if not f.lower().endswith(('.yml', '.yaml')):
                     continue
                 path = os.path.join(root, f)
                 try:
                     with open(path, 'r', encoding='utf-8') as fh:
                         data = yaml.safe_load(fh)
-                        count += self._load_from_obj(data)
+                        compiled._load_from_obj(data)
                 except Exception:
                     continue
-        return count
+        return compiled.rules, compiled.correlations
 
     def _load_from_obj(self, obj: Any) -> int:
         loaded = 0
         if isinstance(obj, list):
             for item in obj:
-                r = self._rule_from_item(item)
-                if r:
-                    self.rules.append(r)
+                if self._add_item(item):
                     loaded += 1
         elif isinstance(obj, dict):
             # Allow {id: rule_def}
@@ -115,12 +139,24 @@ class RuleSet:
                 if isinstance(item, dict) and 'id' not in item:
                     item = dict(item)
                     item['id'] = key
-                r = self._rule_from_item(item)
-                if r:
-                    self.rules.append(r)
+                if self._add_item(item):
                     loaded += 1
         return loaded
 
+    def _add_item(self, item: Any) -> bool:
+        if isinstance(item, dict) and str(item.get('type') or '').lower() == 'correlation':
+            from .correlation import CorrelationRule
+            c = CorrelationRule.from_item(item)
+            if c:
+                self.correlations.append(c)
+                return True
+            return False
+        r = self._rule_from_item(item)
+        if r:
+            self.rules.append(r)
+            return True
+        return False
+
     def _rule_from_item(self, item: Any) -> Optional[Rule]:
         if not isinstance(item, dict):
             return None
@@ -136,7 +172,16 @@ class RuleSet:
         all_of = []
         for c in (item.get('all') or []):
             all_of.append(RuleCondition(str(c.get('field')), str(c.get('op')), c.get('value')))
-        return Rule(rule_id=rule_id, description=description, severity=severity, any_of=any_of, all_of=all_of, tags=tags)
+        return Rule(rule_id=rule_id, description=description, severity=severity, any_of=any_of, all_of=all_of, tags=tags,
+                    content_hash=content_hash(item))
+
+    def content_hashes(self) -> Dict[str, str]:
+        # rule_id -> content hash of the pack (correlation rules included);
+        # ids defined more than once get one hash over all their definitions
+        by_id: Dict[str, List[str]] = {}
+        for r in self.rules + self.correlations:
+            by_id.setdefault(r.rule_id, []).append(r.content_hash)
+        return {rid: hs[0] if len(hs) == 1 else content_hash(sorted(hs)) for rid, hs in by_id.items()}
 
     def evaluate(self, evt: Dict[str, Any]) -> List[Dict[str, Any]]:
         findings: List[Dict[str, Any]] = []
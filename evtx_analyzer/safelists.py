@@ -1,7 +1,8 @@
 import os
 import re
-import yaml
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
+
+BUCKETS = ('usernames', 'sids', 'computers', 'processes', 'commandlines', 'event_ids', 'rule_ids')
 
 
 class Safelist:
@@ -13,6 +14,7 @@ class Safelist:
         self.commandlines: List[re.Pattern] = []
         self.event_ids: List[re.Pattern] = []
         self.rule_ids: List[re.Pattern] = []
+        self.from_cache = False
 
     def _compile_many(self, patterns: List[str]) -> List[re.Pattern]:
         out: List[re.Pattern] = []
@@ -32,10 +34,29 @@ class Safelist:
         self.event_ids += self._compile_many(list(obj.get('event_ids') or []))
         self.rule_ids += self._compile_many(list(obj.get('rule_ids') or []))
 
-    def load_dir(self, dir_path: str) -> int:
+    def load_dir(self, dir_path: str, use_cache: bool = True, cache_dir: Optional[str] = None,
+                 rebuild_cache: bool = False) -> int:
+        if use_cache:
+            from .cache import load_or_build
+            (buckets, count), self.from_cache = load_or_build(
+                'safelists', dir_path, ('.yml', '.yaml', '.txt'), lambda: self._compile_dir(dir_path),
+                cache_dir=cache_dir, rebuild=rebuild_cache)
+        else:
+            buckets, count = self._compile_dir(dir_path)
+        for name in BUCKETS:
+            getattr(self, name).extend(buckets.get(name) or [])
+        return count
+
+    def _compile_dir(self, dir_path: str) -> Tuple[Dict[str, List[re.Pattern]], int]:
+        compiled = Safelist()
+        count = compiled._load_files(dir_path)
+        return {name: getattr(compiled, name) for name in BUCKETS}, count
+
+    def _load_files(self, dir_path: str) -> int:
+        import yaml
         count = 0
         for root, _dirs, files in os.walk(dir_path):
-            for f in files:
+            for f in sorted(files):
                 path = os.path.join(root, f)
                 try:
                     if f.lower().endswith(('.yml', '.yaml')):
@@ -0,0 +1,205 @@
+import os
+import json
+import array
+import base64
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from .sketches import HyperLogLog, MAX_VALUE_LEN, _hash
+
+SCHEMA_SUFFIX = '.schema.json'
+SCHEMA_VERSION = 1
+SAMPLE_VALUES = 5
+# Distinct values are counted exactly (a set of 64-bit hashes) up to
+# EXACT_DISTINCT, then in a HyperLogLog: most EventData fields are
+# low-cardinality and stay exact and small
+EXACT_DISTINCT = 64
+HLL_PRECISION = 10
+
+Key = Tuple[Optional[str], Optional[str]]
+
+
+class FieldStats:
+    __slots__ = ('present', 'filled', 'hashes', 'hll', 'samples')
+
+    def __init__(self) -> None:
+        # Events with the field at all / with a non-empty value
+        self.present = 0
+        self.filled = 0
+        self.hashes: Optional[set] = set()
+        self.hll: Optional[HyperLogLog] = None
+        self.samples: List[str] = []
+
+    def add(self, value: Any) -> None:
+        self.present += 1
+        if value is None or value == '':
+            return
+        self.filled += 1
+        value = str(value)[:MAX_VALUE_LEN]
+        h = _hash(value)[0]
+        if self.hll is not None:
+            self.hll.add(h)
+            return
+        if h in self.hashes:
+            return
+        self.hashes.add(h)
+        if len(self.samples) < SAMPLE_VALUES:
+            self.samples.append(value)
+        if len(self.hashes) > EXACT_DISTINCT:
+            self._promote()
+
+    def _promote(self) -> None:
+        self.hll = HyperLogLog(HLL_PRECISION)
+        for h in self.hashes:
+            self.hll.add(h)
+        self.hashes = None
+
+    def distinct(self) -> int:
+        if self.hll is not None:
+            return self.hll.count()
+        return len(self.hashes)
+
+    def merge(self, other: 'FieldStats') -> None:
+        self.present += other.present
+        self.filled += other.filled
+        for v in other.samples:
+            if len(self.samples) >= SAMPLE_VALUES:
+                break
+            if v not in self.samples:
+                self.samples.append(v)
+        if self.hll is None and other.hll is None:
+            self.hashes |= other.hashes
+            if len(self.hashes) > EXACT_DISTINCT:
+                self._promote()
+            return
+        if self.hll is None:
+            self._promote()
+        if other.hll is not None:
+            self.hll.merge(other.hll)
+        else:
+            for h in other.hashes:
+                self.hll.add(h)
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {'present': self.present, 'filled': self.filled, 'samples': self.samples}
+        if self.hll is not None:
+            out['hll'] = self.hll.to_dict()
+        else:
+            out['hashes'] = base64.b64encode(array.array('Q', sorted(self.hashes)).tobytes()).decode('ascii')
+        return out
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FieldStats':
+        fs = cls()
+        fs.present = int(data.get('present') or 0)
+        fs.filled = int(data.get('filled') or 0)
+        fs.samples = list(data.get('samples') or [])
+        if data.get('hll'):
+            fs.hll = HyperLogLog.from_dict(data['hll'])
+            fs.hashes = None
+        else:
+            hashes = array.array('Q')
+            hashes.frombytes(base64.b64decode(data.get('hashes') or ''))
+            fs.hashes = set(hashes)
+        return fs
+
+
+class SchemaCatalog:
+    # EventData schema per (channel, event_id), maintained during ingest:
+    # field names, fill rate, distinct count (exact, then HyperLogLog) and the
+    # first few distinct values. Written next to the outputs as
+    # <prefix>.schema.json and merged across case hosts / distributed shards,
+    # so the UI and DSL autocomplete never scan events for it.
+    def __init__(self) -> None:
+        self.types: Dict[Key, Dict[str, Any]] = {}
+        self.events = 0
+        # The live server reads while the pipeline thread updates
+        self.lock = threading.Lock()
+
+    def update(self, evt: Dict[str, Any]) -> None:
+        key = (evt.get('channel'), evt.get('event_id'))
+        data = evt.get('data')
+        with self.lock:
+            self.events += 1
+            entry = self.types.get(key)
+            if entry is None:
+                entry = self.types[key] = {'events': 0, 'fields': {}}
+            entry['events'] += 1
+            if not isinstance(data, dict):
+                return
+            fields = entry['fields']
+            for name, value in data.items():
+                fs = fields.get(name)
+                if fs is None:
+                    fs = fields[name] = FieldStats()
+                fs.add(value)
+
+    def merge(self, other: 'SchemaCatalog') -> None:
+        with self.lock:
+            self.events += other.events
+            for key, theirs in other.types.items():
+                entry = self.types.get(key)
+                if entry is None:
+                    self.types[key] = theirs
+                    continue
+                entry['events'] += theirs['events']
+                for name, fs in theirs['fields'].items():
+                    if name in entry['fields']:
+                        entry['fields'][name].merge(fs)
+                    else:
+                        entry['fields'][name] = fs
+
+    def catalog(self, channel: Optional[str] = None, event_id: Optional[str] = None,
+                samples: bool = True) -> Dict[str, Any]:
+        # API view; `fields` is the union of field names over the selected types
+        with self.lock:
+            types = []
+            names: Dict[str, int] = {}
+            for (ch, eid), entry in self.types.items():
+                if channel is not None and ch != channel:
+                    continue
+                if event_id is not None and eid != event_id:
+                    continue
+                n = entry['events']
+                fields = []
+                for name, fs in sorted(entry['fields'].items()):
+                    item = {'field': name, 'present': fs.present, 'filled': fs.filled,
+                            'fill_rate': round(fs.filled / n, 4) if n else 0.0, 'distinct': fs.distinct(),
+                            'distinct_exact': fs.hll is None}
+                    if samples:
+                        item['samples'] = fs.samples
+                    fields.append(item)
+                    names[name] = names.get(name, 0) + fs.filled
+                types.append({'channel': ch, 'event_id': eid, 'events': n, 'fields': fields})
+        types.sort(key=lambda t: (-t['events'], t['channel'] or '', t['event_id'] or ''))
+        return {'events': self.events, 'types': types,
+                'fields': sorted(names, key=lambda k: (-names[k], k))}
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {'version': SCHEMA_VERSION, 'events': self.events, 'types': [
+                {'channel': ch, 'event_id': eid, 'events': entry['events'],
+                 'fields': {name: fs.to_dict() for name, fs in entry['fields'].items()}}
+                for (ch, eid), entry in self.types.items()]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SchemaCatalog':
+        catalog = cls()
+        catalog.events = int(data.get('events') or 0)
+        for item in data.get('types') or []:
+            catalog.types[(item.get('channel'), item.get('event_id'))] = {
+                'events': int(item.get('events') or 0),
+                'fields': {name: FieldStats.from_dict(fs) for name, fs in (item.get('fields') or {}).items()},
+            }
+        return catalog
+
+    def save(self, path: str) -> None:
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump(self.to_dict(), fh, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'SchemaCatalog':
+        with open(path, 'r', encoding='utf-8') as fh:
+            return cls.from_dict(json.load(fh))
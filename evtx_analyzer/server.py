@@ -1,13 +1,49 @@
 import os
+import io
+import csv
 import json
+import math
 import sqlite3
-from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+import orjson
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from fastapi import FastAPI, Query, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from .dsl_sql import compile_condition, compile_dsl, register_functions
+from .logon_sessions import get_session as find_session, sessions_where, COLUMNS as SESSION_COLUMNS, SESSION_SORT_COLS
+from .process_tree import (ancestors, descendants, find_process, lineage as process_lineage, MAX_DEPTH,
+                           MAX_DESCENDANTS)
+from .storage import (drop_storage_columns, ensure_columns, ensure_event_indexes, events_where, findings_where,
+                      indexed_fields, order_by, EVENT_SORT_COLS, FINDING_SORT_COLS)
 
 DB_PATH = os.path.join(os.getcwd(), 'outputs', 'events.db')
 
+# backend: 'sqlite' (DB_PATH), 'parquet' (query the Parquet outputs directly)
+# or 'case' (fan out over the per-host shards of a case directory)
+SETTINGS: Dict[str, Any] = {
+    'backend': 'sqlite',
+    'events_parquet': None,
+    'findings_parquet': None,
+    'case_dir': None,
+    'live_feed': None,
+    # Ingest sketches: a summary JSON path, or the live pipeline's SketchSet
+    'summary_path': None,
+    'sketches': None,
+    # EventData schema catalog: a <output>.schema.json path, or the live
+    # pipeline's SchemaCatalog
+    'schema_path': None,
+    'schema': None,
+    # Stacking bottom-N summary (<output>.stacks.json)
+    'stacks_path': None,
+}
+_SUMMARY_CACHE: Dict[str, Any] = {}
+_STACKS_CACHE: Dict[str, Any] = {}
+_SCHEMA_CACHE: Dict[str, Any] = {}
+
+EXPORT_FETCH_SIZE = 1000
+EXPORT_PARQUET_ROW_GROUP = 50000
+EXPORT_FIELDS = ['id', 'timestamp', 'channel', 'event_id', 'computer', 'provider', 'record_id', 'user_sid', 'data', 'source']
+
 app = FastAPI(title='Win EVTX Analyzer')
 app.add_middleware(
     CORSMiddleware,
@@ -18,10 +54,38 @@ app.add_middleware(
 )
 
 
-def _get_db() -> sqlite3.Connection:
+def configure(**kwargs: Any) -> None:
+    SETTINGS.update(kwargs)
+
+
+def _store(host: Optional[str] = None):
+    backend = SETTINGS.get('backend')
+    if backend == 'parquet':
+        from .parquet_store import ParquetStore
+        return ParquetStore(SETTINGS['events_parquet'], SETTINGS.get('findings_parquet'))
+    if backend == 'case':
+        from .case import CaseStore
+        return CaseStore(SETTINGS['case_dir'], host=host)
+    return None
+
+
+def _normalize_ts(value: Optional[str]) -> Optional[str]:
+    # Stored timestamps are ISO8601 UTC with a Z suffix; normalize user input
+    # so plain string comparison works in SQLite and in Parquet statistics.
+    if not value:
+        return None
+    try:
+        from .utils import parse_iso8601_utc
+        return parse_iso8601_utc(value).isoformat().replace('+00:00', 'Z')
+    except Exception:
+        raise HTTPException(status_code=400, detail=f'Invalid timestamp: {value}')
+
+
+def _get_db(check_same_thread: bool = True) -> sqlite3.Connection:
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
+    register_functions(conn, DB_PATH)
     return conn
 
 
@@ -39,10 +103,21 @@ def init_db() -> None:
                 provider TEXT,
                 record_id TEXT,
                 user_sid TEXT,
-                data_json TEXT
+                data_json TEXT,
+                source TEXT
             )
             """
         )
+        ensure_columns(conn, 'events', {'source': 'TEXT', 'ptr_path': 'TEXT', 'ptr_chunk': 'INTEGER',
+                                        'ptr_record': 'INTEGER', 'data_zstd': 'BLOB', 'data_dict': 'INTEGER',
+                                        'hot_json': 'TEXT'})
+        from .logon_sessions import init_tables as init_session_tables
+        from .payload_codec import init_tables
+        from .process_tree import init_tables as init_process_tables
+        init_tables(conn)
+        init_process_tables(conn)
+        init_session_tables(conn)
+        ensure_event_indexes(conn)
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS findings (
@@ -58,68 +133,319 @@ def init_db() -> None:
             )
             """
         )
+        ensure_columns(conn, 'findings', {'process_key': 'TEXT'})
         conn.commit()
     finally:
         conn.close()
 
 
+def _with_data(item: Dict[str, Any]) -> Dict[str, Any]:
+    # `data` from data_json (decompressed first for --compress-data rows), or
+    # re-decoded from the source record for rows stored with --store-pointers
+    # (small LRU in pointers.py)
+    from .payload_codec import load_payload
+    from .pointers import resolve_data
+    load_payload(item, DB_PATH)
+    if isinstance(item.get('data_json'), str):
+        try:
+            item['data'] = json.loads(item['data_json'])
+        except Exception:
+            item['data'] = None
+    resolve_data(item)
+    return drop_storage_columns(item)
+
+
+# Query parameters of the event endpoints; any other parameter naming a
+# promoted EventData field (see /api/events/fields) filters on it
+EVENT_PARAMS = {'q', 'channel', 'event_id', 'since', 'until', 'dsl', 'limit', 'offset', 'sort_by', 'sort_dir',
+                'host', 'format'}
+
+
+def _field_filters(request: Request, columns: Dict[str, str]) -> Dict[str, str]:
+    return {k: v for k, v in request.query_params.items() if k in columns and k not in EVENT_PARAMS}
+
+
+def _sqlite_fields(conn: sqlite3.Connection, request: Request) -> Tuple[Dict[str, str], Dict[str, str]]:
+    columns = indexed_fields(conn)
+    return _field_filters(request, columns), columns
+
+
+def _events_order(sort_by: str, sort_dir: str) -> str:
+    sort_by, sort_dir = order_by(sort_by, sort_dir, EVENT_SORT_COLS, 'timestamp')
+    return f"ORDER BY {sort_by} {sort_dir}"
+
+
 @app.get('/api/events')
 def list_events(
+    request: Request,
     q: Optional[str] = Query(default=None),
     channel: Optional[str] = Query(default=None),
     event_id: Optional[str] = Query(default=None),
+    since: Optional[str] = Query(default=None),
+    until: Optional[str] = Query(default=None),
+    dsl: Optional[str] = Query(default=None),
     limit: int = Query(default=50, ge=1, le=500),
     offset: int = Query(default=0, ge=0),
     sort_by: str = Query(default='timestamp'),
     sort_dir: str = Query(default='desc'),
+    host: Optional[str] = Query(default=None),
 ):
+    since, until = _normalize_ts(since), _normalize_ts(until)
+    store = _store(host)
+    if store is not None:
+        _check_dsl(dsl)
+        columns = store.indexed_fields()
+        return store.list_events(q, channel, event_id, since, until, limit, offset, sort_by, sort_dir, dsl=dsl,
+                                 fields=_field_filters(request, columns))
     conn = _get_db()
     try:
-        clauses = []
-        params: List[Any] = []
-        if q:
-            clauses.append('(data_json LIKE ? OR computer LIKE ? OR provider LIKE ? OR user_sid LIKE ?)')
-            like = f'%{q}%'
-            params += [like, like, like, like]
-        if channel:
-            clauses.append('channel = ?')
-            params.append(channel)
-        if event_id:
-            clauses.append('event_id = ?')
-            params.append(event_id)
-        where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
-        allowed_cols = {'timestamp','channel','event_id','computer','provider','user_sid'}
-        if sort_by not in allowed_cols:
-            sort_by = 'timestamp'
-        sort_dir = 'ASC' if str(sort_dir).lower() == 'asc' else 'DESC'
-        sql = f"SELECT * FROM events {where} ORDER BY {sort_by} {sort_dir} LIMIT ? OFFSET ?"
+        fields, columns = _sqlite_fields(conn, request)
+        where, params = events_where(q, channel, event_id, since, until, dsl, fields, columns)
+        order = _events_order(sort_by, sort_dir)
+        sql = f"SELECT * FROM events {where} {order} LIMIT ? OFFSET ?"
         params_w_limit = params + [limit, offset]
         rows = [dict(r) for r in conn.execute(sql, params_w_limit)]
         for r in rows:
-            if isinstance(r.get('data_json'), str):
-                try:
-                    r['data'] = json.loads(r['data_json'])
-                except Exception:
-                    r['data'] = None
+            _with_data(r)
         total = conn.execute(f"SELECT COUNT(*) as c FROM events {where}", params).fetchone()['c'] if where else conn.execute("SELECT COUNT(*) as c FROM events").fetchone()['c']
         return {"items": rows, "total": total}
     finally:
         conn.close()
 
 
+def _iter_export_batches(sql: str, params: List[Any]) -> Iterator[List[Dict[str, Any]]]:
+    # Server-side cursor: rows are pulled from SQLite in fixed-size batches,
+    # so memory stays flat whatever the size of the result set.
+    conn = _get_db(check_same_thread=False)
+    try:
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            batch = []
+            for r in rows:
+                item = _with_data(dict(r))
+                item.pop('data_json', None)
+                batch.append(item)
+            yield batch
+    finally:
+        conn.close()
+
+
+def _export_jsonl(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    for batch in batches:
+        yield b''.join(orjson.dumps(item) + b"\n" for item in batch)
+
+
+def _export_csv(batches: Iterator[List[Dict[str, Any]]], fields: List[str] = EXPORT_FIELDS) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields)
+    writer.writeheader()
+    for batch in batches:
+        for item in batch:
+            row = dict(item)
+            row['data'] = orjson.dumps(item['data']).decode('utf-8') if item.get('data') is not None else ''
+            writer.writerow(row)
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate(0)
+
+
+class _ChunkSink:
+    # Write-only file object handed to pyarrow; whatever was written since the
+    # last drain() is passed on to the HTTP response.
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+        self.pos = 0
+        self.closed = False
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self.chunks.append(data)
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = b''.join(self.chunks)
+        self.chunks.clear()
+        return out
+
+
+def _export_parquet(batches: Iterator[List[Dict[str, Any]]], fields: List[str] = EXPORT_FIELDS) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([pa.field(f, pa.int64() if f == 'id' else pa.string()) for f in fields])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+    pending: List[Dict[str, Any]] = []
+    for batch in batches:
+        for item in batch:
+            row = dict(item)
+            row['data'] = orjson.dumps(item['data']).decode('utf-8') if item.get('data') is not None else None
+            pending.append(row)
+        if len(pending) >= EXPORT_PARQUET_ROW_GROUP:
+            writer.write_table(pa.Table.from_pylist(pending, schema=schema))
+            pending.clear()
+            yield sink.drain()
+    if pending:
+        writer.write_table(pa.Table.from_pylist(pending, schema=schema))
+    writer.close()
+    yield sink.drain()
+
+
+@app.get('/api/events/export')
+def export_events(
+    request: Request,
+    q: Optional[str] = Query(default=None),
+    channel: Optional[str] = Query(default=None),
+    event_id: Optional[str] = Query(default=None),
+    since: Optional[str] = Query(default=None),
+    until: Optional[str] = Query(default=None),
+    dsl: Optional[str] = Query(default=None),
+    format: str = Query(default='jsonl'),
+    sort_by: str = Query(default='timestamp'),
+    sort_dir: str = Query(default='desc'),
+    host: Optional[str] = Query(default=None),
+):
+    fmt = str(format).lower()
+    if fmt not in ('jsonl', 'csv', 'parquet'):
+        raise HTTPException(status_code=400, detail='Unsupported format (jsonl, csv, parquet)')
+    since, until = _normalize_ts(since), _normalize_ts(until)
+    fields = EXPORT_FIELDS + ['host'] if SETTINGS.get('backend') == 'case' else EXPORT_FIELDS
+    store = _store(host)
+    if store is not None:
+        _check_dsl(dsl)
+        expr = store.event_filter(q, channel, event_id, since, until, dsl=dsl,
+                                  fields=_field_filters(request, store.indexed_fields()))
+        batches = ([{c: r.get(c) for c in fields} for r in b]
+                   for b in store.iter_events(expr, EXPORT_FETCH_SIZE, sort_by=sort_by, sort_dir=sort_dir))
+    else:
+        conn = _get_db()
+        try:
+            field_filters, columns = _sqlite_fields(conn, request)
+        finally:
+            conn.close()
+        where, params = events_where(q, channel, event_id, since, until, dsl, field_filters, columns)
+        order = _events_order(sort_by, sort_dir)
+        cols = ', '.join(c for c in EXPORT_FIELDS if c != 'data')
+        sql = f"SELECT {cols}, data_json, data_zstd, data_dict, ptr_path, ptr_chunk, ptr_record FROM events {where} {order}"
+        batches = _iter_export_batches(sql, params)
+    if fmt == 'jsonl':
+        body, media_type = _export_jsonl(batches), 'application/x-ndjson'
+    elif fmt == 'csv':
+        body, media_type = _export_csv(batches, fields), 'text/csv'
+    else:
+        body, media_type = _export_parquet(batches, fields), 'application/vnd.apache.parquet'
+    headers = {"Content-Disposition": f"attachment; filename=events.{fmt}"}
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+
+@app.get('/api/events/fields')
+def event_fields(host: Optional[str] = None):
+    # Promoted EventData fields: usable as /api/events?<field>=<value> filters
+    store = _store(host)
+    if store is not None:
+        columns = store.indexed_fields()
+    else:
+        conn = _get_db()
+        try:
+            columns = indexed_fields(conn)
+        finally:
+            conn.close()
+    return {"items": [{"field": f, "column": c} for f, c in sorted(columns.items())]}
+
+
+def _check_dsl(dsl: Optional[str]) -> None:
+    if dsl and SETTINGS.get('backend') == 'parquet':
+        raise HTTPException(status_code=400, detail='dsl needs the sqlite or case backend')
+
+
+@app.get('/api/events/explain')
+def explain_events(
+    request: Request,
+    q: Optional[str] = Query(default=None),
+    channel: Optional[str] = Query(default=None),
+    event_id: Optional[str] = Query(default=None),
+    since: Optional[str] = Query(default=None),
+    until: Optional[str] = Query(default=None),
+    dsl: Optional[str] = Query(default=None),
+    sort_by: str = Query(default='timestamp'),
+    sort_dir: str = Query(default='desc'),
+    host: Optional[str] = Query(default=None),
+):
+    # The SQL /api/events runs for these filters, how each DSL clause was
+    # compiled, and SQLite's query plan (per host shard for a case)
+    since, until = _normalize_ts(since), _normalize_ts(until)
+    _check_dsl(dsl)
+    backend = SETTINGS.get('backend')
+    if backend not in ('sqlite', 'case'):
+        raise HTTPException(status_code=404, detail='Query plans need the sqlite or case backend')
+    if backend == 'case':
+        from .case import CaseStore
+        store = CaseStore(SETTINGS['case_dir'], host=host)
+        fields = _field_filters(request, store.indexed_fields())
+        columns = store.indexed_fields(common=True)
+    else:
+        conn = _get_db()
+        try:
+            fields, columns = _sqlite_fields(conn, request)
+        finally:
+            conn.close()
+    where, params = events_where(q, channel, event_id, since, until, dsl, fields, columns)
+    sql = f"SELECT * FROM events {where} {_events_order(sort_by, sort_dir)} LIMIT ? OFFSET ?"
+    result: Dict[str, Any] = {
+        'sql': sql,
+        'params': params + [50, 0],
+        'fields': [compile_condition(f, '==', v, columns) for f, v in sorted(fields.items())],
+        'dsl': compile_dsl(dsl, columns)['clauses'] if dsl else [],
+    }
+
+    def plan(conn: sqlite3.Connection) -> List[str]:
+        return [r[3] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql, params + [50, 0])]
+
+    if backend == 'case':
+        from .case import _connect
+        plans = {}
+        for shard in store.event_filter(q, channel, event_id, since, until)['shards']:
+            conn = _connect(shard.db_path)
+            try:
+                plans[shard.host] = plan(conn)
+            finally:
+                conn.close()
+        result['plans'] = plans
+        return result
+    conn = _get_db()
+    try:
+        result['plan'] = plan(conn)
+    finally:
+        conn.close()
+    return result
+
+
 @app.get('/api/events/{event_pk}')
 def get_event(event_pk: int):
+    store = _store()
+    if store is not None:
+        data = store.get_event(event_pk)
+        if not data:
+            raise HTTPException(status_code=404, detail='Not found')
+        return data
     conn = _get_db()
     try:
         row = conn.execute("SELECT * FROM events WHERE id = ?", (event_pk,)).fetchone()
         if not row:
             raise HTTPException(status_code=404, detail='Not found')
-        data = dict(row)
-        if isinstance(data.get('data_json'), str):
-            try:
-                data['data'] = json.loads(data['data_json'])
-            except Exception:
-                data['data'] = None
+        data = _with_data(dict(row))
         return data
     finally:
         conn.close()
@@ -127,17 +453,20 @@ def get_event(event_pk: int):
 
 @app.get('/api/events/{event_pk}/download')
 def download_event(event_pk: int):
+    store = _store()
+    if store is not None:
+        data = store.get_event(event_pk)
+        if not data:
+            raise HTTPException(status_code=404, detail='Not found')
+        payload = {k: v for k, v in data.items() if k != 'data_json'}
+        headers = {"Content-Disposition": f"attachment; filename=event_{event_pk}.json"}
+        return JSONResponse(content=payload, headers=headers)
     conn = _get_db()
     try:
         row = conn.execute("SELECT * FROM events WHERE id = ?", (event_pk,)).fetchone()
         if not row:
             raise HTTPException(status_code=404, detail='Not found')
-        data = dict(row)
-        if isinstance(data.get('data_json'), str):
-            try:
-                data['data'] = json.loads(data['data_json'])
-            except Exception:
-                data['data'] = None
+        data = _with_data(dict(row))
         payload = {k: v for k, v in data.items() if k != 'data_json'}
         headers = {"Content-Disposition": f"attachment; filename=event_{event_pk}.json"}
         return JSONResponse(content=payload, headers=headers)
@@ -156,43 +485,214 @@ def list_findings(
     offset: int = Query(default=0, ge=0),
     sort_by: str = Query(default='event_timestamp'),
     sort_dir: str = Query(default='desc'),
+    host: Optional[str] = Query(default=None),
+    lineage: bool = Query(default=True),
 ):
+    # `lineage`: root-first process chain of each finding's process (process tree)
+    store = _store(host)
+    if store is not None:
+        result = store.list_findings(q, rule_id, severity, channel, event_id, limit, offset, sort_by, sort_dir)
+        if lineage and SETTINGS.get('backend') == 'case':
+            store.finding_lineage(result['items'], MAX_DEPTH)
+        return result
     conn = _get_db()
     try:
-        clauses = []
-        params: List[Any] = []
-        if q:
-            like = f'%{q}%'
-            clauses.append('(description LIKE ? OR tags LIKE ? OR rule_id LIKE ?)')
-            params += [like, like, like]
-        if rule_id:
-            clauses.append('rule_id = ?')
-            params.append(rule_id)
-        if severity:
-            clauses.append('severity = ?')
-            params.append(severity)
-        if channel:
-            clauses.append('channel = ?')
-            params.append(channel)
-        if event_id:
-            clauses.append('event_id = ?')
-            params.append(event_id)
-        where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
-        allowed_cols = {'event_timestamp','channel','event_id','rule_id','severity'}
-        if sort_by not in allowed_cols:
-            sort_by = 'event_timestamp'
-        sort_dir = 'ASC' if str(sort_dir).lower() == 'asc' else 'DESC'
+        where, params = findings_where(q, rule_id, severity, channel, event_id)
+        sort_by, sort_dir = order_by(sort_by, sort_dir, FINDING_SORT_COLS, 'event_timestamp')
         sql = f"SELECT * FROM findings {where} ORDER BY {sort_by} {sort_dir} LIMIT ? OFFSET ?"
         params_w_limit = params + [limit, offset]
         rows = [dict(r) for r in conn.execute(sql, params_w_limit)]
         total = conn.execute(f"SELECT COUNT(*) as c FROM findings {where}", params).fetchone()['c'] if where else conn.execute("SELECT COUNT(*) as c FROM findings").fetchone()['c']
+        if lineage:
+            for row in rows:
+                node = find_process(conn, row['process_key']) if row.get('process_key') else None
+                row['lineage'] = process_lineage([node] + ancestors(conn, node['event_ref'], MAX_DEPTH)) \
+                    if node else None
         return {"items": rows, "total": total}
     finally:
         conn.close()
 
 
+@app.get('/api/findings/{finding_pk}/event')
+def get_finding_event(finding_pk: int):
+    # The event a finding was raised on, by primary key (findings.event_ref)
+    store = _store()
+    if store is not None:
+        data = store.get_finding_event(finding_pk)
+        if not data:
+            raise HTTPException(status_code=404, detail='Not found')
+        return data
+    conn = _get_db()
+    try:
+        row = conn.execute("SELECT e.* FROM findings f JOIN events e ON e.id = f.event_ref WHERE f.id = ?",
+                           (finding_pk,)).fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail='Not found')
+        data = _with_data(dict(row))
+        return data
+    finally:
+        conn.close()
+
+
+def _process_store(host: Optional[str]):
+    if SETTINGS.get('backend') == 'parquet':
+        raise HTTPException(status_code=400, detail='The process tree needs the sqlite or case backend')
+    return _store(host)
+
+
+def _process_or_404(conn: sqlite3.Connection, ident: str) -> Dict[str, Any]:
+    node = find_process(conn, ident)
+    if node is None:
+        raise HTTPException(status_code=404, detail='Process not found')
+    return node
+
+
+@app.get('/api/process/{ident}')
+def get_process(ident: str, host: Optional[str] = None):
+    # `ident`: the id of its Sysmon 1 / 4688 event, a ProcessGuid, or
+    # computer|pid|timestamp (the process with that pid running at that time)
+    store = _process_store(host)
+    if store is not None:
+        node = store.process(ident)
+        if node is None:
+            raise HTTPException(status_code=404, detail='Process not found')
+        return node
+    conn = _get_db()
+    try:
+        return _process_or_404(conn, ident)
+    finally:
+        conn.close()
+
+
+@app.get('/api/process/{ident}/ancestors')
+def get_process_ancestors(ident: str, max_depth: int = Query(default=MAX_DEPTH, ge=1, le=1000),
+                          host: Optional[str] = None):
+    # Parent first; recursive CTE over the indexed parent links
+    store = _process_store(host)
+    if store is not None:
+        result = store.process_ancestors(ident, max_depth)
+        if result is None:
+            raise HTTPException(status_code=404, detail='Process not found')
+        return result
+    conn = _get_db()
+    try:
+        node = _process_or_404(conn, ident)
+        items = ancestors(conn, node['event_ref'], max_depth)
+        return {'process': node, 'items': items,
+                'truncated': len(items) >= max_depth and items[-1]['parent_ref'] is not None}
+    finally:
+        conn.close()
+
+
+@app.get('/api/process/{ident}/descendants')
+def get_process_descendants(ident: str, max_depth: int = Query(default=MAX_DEPTH, ge=1, le=1000),
+                            limit: int = Query(default=1000, ge=1, le=MAX_DESCENDANTS),
+                            host: Optional[str] = None):
+    # Children, grandchildren, ... (breadth first, by start time per level)
+    store = _process_store(host)
+    if store is not None:
+        result = store.process_descendants(ident, max_depth, limit)
+        if result is None:
+            raise HTTPException(status_code=404, detail='Process not found')
+        return result
+    conn = _get_db()
+    try:
+        node = _process_or_404(conn, ident)
+        items = descendants(conn, node['event_ref'], max_depth, limit)
+        return {'process': node, 'items': items, 'truncated': len(items) >= limit}
+    finally:
+        conn.close()
+
+
+def _session_store(host: Optional[str]):
+    if SETTINGS.get('backend') == 'parquet':
+        raise HTTPException(status_code=400, detail='Logon sessions need the sqlite or case backend')
+    return _store(host)
+
+
+@app.get('/api/sessions')
+def list_sessions(
+    computer: Optional[str] = Query(default=None),
+    user: Optional[str] = Query(default=None),
+    logon_type: Optional[int] = Query(default=None),
+    source_ip: Optional[str] = Query(default=None),
+    logon_id: Optional[str] = Query(default=None),
+    privileged: Optional[bool] = Query(default=None),
+    since: Optional[str] = Query(default=None),
+    until: Optional[str] = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=500),
+    offset: int = Query(default=0, ge=0),
+    sort_by: str = Query(default='start_time'),
+    sort_dir: str = Query(default='desc'),
+    host: Optional[str] = Query(default=None),
+):
+    # Logon sessions (4624 .. 4634/4647, 4672 privileges); `since`/`until`
+    # select the sessions active in the window
+    since, until = _normalize_ts(since), _normalize_ts(until)
+    where, params = sessions_where(computer, user, logon_type, source_ip, logon_id, privileged, since, until)
+    store = _session_store(host)
+    if store is not None:
+        return store.list_sessions(where, params, limit, offset, sort_by, sort_dir)
+    conn = _get_db()
+    try:
+        sort_by, sort_dir = order_by(sort_by, sort_dir, SESSION_SORT_COLS, 'start_time')
+        sql = (f"SELECT {', '.join(SESSION_COLUMNS)} FROM logon_sessions {where} ORDER BY {sort_by} {sort_dir} "
+               f"LIMIT ? OFFSET ?")
+        rows = [dict(r) for r in conn.execute(sql, params + [limit, offset])]
+        total = conn.execute(f"SELECT COUNT(*) as c FROM logon_sessions {where}", params).fetchone()['c']
+        return {"items": rows, "total": total}
+    finally:
+        conn.close()
+
+
+@app.get('/api/sessions/{session_id}')
+def get_session(session_id: int):
+    store = _session_store(None)
+    if store is not None:
+        session = store.get_session(session_id)
+    else:
+        conn = _get_db()
+        try:
+            session = find_session(conn, session_id)
+        finally:
+            conn.close()
+    if session is None:
+        raise HTTPException(status_code=404, detail='Session not found')
+    return session
+
+
+@app.get('/api/sessions/{session_id}/events')
+def get_session_events(session_id: int, limit: int = Query(default=500, ge=1, le=5000),
+                       offset: int = Query(default=0, ge=0)):
+    # Every event with the session's LogonId, in time order, straight off the
+    # session_events index; `session_role` marks its logon/logoff/privileges
+    store = _session_store(None)
+    if store is not None:
+        result = store.session_events(session_id, limit, offset)
+        if result is None:
+            raise HTTPException(status_code=404, detail='Session not found')
+        return result
+    conn = _get_db()
+    try:
+        session = find_session(conn, session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail='Session not found')
+        rows = [_with_data(dict(r)) for r in conn.execute(
+            "SELECT e.*, x.role AS session_role FROM session_events x JOIN events e ON e.id = x.event_ref "
+            "WHERE x.session_id = ? ORDER BY x.timestamp, x.event_ref LIMIT ? OFFSET ?",
+            (session_id, limit, offset))]
+        total = conn.execute("SELECT COUNT(*) as c FROM session_events WHERE session_id = ?",
+                             (session_id,)).fetchone()['c']
+        return {'session': session, 'items': rows, 'total': total}
+    finally:
+        conn.close()
+
+
 @app.get('/api/stats/top_event_ids')
 def stats_top_event_ids(limit: int = Query(default=10, ge=1, le=100)):
+    store = _store()
+    if store is not None:
+        return {"items": store.top_counts('event_id', limit)}
     conn = _get_db()
     try:
         rows = conn.execute(
@@ -206,6 +706,9 @@ def stats_top_event_ids(limit: int = Query(default=10, ge=1, le=100)):
 
 @app.get('/api/stats/top_channels')
 def stats_top_channels(limit: int = Query(default=10, ge=1, le=100)):
+    store = _store()
+    if store is not None:
+        return {"items": store.top_counts('channel', limit)}
     conn = _get_db()
     try:
         rows = conn.execute(
@@ -225,6 +728,9 @@ def stats_trend(bucket: str = Query(default='hour')):
         select = "substr(timestamp,1,13) || ':00:00Z'"
     else:
         select = "substr(timestamp,1,10)"
+    store = _store()
+    if store is not None:
+        return {"items": store.trend(bucket)}
     conn = _get_db()
     try:
         rows = conn.execute(
@@ -235,6 +741,154 @@ def stats_trend(bucket: str = Query(default='hour')):
         conn.close()
 
 
+def _sketches(host: Optional[str] = None):
+    if SETTINGS.get('sketches') is not None:
+        return SETTINGS['sketches']
+    if SETTINGS.get('backend') == 'case':
+        from .case import CaseStore
+        sketches = CaseStore(SETTINGS['case_dir'], host=host).sketches()
+    else:
+        path = SETTINGS.get('summary_path')
+        if not path or not os.path.exists(path):
+            sketches = None
+        else:
+            key = (path, os.path.getmtime(path))
+            if _SUMMARY_CACHE.get('key') != key:
+                from .sketches import SketchSet
+                _SUMMARY_CACHE.update(key=key, sketches=SketchSet.load(path))
+            sketches = _SUMMARY_CACHE['sketches']
+    if sketches is None:
+        raise HTTPException(status_code=404, detail='No ingest summary available')
+    return sketches
+
+
+def _field_sketch(field: str, host: Optional[str]):
+    sketch = _sketches(host).field(field)
+    if sketch is None:
+        raise HTTPException(status_code=404, detail=f'Field not sketched: {field}')
+    return sketch
+
+
+@app.get('/api/stats/summary')
+def stats_summary(limit: int = Query(default=10, ge=1, le=1000), host: Optional[str] = None):
+    return _sketches(host).summary(limit)
+
+
+@app.get('/api/stats/fields/{field:path}/top')
+def stats_field_top(field: str, limit: int = Query(default=50, ge=1, le=1000), host: Optional[str] = None):
+    return _field_sketch(field, host).summary(limit)
+
+
+@app.get('/api/stats/fields/{field:path}/count')
+def stats_field_count(field: str, value: str, host: Optional[str] = None):
+    sketch = _field_sketch(field, host)
+    # Count-Min never undercounts; the bound holds with probability 1 - e^-depth
+    bound = int(math.e / sketch.cms.width * sketch.total)
+    return {"field": field, "value": value, "estimate": sketch.estimate(value), "max_overcount": bound,
+            "total": sketch.total}
+
+
+def _schema(host: Optional[str] = None):
+    if SETTINGS.get('schema') is not None:
+        return SETTINGS['schema']
+    if SETTINGS.get('backend') == 'case':
+        from .case import CaseStore
+        catalog = CaseStore(SETTINGS['case_dir'], host=host).schema()
+    else:
+        path = SETTINGS.get('schema_path')
+        catalog = None
+        if path and os.path.exists(path):
+            key = (path, os.path.getmtime(path))
+            if _SCHEMA_CACHE.get('key') != key:
+                from .schema_catalog import SchemaCatalog
+                _SCHEMA_CACHE.update(key=key, catalog=SchemaCatalog.load(path))
+            catalog = _SCHEMA_CACHE['catalog']
+    if catalog is None:
+        raise HTTPException(status_code=404, detail='No schema catalog available')
+    return catalog
+
+
+@app.get('/api/schema')
+def get_schema(channel: Optional[str] = None, event_id: Optional[str] = None, samples: bool = True,
+               host: Optional[str] = None):
+    # Fields per (channel, event_id) with fill rate, distinct count and
+    # sample values, from ingest; `fields` is the union, most filled first
+    return _schema(host).catalog(channel, event_id, samples=samples)
+
+
+def _stacks(host: Optional[str] = None) -> Dict[str, Any]:
+    if SETTINGS.get('backend') == 'case':
+        from .case import CaseStore
+        stacks = CaseStore(SETTINGS['case_dir'], host=host).stacks()
+    else:
+        path = SETTINGS.get('stacks_path')
+        stacks = None
+        if path and os.path.exists(path):
+            key = (path, os.path.getmtime(path))
+            if _STACKS_CACHE.get('key') != key:
+                with open(path, 'r', encoding='utf-8') as fh:
+                    _STACKS_CACHE.update(key=key, stacks=json.load(fh))
+            stacks = _STACKS_CACHE['stacks']
+    if stacks is None:
+        raise HTTPException(status_code=404, detail='No stacking results (run with --stacks-dir)')
+    return stacks
+
+
+@app.get('/api/stacks')
+def list_stacks(host: Optional[str] = None):
+    stacks = _stacks(host)
+    return {"items": [{k: v for k, v in s.items() if k != 'bottom'} for s in stacks.get('stacks') or []],
+            "bottom_n": stacks.get('bottom_n')}
+
+
+@app.get('/api/stacks/{name}')
+def get_stack(name: str, limit: int = Query(default=50, ge=1, le=1000), host: Optional[str] = None):
+    for s in _stacks(host).get('stacks') or []:
+        if s.get('name') == name:
+            return {**s, 'bottom': (s.get('bottom') or [])[:limit]}
+    raise HTTPException(status_code=404, detail=f'Unknown stack: {name}')
+
+
+@app.get('/api/storage')
+def storage_report(sample: int = Query(default=500, ge=0, le=100000), host: Optional[str] = None):
+    # Events table / payload sizes and decompression latency (--compress-data)
+    from .payload_codec import storage_report as report
+    backend = SETTINGS.get('backend')
+    if backend == 'case':
+        from .case import CaseStore
+        store = CaseStore(SETTINGS['case_dir'], host=host)
+        return {"hosts": {s.host: report(s.db_path, sample) for s in store.shards}}
+    if backend != 'sqlite':
+        raise HTTPException(status_code=404, detail='Storage report needs the sqlite or case backend')
+    return report(DB_PATH, sample)
+
+
+@app.get('/api/case/hosts')
+def case_hosts():
+    if SETTINGS.get('backend') != 'case':
+        raise HTTPException(status_code=404, detail='Not serving a case')
+    from .case import CaseStore
+    store = CaseStore(SETTINGS['case_dir'])
+    return {"items": store.hosts(), "totals": store.manifest.totals()}
+
+
+@app.get('/api/live/status')
+def live_status():
+    feed = SETTINGS.get('live_feed')
+    if feed is None:
+        return {"enabled": False}
+    return {"enabled": True, **feed.state}
+
+
+@app.get('/api/live')
+def live_stream():
+    feed = SETTINGS.get('live_feed')
+    if feed is None:
+        raise HTTPException(status_code=404, detail='Live mode not enabled')
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(feed.stream(), media_type='text/event-stream', headers=headers)
+
+
 @app.get('/', response_class=HTMLResponse)
 def index():
     return """
@@ -271,6 +925,7 @@ def index():
   <div class='row' style='justify-content: space-between;'>
     <h2>EventHound</h2>
     <div>
+      <span id='liveInfo' class='pill hidden'></span>
       <button onclick='toggleTheme()' id='themeBtn'>Dark mode</button>
     </div>
   </div>
@@ -278,14 +933,26 @@ def index():
   <div class='tabs'>
     <div class='tab active' id='tabEvents' onclick='showTab("events")'>Events</div>
     <div class='tab' id='tabFindings' onclick='showTab("findings")'>Findings</div>
+    <div class='tab' id='tabSessions' onclick='showTab("sessions")'>Sessions</div>
+    <div class='tab' id='tabStacks' onclick='showTab("stacks")'>Stacking</div>
   </div>
 
   <div id='viewEvents'>
     <div class='toolbar'>
       <input id='q' placeholder='Search text...' />
-      <input id='channel' placeholder='Channel (e.g., Security)' />
-      <input id='event' placeholder='Event ID (e.g., 4624)' />
+      <input id='channel' list='channelList' placeholder='Channel (e.g., Security)' />
+      <input id='event' list='eventList' placeholder='Event ID (e.g., 4624)' />
+      <input id='dsl' list='dslFields' oninput='suggestFields()' placeholder='DSL (e.g., LogonType == 10)' />
+      <datalist id='channelList'></datalist>
+      <datalist id='eventList'></datalist>
+      <datalist id='dslFields'></datalist>
       <button onclick='load(0)'>Search</button>
+      <select id='exportFormat'>
+        <option value='jsonl'>JSONL</option>
+        <option value='csv'>CSV</option>
+        <option value='parquet'>Parquet</option>
+      </select>
+      <button onclick='exportEvents()'>Export</button>
       <span id='total' class='pill'></span>
     </div>
     <div class='grid'>
@@ -323,6 +990,12 @@ def index():
             <h3>Top Channels</h3>
             <canvas id='chartTopChannels' height='120'></canvas>
           </div>
+          <div class='card hidden' id='topValuesCard'>
+            <h3>Top values</h3>
+            <select id='topField' onchange='loadTopValues()'></select>
+            <span id='topFieldInfo' class='pill'></span>
+            <table><tbody id='topValues'></tbody></table>
+          </div>
         </div>
       </div>
       <div class='card'>
@@ -356,6 +1029,7 @@ def index():
             <th>Severity</th>
             <th>Description</th>
             <th>Tags</th>
+            <th>Process lineage</th>
           </tr>
         </thead>
         <tbody id='frows'></tbody>
@@ -370,6 +1044,65 @@ def index():
     </div>
   </div>
 
+  <div id='viewSessions' class='hidden'>
+    <div class='toolbar'>
+      <input id='suser' placeholder='User (e.g., CORP\\alice)' />
+      <input id='scomputer' placeholder='Computer' />
+      <input id='stype' placeholder='Logon type (e.g., 10)' />
+      <input id='sip' placeholder='Source IP' />
+      <input id='slogon' placeholder='LogonId (e.g., 0x3e4a2)' />
+      <select id='spriv'>
+        <option value=''>Any privileges</option>
+        <option value='true'>Privileged (4672)</option>
+        <option value='false'>Not privileged</option>
+      </select>
+      <button onclick='loadSessions(0)'>Search</button>
+      <span id='stotal' class='pill'></span>
+    </div>
+    <div class='card'>
+      <table>
+        <thead>
+          <tr>
+            <th>Start</th>
+            <th>End</th>
+            <th>Computer</th>
+            <th>User</th>
+            <th>Logon type</th>
+            <th>Source IP</th>
+            <th>Privileged</th>
+            <th>Events</th>
+          </tr>
+        </thead>
+        <tbody id='srows'></tbody>
+      </table>
+      <div style='margin-top:8px; display:flex; justify-content: space-between; align-items:center;'>
+        <div>
+          <button onclick='prevSessions()'>Prev</button>
+          <button onclick='nextSessions()'>Next</button>
+        </div>
+        <div class='pill' id='spageinfo'></div>
+      </div>
+    </div>
+    <div class='card'>
+      <h3 id='sessionTitle'>Session activity</h3>
+      <table><tbody id='sessionEvents'></tbody></table>
+    </div>
+  </div>
+
+  <div id='viewStacks' class='hidden'>
+    <div class='toolbar'>
+      <select id='stackName' onchange='loadStack()'></select>
+      <span id='stackInfo' class='pill'></span>
+    </div>
+    <div class='card'>
+      <div id='stackDesc' style='color:var(--muted);'></div>
+      <table>
+        <thead><tr id='stackHead'></tr></thead>
+        <tbody id='stackRows'></tbody>
+      </table>
+    </div>
+  </div>
+
   <script>
     // THEME
     function toggleTheme() {
@@ -382,12 +1115,13 @@ def index():
 
     // TABS
     function showTab(name) {
-      const isEvents = name === 'events';
-      document.getElementById('viewEvents').classList.toggle('hidden', !isEvents);
-      document.getElementById('viewFindings').classList.toggle('hidden', isEvents);
-      document.getElementById('tabEvents').classList.toggle('active', isEvents);
-      document.getElementById('tabFindings').classList.toggle('active', !isEvents);
-      if (!isEvents) { loadFindings(0); }
+      for (const [tab, view] of [['events','Events'],['findings','Findings'],['sessions','Sessions'],['stacks','Stacks']]) {
+        document.getElementById('view' + view).classList.toggle('hidden', tab !== name);
+        document.getElementById('tab' + view).classList.toggle('active', tab === name);
+      }
+      if (name === 'findings') { loadFindings(0); }
+      if (name === 'sessions') { loadSessions(0); }
+      if (name === 'stacks') { loadStacks(); }
     }
 
     // EVENTS VIEW (existing)
@@ -404,13 +1138,49 @@ def index():
       const q = document.getElementById('q').value;
       const channel = document.getElementById('channel').value;
       const event_id = document.getElementById('event').value;
+      const dsl = document.getElementById('dsl').value;
       const obj = { limit, offset, sort_by: sortBy, sort_dir: sortDir };
       if (q) obj.q = q;
       if (channel) obj.channel = channel;
       if (event_id) obj.event_id = event_id;
+      if (dsl) obj.dsl = dsl;
       return obj;
     }
 
+    // Schema catalog from ingest: channel/event ID suggestions and DSL field
+    // completion for the selected channel/event ID, without scanning events
+    let schema = null;
+    const HEADER_FIELDS = ['timestamp','channel','event_id','computer','provider','record_id','user_sid','source'];
+    function fillList(id, values) {
+      const list = document.getElementById(id); list.innerHTML = '';
+      for (const v of values) { const o = document.createElement('option'); o.value = v; list.appendChild(o); }
+    }
+    async function loadSchema() {
+      const res = await fetch('/api/schema?samples=false');
+      if (!res.ok) return;
+      schema = await res.json();
+      fillList('channelList', [...new Set(schema.types.map(t => t.channel).filter(Boolean))]);
+      fillList('eventList', [...new Set(schema.types.map(t => t.event_id).filter(Boolean))]);
+    }
+    function suggestFields() {
+      if (!schema) return;
+      const text = document.getElementById('dsl').value;
+      const word = (text.match(/[\\w.-]*$/) || [''])[0];
+      const prefix = text.slice(0, text.length - word.length);
+      // Only where a field name goes: at the start or after AND/OR
+      if (!/^\\s*$|\\s(AND|OR)\\s+$/.test(prefix)) { fillList('dslFields', []); return; }
+      const channel = document.getElementById('channel').value;
+      const event_id = document.getElementById('event').value;
+      const filled = {};
+      for (const t of schema.types) {
+        if ((channel && t.channel !== channel) || (event_id && t.event_id !== event_id)) continue;
+        for (const f of t.fields) filled[f.field] = (filled[f.field] || 0) + f.filled;
+      }
+      const names = Object.keys(filled).sort((a, b) => filled[b] - filled[a]).concat(HEADER_FIELDS);
+      const w = word.toLowerCase();
+      fillList('dslFields', names.filter(n => n.toLowerCase().startsWith(w)).slice(0, 50).map(n => prefix + n));
+    }
+
     async function load(newOffset) {
       if (newOffset !== undefined) offset = newOffset;
       const p = paramsObj();
@@ -428,12 +1198,21 @@ def index():
       loadCharts();
     }
 
+    function exportEvents() {
+      const p = paramsObj(); delete p.limit; delete p.offset;
+      p.format = document.getElementById('exportFormat').value;
+      window.location = '/api/events/export?' + qs(p);
+    }
+
     function setSort(col) { if (sortBy===col) { sortDir = (sortDir==='asc')?'desc':'asc'; } else { sortBy=col; sortDir='asc'; } load(0); }
     function nextPage() { offset += limit; load(offset); }
     function prevPage() { offset = Math.max(0, offset - limit); load(offset); }
 
     async function showDetail(id) {
-      const res = await fetch('/api/events/' + id); const data = await res.json();
+      const res = await fetch('/api/events/' + id); renderDetail(await res.json());
+    }
+
+    function renderDetail(data) {
       const detail = document.getElementById('detail');
       detail.innerHTML = `<div><b>ID</b>: ${data.id}</div>
         <div><b>Timestamp</b>: ${data.timestamp||''}</div>
@@ -442,9 +1221,10 @@ def index():
         <div><b>Computer</b>: ${data.computer||''}</div>
         <div><b>Provider</b>: ${data.provider||''}</div>
         <div><b>User SID</b>: ${data.user_sid||''}</div>
+        <div><b>Source</b>: ${data.source||''}</div>
         <div style='margin-top:8px;'><b>EventData</b>:</div>
         <pre>${JSON.stringify(data.data, null, 2)}</pre>`;
-      currentId = id; document.getElementById('downloadBtn').style.display='inline-block';
+      currentId = data.id; document.getElementById('downloadBtn').style.display='inline-block';
     }
 
     async function downloadCurrent() {
@@ -466,6 +1246,70 @@ def index():
       chartTrend = new Chart(document.getElementById('chartTrend').getContext('2d'), { type:'line', data:{ labels:tLabels, datasets:[{ label:'Events/hour', data:tValues, borderColor:'#2b7', fill:false }] }, options:{ responsive:true, scales:{ y:{ beginAtZero:true } } } });
       chartTopIds = new Chart(document.getElementById('chartTopIds').getContext('2d'), { type:'bar', data:{ labels:idLabels, datasets:[{ label:'Count', data:idValues, backgroundColor:'#58f' }] }, options:{ responsive:true, indexAxis:'y', scales:{ x:{ beginAtZero:true } } } });
       chartTopChannels = new Chart(document.getElementById('chartTopChannels').getContext('2d'), { type:'bar', data:{ labels:chLabels, datasets:[{ label:'Count', data:chValues, backgroundColor:'#fa5' }] }, options:{ responsive:true, indexAxis:'y', scales:{ x:{ beginAtZero:true } } } });
+      loadTopValues();
+    }
+
+    // Ingest sketches (Space-Saving top-K, HLL distinct); hidden when the run has none
+    async function loadTopValues() {
+      const sel = document.getElementById('topField');
+      if (!sel.options.length) {
+        const res = await fetch('/api/stats/summary?limit=1');
+        if (!res.ok) return;
+        const data = await res.json();
+        for (const f of data.fields) { const o = document.createElement('option'); o.value = f.field; o.innerText = f.field; sel.appendChild(o); }
+        if (!sel.options.length) return;
+        document.getElementById('topValuesCard').classList.remove('hidden');
+      }
+      const res = await fetch('/api/stats/fields/' + sel.value + '/top?limit=15'); const f = await res.json();
+      document.getElementById('topFieldInfo').innerText = `${f.total} values • ~${f.distinct} distinct`;
+      const rows = document.getElementById('topValues'); rows.innerHTML = '';
+      for (const it of f.top) {
+        // Values come straight from the logs: set as text, never as HTML
+        const tr = document.createElement('tr');
+        const v = document.createElement('td'); v.innerText = it.value;
+        const c = document.createElement('td'); c.innerText = it.count + (it.error ? ' (±' + it.error + ')' : '');
+        tr.appendChild(v); tr.appendChild(c); rows.appendChild(tr);
+      }
+    }
+
+    // STACKING VIEW (rarest key tuples per stack)
+    function cell(text) { const td = document.createElement('td'); td.innerText = text == null ? '' : String(text); return td; }
+    async function loadStacks() {
+      const sel = document.getElementById('stackName');
+      if (sel.options.length) return loadStack();
+      const res = await fetch('/api/stacks');
+      if (!res.ok) { document.getElementById('stackDesc').innerText = 'No stacking results (run with --stacks-dir).'; return; }
+      const data = await res.json();
+      for (const s of data.items) {
+        if (!s.groups) continue;
+        const o = document.createElement('option'); o.value = s.name; o.innerText = `${s.name} (${s.groups} groups)`; sel.appendChild(o);
+      }
+      if (sel.options.length) loadStack(); else document.getElementById('stackDesc').innerText = 'No events matched any stack.';
+    }
+    async function loadStack() {
+      const name = document.getElementById('stackName').value;
+      const res = await fetch('/api/stacks/' + encodeURIComponent(name) + '?limit=200'); const s = await res.json();
+      document.getElementById('stackInfo').innerText = `${s.channel} / ${s.event_id} • ${s.events} events • ${s.groups} groups`;
+      document.getElementById('stackDesc').innerText = s.description || '';
+      const head = document.getElementById('stackHead'); head.innerHTML = '';
+      for (const h of ['Count', 'Hosts'].concat(s.keys).concat(['First seen', 'Last seen', 'Examples'])) {
+        const th = document.createElement('th'); th.innerText = h; head.appendChild(th);
+      }
+      const rows = document.getElementById('stackRows'); rows.innerHTML = '';
+      for (const g of s.bottom) {
+        const tr = document.createElement('tr');
+        tr.appendChild(cell(g.count)); tr.appendChild(cell(g.hosts.join(', ') || g.host_count));
+        for (const k of s.keys) tr.appendChild(cell(g.key[k]));
+        tr.appendChild(cell(g.first_ts)); tr.appendChild(cell(g.last_ts));
+        const ex = document.createElement('td');
+        for (const e of g.examples) {
+          const div = document.createElement('div'); div.innerText = `${e.source}#${e.record_id}`;
+          if (e.id != null) { div.style.cursor = 'pointer'; div.onclick = () => { showTab('events'); showDetail(e.id); }; }
+          ex.appendChild(div);
+        }
+        tr.appendChild(ex);
+        rows.appendChild(tr);
+      }
     }
 
     // FINDINGS VIEW
@@ -486,14 +1330,99 @@ def index():
       for (const it of data.items) {
         const tr = document.createElement('tr');
         tr.innerHTML = `<td>${it.event_timestamp||''}</td><td>${it.channel||''}</td><td>${it.event_id||''}</td><td>${it.rule_id||''}</td><td>${it.severity||''}</td><td>${it.description||''}</td><td>${it.tags||''}</td>`;
+        // Root-first process chain, image names only
+        tr.appendChild(cell((it.lineage || []).map(p => (p.image || `pid ${p.pid}`).split('\\\\').pop()).join(' > ')));
+        if (it.event_ref != null) { tr.style.cursor = 'pointer'; tr.onclick = () => openFindingEvent(it.id); }
         rows.appendChild(tr);
       }
     }
+    async function openFindingEvent(id) {
+      const res = await fetch('/api/findings/' + id + '/event');
+      if (!res.ok) return;
+      const data = await res.json();
+      showTab('events'); renderDetail(data);
+    }
     function nextFindings(){ foffset+=flimit; loadFindings(foffset); }
     function prevFindings(){ foffset=Math.max(0, foffset-flimit); loadFindings(foffset); }
 
+    // SESSIONS VIEW (logon sessions by LogonId)
+    let slimit = 50; let soffset = 0;
+    async function loadSessions(newOffset) {
+      if (newOffset !== undefined) soffset = newOffset;
+      const params = { limit: slimit, offset: soffset };
+      for (const [id, key] of [['suser','user'],['scomputer','computer'],['stype','logon_type'],['sip','source_ip'],['slogon','logon_id'],['spriv','privileged']]) {
+        const v = document.getElementById(id).value; if (v) params[key] = v;
+      }
+      const res = await fetch('/api/sessions?' + qs(params));
+      if (!res.ok) { document.getElementById('stotal').innerText = 'Sessions unavailable for this backend'; return; }
+      const data = await res.json();
+      document.getElementById('stotal').innerText = 'Total: ' + data.total;
+      document.getElementById('spageinfo').innerText = `offset ${soffset} • showing ${data.items.length}`;
+      const rows = document.getElementById('srows'); rows.innerHTML = '';
+      for (const it of data.items) {
+        const tr = document.createElement('tr');
+        for (const v of [it.start_time || `(before ${it.first_seen||''})`, it.end_time, it.computer, it.user || it.logon_id, it.logon_type, it.source_ip, it.privileged ? 'yes' : '', it.event_count]) tr.appendChild(cell(v));
+        tr.style.cursor = 'pointer'; tr.onclick = () => loadSessionEvents(it);
+        rows.appendChild(tr);
+      }
+    }
+    async function loadSessionEvents(s) {
+      const res = await fetch('/api/sessions/' + s.id + '/events?limit=500'); const data = await res.json();
+      document.getElementById('sessionTitle').innerText = `Session ${s.logon_id} on ${s.computer} • ${data.total} events` + (data.total > data.items.length ? ` (first ${data.items.length})` : '');
+      const rows = document.getElementById('sessionEvents'); rows.innerHTML = '';
+      for (const e of data.items) {
+        const tr = document.createElement('tr');
+        for (const v of [e.timestamp, e.channel, e.event_id, e.session_role]) tr.appendChild(cell(v));
+        tr.style.cursor = 'pointer'; tr.onclick = () => { showTab('events'); showDetail(e.id); };
+        rows.appendChild(tr);
+      }
+    }
+    function nextSessions(){ soffset+=slimit; loadSessions(soffset); }
+    function prevSessions(){ soffset=Math.max(0, soffset-slimit); loadSessions(soffset); }
+
+    // LIVE INGEST (Server-Sent Events)
+    let liveRefreshAt = 0;
+    function renderLive(st) {
+      const el = document.getElementById('liveInfo');
+      el.classList.remove('hidden');
+      const files = st.files_total ? `${st.files_done}/${st.files_total} files` : '';
+      el.innerText = (st.done ? 'Ingest complete' : 'Live: parsing') + ` • ${files} • events ${st.events} • findings ${st.findings}`;
+    }
+    function liveRefresh(force) {
+      // Charts and totals are re-queried at most every 5s while parsing
+      const now = Date.now();
+      if (!force && now - liveRefreshAt < 5000) return;
+      liveRefreshAt = now;
+      if (offset === 0) load(0); else loadCharts();
+    }
+    async function startLive() {
+      const res = await fetch('/api/live/status'); const st = await res.json();
+      if (!st.enabled) return;
+      renderLive(st);
+      const es = new EventSource('/api/live');
+      es.addEventListener('progress', (ev) => {
+        const p = JSON.parse(ev.data); renderLive(p); liveRefresh(p.done);
+        if (p.done) es.close();
+      });
+      es.addEventListener('finding', (ev) => {
+        const it = JSON.parse(ev.data);
+        const viewing = !document.getElementById('viewFindings').classList.contains('hidden');
+        if (!viewing || foffset !== 0) return;
+        const rows = document.getElementById('frows');
+        const tr = document.createElement('tr');
+        const tags = Array.isArray(it.tags) ? it.tags.join(',') : (it.tags||'');
+        tr.innerHTML = `<td>${it.event_timestamp||''}</td><td>${it.channel||''}</td><td>${it.event_id||''}</td><td>${it.rule_id||''}</td><td>${it.severity||''}</td><td>${it.description||''}</td><td>${tags}</td><td></td>`;
+        // Not stored yet, so no finding id: open the event by its ref
+        if (it.event_ref != null) { tr.style.cursor = 'pointer'; tr.onclick = () => { showTab('events'); showDetail(it.event_ref); }; }
+        rows.insertBefore(tr, rows.firstChild);
+        while (rows.children.length > flimit) rows.removeChild(rows.lastChild);
+      });
+    }
+
     // initial load
     load(0);
+    loadSchema();
+    startLive();
   </script>
 </body>
 </html>
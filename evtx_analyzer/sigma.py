@@ -1,99 +1,541 @@
-import os
-import yaml
-from typing import Any, Dict, List, Optional
-from .rules import RuleSet, Rule, RuleCondition
+import re
+import base64
+import fnmatch
+import ipaddress
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .rules import RuleSet, Rule, content_hash
+from .cache import load_or_build, iter_files
+
+SYSMON = 'Microsoft-Windows-Sysmon/Operational'
+POWERSHELL = 'Microsoft-Windows-PowerShell/Operational'
+
+# logsource -> {channel: allowed event IDs (None = any)}
+LOGSOURCE_SERVICES: Dict[str, Dict[str, Optional[Set[str]]]] = {
+    'security': {'Security': None},
+    'system': {'System': None},
+    'application': {'Application': None},
+    'sysmon': {SYSMON: None},
+    'powershell': {POWERSHELL: None, 'Windows PowerShell': None},
+    'powershell-classic': {'Windows PowerShell': None},
+    'taskscheduler': {'Microsoft-Windows-TaskScheduler/Operational': None},
+    'wmi': {'Microsoft-Windows-WMI-Activity/Operational': None},
+    'windefend': {'Microsoft-Windows-Windows Defender/Operational': None},
+    'terminalservices-localsessionmanager': {'Microsoft-Windows-TerminalServices-LocalSessionManager/Operational': None},
+    'applocker': {'Microsoft-Windows-AppLocker/EXE and DLL': None, 'Microsoft-Windows-AppLocker/MSI and Script': None},
+    'printservice-admin': {'Microsoft-Windows-PrintService/Admin': None},
+    'dns-client': {'Microsoft-Windows-DNS-Client/Operational': None},
+    'winrm': {'Microsoft-Windows-WinRM/Operational': None},
+}
+
+LOGSOURCE_CATEGORIES: Dict[str, Dict[str, Optional[Set[str]]]] = {
+    'process_creation': {SYSMON: {'1'}, 'Security': {'4688'}},
+    'process_termination': {SYSMON: {'5'}, 'Security': {'4689'}},
+    'network_connection': {SYSMON: {'3'}},
+    'driver_load': {SYSMON: {'6'}},
+    'image_load': {SYSMON: {'7'}},
+    'create_remote_thread': {SYSMON: {'8'}},
+    'raw_access_thread': {SYSMON: {'9'}},
+    'process_access': {SYSMON: {'10'}},
+    'file_event': {SYSMON: {'11'}},
+    'registry_event': {SYSMON: {'12', '13', '14'}},
+    'registry_add': {SYSMON: {'12'}},
+    'registry_delete': {SYSMON: {'12'}},
+    'registry_set': {SYSMON: {'13'}},
+    'registry_rename': {SYSMON: {'14'}},
+    'create_stream_hash': {SYSMON: {'15'}},
+    'pipe_created': {SYSMON: {'17', '18'}},
+    'wmi_event': {SYSMON: {'19', '20', '21'}},
+    'dns_query': {SYSMON: {'22'}},
+    'file_delete': {SYSMON: {'23', '26'}},
+    'clipboard_capture': {SYSMON: {'24'}},
+    'process_tampering': {SYSMON: {'25'}},
+    'ps_module': {POWERSHELL: {'4103'}},
+    'ps_script': {POWERSHELL: {'4104'}},
+    'ps_classic_start': {'Windows PowerShell': {'400'}},
+}
+
+# Sigma field names that live in the normalized event header
+FIELD_ALIASES = {
+    'EventID': 'event_id',
+    'Channel': 'channel',
+    'Computer': 'computer',
+    'Provider_Name': 'provider',
+    'EventRecordID': 'record_id',
+}
+
+# Sysmon-style names used by generic process_creation rules, as found in 4688
+FIELD_FALLBACKS = {
+    'Image': ['NewProcessName'],
+    'ParentImage': ['ParentProcessName'],
+    'ProcessId': ['NewProcessId'],
+    'ParentProcessId': ['ProcessId'],
+    'User': ['SubjectUserName'],
+    'LogonId': ['SubjectLogonId'],
+}
+
+WINDASH_CHARS = ['-', '/', '–', '—', '―']
+_WINDASH_RE = re.compile(r'(?:(?<=\s)|^)[-/]')
+
+
+def _resolve(evt: Dict[str, Any], field: str) -> Any:
+    alias = FIELD_ALIASES.get(field)
+    if alias is not None:
+        return evt.get(alias)
+    if field in evt:
+        return evt.get(field)
+    data = evt.get('data') or {}
+    if field in data:
+        return data.get(field)
+    for alt in FIELD_FALLBACKS.get(field, []):
+        if alt in data:
+            return data.get(alt)
+    return None
+
+
+def _wildcard_regex(value: str) -> str:
+    # Sigma wildcards: * and ?, with backslash escapes for literals
+    out = []
+    i = 0
+    while i < len(value):
+        c = value[i]
+        if c == '\\' and i + 1 < len(value) and value[i + 1] in '*?\\':
+            out.append(re.escape(value[i + 1]))
+            i += 2
+            continue
+        if c == '*':
+            out.append('.*')
+        elif c == '?':
+            out.append('.')
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+def _has_wildcard(value: str) -> bool:
+    return bool(re.search(r'(?<!\\)[*?]', value))
+
+
+def _base64_offsets(value: bytes) -> List[str]:
+    # Standard Sigma base64offset: the three encodings of value at every
+    # alignment, trimmed to the characters that do not depend on neighbours.
+    out = []
+    start_trim = [0, 2, 3]
+    end_trim = [None, -3, -2]
+    for i in range(3):
+        encoded = base64.b64encode(b'\0' * i + value).decode('ascii')
+        end = end_trim[(len(value) + i) % 3]
+        out.append(encoded[start_trim[i]:end])
+    return out
+
+
+class ValueMatcher:
+    __slots__ = ('kind', 'value', 'pattern', 'cased')
+
+    def __init__(self, kind: str, value: Any, cased: bool = False, regex_flags: int = 0) -> None:
+        self.kind = kind
+        self.cased = cased
+        self.pattern = None
+        self.value = value
+        if kind in ('eq', 'contains', 'startswith', 'endswith'):
+            text = str(value)
+            if _has_wildcard(text):
+                body = _wildcard_regex(text)
+                if kind in ('contains', 'endswith'):
+                    body = '.*' + body
+                if kind in ('contains', 'startswith'):
+                    body = body + '.*'
+                flags = re.DOTALL | (0 if cased else re.IGNORECASE)
+                self.pattern = re.compile(body, flags)
+                self.kind = 'wildcard'
+            else:
+                self.value = text if cased else text.lower()
+        elif kind == 're':
+            self.pattern = re.compile(str(value), regex_flags)
+        elif kind == 'cidr':
+            self.value = ipaddress.ip_network(str(value), strict=False)
+        elif kind in ('lt', 'lte', 'gt', 'gte'):
+            self.value = float(value)
+
+    def match(self, v: Any) -> bool:
+        kind = self.kind
+        if kind == 'null':
+            return v is None or v == ''
+        if v is None:
+            return False
+        s = str(v)
+        if kind == 'wildcard':
+            return self.pattern.fullmatch(s) is not None
+        if kind == 're':
+            return self.pattern.search(s) is not None
+        if kind in ('eq', 'contains', 'startswith', 'endswith'):
+            if not self.cased:
+                s = s.lower()
+            if kind == 'eq':
+                return s == self.value
+            if kind == 'contains':
+                return self.value in s
+            if kind == 'startswith':
+                return s.startswith(self.value)
+            return s.endswith(self.value)
+        if kind == 'cidr':
+            try:
+                return ipaddress.ip_address(s.strip()) in self.value
+            except ValueError:
+                return False
+        try:
+            n = float(s)
+        except ValueError:
+            return False
+        if kind == 'lt':
+            return n < self.value
+        if kind == 'lte':
+            return n <= self.value
+        if kind == 'gt':
+            return n > self.value
+        if kind == 'gte':
+            return n >= self.value
+        return False
+
+
+class FieldMatch:
+    # `groups` holds the matchers of each rule value (windash/base64offset
+    # expand one value into several variants); `all` needs every value to
+    # match through at least one of its variants
+    __slots__ = ('field', 'matchers', 'groups', 'require_all', 'exists')
+
+    def __init__(self, field: str, matchers: List[ValueMatcher], require_all: bool = False,
+                 exists: Optional[bool] = None, groups: Optional[List[List[ValueMatcher]]] = None) -> None:
+        self.field = field
+        self.matchers = matchers
+        self.groups = groups if groups is not None else [[m] for m in matchers]
+        self.require_all = require_all
+        self.exists = exists
+
+    def match(self, evt: Dict[str, Any]) -> bool:
+        v = _resolve(evt, self.field)
+        if self.exists is not None:
+            return (v is not None) == self.exists
+        if self.require_all:
+            return all(any(m.match(v) for m in group) for group in self.groups)
+        return any(m.match(v) for m in self.matchers)
+
+
+class Keywords:
+    __slots__ = ('matchers',)
+
+    def __init__(self, matchers: List[ValueMatcher]) -> None:
+        self.matchers = matchers
+
+    def match(self, evt: Dict[str, Any]) -> bool:
+        values = [str(v) for v in (evt.get('data') or {}).values() if v is not None]
+        return any(m.match(v) for m in self.matchers for v in values)
+
+
+class AllOf:
+    __slots__ = ('children',)
+
+    def __init__(self, children: List[Any]) -> None:
+        self.children = children
+
+    def match(self, evt: Dict[str, Any]) -> bool:
+        return all(c.match(evt) for c in self.children)
+
+
+class AnyOf:
+    __slots__ = ('children',)
+
+    def __init__(self, children: List[Any]) -> None:
+        self.children = children
+
+    def match(self, evt: Dict[str, Any]) -> bool:
+        return any(c.match(evt) for c in self.children)
+
+
+class AtLeast:
+    __slots__ = ('count', 'children')
+
+    def __init__(self, count: int, children: List[Any]) -> None:
+        self.count = count
+        self.children = children
+
+    def match(self, evt: Dict[str, Any]) -> bool:
+        hits = 0
+        for c in self.children:
+            if c.match(evt):
+                hits += 1
+                if hits >= self.count:
+                    return True
+        return False
+
+
+class Not:
+    __slots__ = ('child',)
+
+    def __init__(self, child: Any) -> None:
+        self.child = child
+
+    def match(self, evt: Dict[str, Any]) -> bool:
+        return not self.child.match(evt)
+
+
+class SigmaError(ValueError):
+    pass
+
+
+def _expand_value(v: Any, modifiers: List[str]) -> List[Any]:
+    # The variants one rule value stands for
+    if v is None or not isinstance(v, (str, int, float)) or isinstance(v, bool):
+        return [v]
+    variants: List[Any] = [str(v)]
+    if 'windash' in modifiers:
+        expanded = []
+        for s in variants:
+            if _WINDASH_RE.search(s):
+                expanded.extend(_WINDASH_RE.sub(ch, s) for ch in WINDASH_CHARS)
+            else:
+                expanded.append(s)
+        variants = expanded
+    encodes = 'base64' in modifiers or 'base64offset' in modifiers
+    if encodes and ('wide' in modifiers or 'utf16le' in modifiers):
+        variants = [s.encode('utf-16-le') for s in variants]
+    if 'base64offset' in modifiers:
+        variants = [e for s in variants for e in _base64_offsets(s if isinstance(s, bytes) else s.encode('utf-8'))]
+    elif 'base64' in modifiers:
+        variants = [base64.b64encode(s if isinstance(s, bytes) else s.encode('utf-8')).decode('ascii') for s in variants]
+    return variants
+
+
+def compile_field(spec: str, value: Any) -> FieldMatch:
+    parts = str(spec).split('|')
+    field = parts[0]
+    modifiers = [m.lower() for m in parts[1:]]
+    values = value if isinstance(value, list) else [value]
+    if 'exists' in modifiers:
+        return FieldMatch(field, [], exists=bool(values[0]) if values else True)
+    require_all = 'all' in modifiers
+    cased = 'cased' in modifiers
+    kind = 'eq'
+    for m in ('contains', 'startswith', 'endswith', 're', 'cidr', 'lt', 'lte', 'gt', 'gte'):
+        if m in modifiers:
+            kind = m
+            break
+    known = {'contains', 'startswith', 'endswith', 're', 'cidr', 'lt', 'lte', 'gt', 'gte', 'all', 'cased',
+             'base64', 'base64offset', 'windash', 'wide', 'utf16le', 'i', 'm', 's', 'exists'}
+    unknown = [m for m in modifiers if m not in known]
+    if unknown:
+        raise SigmaError(f"Unsupported modifier(s): {', '.join(unknown)}")
+    if 'base64offset' in modifiers and kind == 'eq':
+        kind = 'contains'
+    regex_flags = 0
+    if kind == 're':
+        if 'i' in modifiers:
+            regex_flags |= re.IGNORECASE
+        if 'm' in modifiers:
+            regex_flags |= re.MULTILINE
+        if 's' in modifiers:
+            regex_flags |= re.DOTALL
+    groups = [[ValueMatcher('null', None) if x is None else ValueMatcher(kind, x, cased=cased, regex_flags=regex_flags)
+               for x in _expand_value(v, modifiers)] for v in values]
+    return FieldMatch(field, [m for g in groups for m in g], require_all=require_all, groups=groups)
+
+
+def compile_selection(body: Any) -> Any:
+    if isinstance(body, dict):
+        return AllOf([compile_field(k, v) for k, v in body.items()])
+    if isinstance(body, list):
+        if body and all(isinstance(b, dict) for b in body):
+            return AnyOf([compile_selection(b) for b in body])
+        return Keywords([ValueMatcher('contains', v) for v in body if v is not None])
+    if isinstance(body, (str, int, float)):
+        return Keywords([ValueMatcher('contains', body)])
+    raise SigmaError('Unsupported selection body')
+
+
+_TOKEN_RE = re.compile(r'\(|\)|[^\s()]+')
+
+
+class ConditionParser:
+    # Recursive-descent parser for Sigma conditions. Precedence, lowest to
+    # highest: or, and, not; parentheses group. "N of pattern" / "all of them"
+    # are resolved against the selection names at compile time.
+    def __init__(self, condition: str, selections: Dict[str, Any]) -> None:
+        if '|' in condition:
+            raise SigmaError('Aggregation conditions are not supported')
+        self.tokens = _TOKEN_RE.findall(condition)
+        self.pos = 0
+        self.selections = selections
+
+    def parse(self) -> Any:
+        node = self._or()
+        if self.pos != len(self.tokens):
+            raise SigmaError(f"Unexpected token: {self.tokens[self.pos]}")
+        return node
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _take(self) -> str:
+        tok = self._peek()
+        if tok is None:
+            raise SigmaError('Unexpected end of condition')
+        self.pos += 1
+        return tok
+
+    def _or(self) -> Any:
+        children = [self._and()]
+        while (self._peek() or '').lower() == 'or':
+            self._take()
+            children.append(self._and())
+        return children[0] if len(children) == 1 else AnyOf(children)
+
+    def _and(self) -> Any:
+        children = [self._not()]
+        while (self._peek() or '').lower() == 'and':
+            self._take()
+            children.append(self._not())
+        return children[0] if len(children) == 1 else AllOf(children)
+
+    def _not(self) -> Any:
+        if (self._peek() or '').lower() == 'not':
+            self._take()
+            return Not(self._not())
+        return self._atom()
+
+    def _atom(self) -> Any:
+        tok = self._take()
+        if tok == '(':
+            node = self._or()
+            if self._take() != ')':
+                raise SigmaError('Unbalanced parentheses')
+            return node
+        nxt = (self._peek() or '').lower()
+        if nxt == 'of' and (tok.lower() in ('all', 'any') or tok.isdigit()):
+            self._take()
+            return self._quantified(tok.lower(), self._take())
+        if tok not in self.selections:
+            raise SigmaError(f"Unknown selection: {tok}")
+        return self.selections[tok]
+
+    def _quantified(self, quantifier: str, pattern: str) -> Any:
+        if pattern == 'them':
+            names = [n for n in self.selections if not n.startswith('_')]
+        else:
+            names = [n for n in self.selections if fnmatch.fnmatchcase(n, pattern)]
+        if not names:
+            raise SigmaError(f"No selection matches: {pattern}")
+        children = [self.selections[n] for n in names]
+        if quantifier == 'all':
+            return AllOf(children)
+        if quantifier == 'any' or int(quantifier) <= 1:
+            return AnyOf(children)
+        return AtLeast(int(quantifier), children)
+
+
+def logsource_filter(logsource: Any) -> Optional[Dict[str, Optional[Set[str]]]]:
+    if not isinstance(logsource, dict):
+        return None
+    product = str(logsource.get('product') or '').lower()
+    if product and product != 'windows':
+        return {}
+    category = str(logsource.get('category') or '').lower()
+    service = str(logsource.get('service') or '').lower()
+    if category and category in LOGSOURCE_CATEGORIES:
+        mapping = dict(LOGSOURCE_CATEGORIES[category])
+        if service in LOGSOURCE_SERVICES:
+            mapping = {ch: ids for ch, ids in mapping.items() if ch in LOGSOURCE_SERVICES[service]}
+        return mapping
+    if service and service in LOGSOURCE_SERVICES:
+        return dict(LOGSOURCE_SERVICES[service])
+    # Unknown logsource: do not gate, the detection itself has to decide
+    return None
+
+
+class SigmaRule(Rule):
+    def __init__(self, rule_id: str, description: str, severity: str, tags: List[str], condition: Any,
+                 logsource: Optional[Dict[str, Optional[Set[str]]]] = None, content_hash: str = '') -> None:
+        super().__init__(rule_id=rule_id, description=description, severity=severity, tags=tags,
+                         content_hash=content_hash)
+        self.condition = condition
+        self.logsource = logsource
+
+    def match(self, evt: Dict[str, Any]) -> bool:
+        if self.logsource is not None:
+            channel = evt.get('channel') or ''
+            if channel not in self.logsource:
+                return False
+            ids = self.logsource[channel]
+            if ids is not None and str(evt.get('event_id')) not in ids:
+                return False
+        return self.condition.match(evt)
 
 
 class SigmaLoader:
-    def __init__(self) -> None:
-        pass
+    def __init__(self, use_cache: bool = True, cache_dir: Optional[str] = None, rebuild_cache: bool = False) -> None:
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+        self.rebuild_cache = rebuild_cache
+        self.errors: List[Tuple[str, str]] = []
+        self.from_cache = False
 
     def load_dir(self, ruleset: RuleSet, sigma_dir: str) -> int:
-        count = 0
-        for root, _dirs, files in os.walk(sigma_dir):
-            for f in files:
-                if not f.lower().endswith(('.yml', '.yaml')):
+        if self.use_cache:
+            rules, self.from_cache = load_or_build('sigma', sigma_dir, ('.yml', '.yaml'),
+                                                   lambda: self.compile_dir(sigma_dir),
+                                                   cache_dir=self.cache_dir, rebuild=self.rebuild_cache)
+        else:
+            rules = self.compile_dir(sigma_dir)
+        ruleset.rules.extend(rules)
+        return len(rules)
+
+    def compile_dir(self, sigma_dir: str) -> List[SigmaRule]:
+        # yaml is only needed on a cache miss
+        import yaml
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        rules: List[SigmaRule] = []
+        for path in iter_files(sigma_dir, ('.yml', '.yaml')):
+            try:
+                with open(path, 'r', encoding='utf-8') as fh:
+                    docs = [d for d in yaml.load_all(fh, Loader=loader) if isinstance(d, dict)]
+            except Exception as e:
+                self.errors.append((path, str(e)))
+                continue
+            # Rule collections: an "action: global" document is merged into the rest
+            base: Dict[str, Any] = {}
+            for doc in docs:
+                if doc.get('action') == 'global':
+                    base = doc
                     continue
-                path = os.path.join(root, f)
+                merged = dict(base)
+                merged.update(doc)
+                if isinstance(base.get('detection'), dict) and isinstance(doc.get('detection'), dict):
+                    merged['detection'] = {**base['detection'], **doc['detection']}
                 try:
-                    with open(path, 'r', encoding='utf-8') as fh:
-                        data = yaml.safe_load(fh)
-                        if not isinstance(data, dict):
-                            continue
-                        r = self._convert_sigma_rule(data)
-                        if r:
-                            ruleset.rules.append(r)
-                            count += 1
-                except Exception:
+                    r = self._convert_sigma_rule(merged)
+                except Exception as e:
+                    self.errors.append((path, str(e)))
                     continue
-        return count
+                if r:
+                    rules.append(r)
+        return rules
 
-    def _convert_sigma_rule(self, obj: Dict[str, Any]) -> Optional[Rule]:
+    def _convert_sigma_rule(self, obj: Dict[str, Any]) -> Optional[SigmaRule]:
         title = str(obj.get('title') or obj.get('id') or '')
         if not title:
             return None
         rule_id = str(obj.get('id') or title.replace(' ', '_').lower())
-        description = str(obj.get('description') or '')
+        description = str(obj.get('description') or title)
         level = str(obj.get('level') or 'info')
         detection = obj.get('detection') or {}
-        condition = str(detection.get('condition') or '').strip()
+        condition = detection.get('condition')
         if not condition:
             return None
-        selections: Dict[str, List[RuleCondition]] = {}
-        for sel_name, sel_body in detection.items():
-            if sel_name == 'condition':
-                continue
-            conds: List[RuleCondition] = []
-            if isinstance(sel_body, dict):
-                for field, value in sel_body.items():
-                    op = 'eq'
-                    fld = str(field)
-                    # map simple field modifiers
-                    if '|contains' in fld:
-                        fld = fld.split('|contains', 1)[0]
-                        if isinstance(value, list):
-                            for v in value:
-                                conds.append(RuleCondition(fld, 'contains', v))
-                            continue
-                        else:
-                            conds.append(RuleCondition(fld, 'contains', value))
-                            continue
-                    if '|re' in fld or '|regex' in fld:
-                        fld = fld.split('|', 1)[0]
-                        if isinstance(value, list):
-                            for v in value:
-                                conds.append(RuleCondition(fld, 'regex', v))
-                            continue
-                        else:
-                            conds.append(RuleCondition(fld, 'regex', value))
-                            continue
-                    # default eq semantics
-                    if isinstance(value, list):
-                        for v in value:
-                            conds.append(RuleCondition(fld, 'eq', v))
-                    else:
-                        conds.append(RuleCondition(fld, 'eq', value))
-            selections[sel_name] = conds
-        tokens = condition.replace('(', ' ').replace(')', ' ').split()
-        if len(tokens) == 1:
-            name = tokens[0]
-            any_of: List[RuleCondition] = []
-            all_of: List[RuleCondition] = []
-            for c in selections.get(name, []):
-                any_of.append(c)
-            return Rule(rule_id=rule_id, description=description, severity=level, any_of=any_of, all_of=all_of, tags=['sigma'])
-        else:
-            any_of: List[RuleCondition] = []
-            all_of: List[RuleCondition] = []
-            current_op = 'AND'
-            for tok in tokens:
-                tl = tok.lower()
-                if tl in ('and', 'or'):
-                    current_op = tl.upper()
-                    continue
-                sel_conds = selections.get(tok, [])
-                if current_op == 'AND':
-                    all_of.extend(sel_conds)
-                else:
-                    any_of.extend(sel_conds)
-            return Rule(rule_id=rule_id, description=description, severity=level, any_of=any_of, all_of=all_of, tags=['sigma'])
+        selections = {name: compile_selection(body) for name, body in detection.items()
+                      if name not in ('condition', 'timeframe')}
+        conditions = condition if isinstance(condition, list) else [condition]
+        trees = [ConditionParser(str(c), selections).parse() for c in conditions]
+        tree = trees[0] if len(trees) == 1 else AnyOf(trees)
+        tags = ['sigma'] + [str(t) for t in (obj.get('tags') or [])]
+        return SigmaRule(rule_id=rule_id, description=description, severity=level, tags=tags,
+                         condition=tree, logsource=logsource_filter(obj.get('logsource')),
+                         content_hash=content_hash(obj))
@@ -0,0 +1,327 @@
+import os
+import json
+import math
+import array
+import base64
+import hashlib
+import heapq
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Fields sketched with --sketch-fields triage. "a+b" sketches the
+# combination of two fields, e.g. parent/child process pairs.
+TRIAGE_SKETCH_FIELDS = (
+    'computer',
+    'data.IpAddress',
+    'data.TargetUserName',
+    'data.NewProcessName',
+    'data.Image',
+    'data.ParentImage+data.Image',
+    'data.ServiceName',
+)
+SUMMARY_SUFFIX = '.summary.json'
+SUMMARY_VERSION = 1
+PAIR_SEP = ' | '
+MAX_VALUE_LEN = 256
+
+
+def _hash(value: str) -> Tuple[int, int]:
+    # Stable across processes (unlike hash()), so sketches from different
+    # runs, shards and workers can be merged
+    digest = hashlib.blake2b(value.encode('utf-8', 'replace'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+def resolve(evt: Dict[str, Any], field: str) -> Optional[str]:
+    # "data.X" / "a.b" are paths; bare names fall back to EventData like
+    # correlation group_by fields do
+    if '.' in field:
+        cur: Any = evt
+        for part in field.split('.'):
+            if not isinstance(cur, dict) or part not in cur:
+                return None
+            cur = cur[part]
+    else:
+        cur = evt.get(field)
+        if cur is None:
+            cur = (evt.get('data') or {}).get(field)
+    if cur is None or cur == '':
+        return None
+    return str(cur)[:MAX_VALUE_LEN]
+
+
+class CountMin:
+    # Count-Min sketch: point estimates never undercount and overcount by at
+    # most e/width * total with probability 1 - exp(-depth)
+    def __init__(self, width: int = 2048, depth: int = 4) -> None:
+        self.width = width
+        self.depth = depth
+        self.table = array.array('Q', bytes(8 * width * depth))
+
+    def add(self, h1: int, h2: int, n: int = 1) -> None:
+        w = self.width
+        for i in range(self.depth):
+            self.table[i * w + (h1 + i * h2) % w] += n
+
+    def estimate(self, h1: int, h2: int) -> int:
+        w = self.width
+        return min(self.table[i * w + (h1 + i * h2) % w] for i in range(self.depth))
+
+    def merge(self, other: 'CountMin') -> None:
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError('Count-Min dimensions differ')
+        for i, v in enumerate(other.table):
+            self.table[i] += v
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'width': self.width, 'depth': self.depth, 'table': base64.b64encode(self.table.tobytes()).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CountMin':
+        cms = cls(int(data['width']), int(data['depth']))
+        cms.table = array.array('Q')
+        cms.table.frombytes(base64.b64decode(data['table']))
+        return cms
+
+
+class HyperLogLog:
+    # Distinct-count estimate in 2^precision one-byte registers (~1.04/sqrt(m)
+    # relative error, 1.6% at the default 12)
+    def __init__(self, precision: int = 12) -> None:
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+
+    def add(self, h: int) -> None:
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        if other.p != self.p:
+            raise ValueError('HyperLogLog precision differs')
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'precision': self.p, 'registers': base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'HyperLogLog':
+        hll = cls(int(data['precision']))
+        hll.registers = bytearray(base64.b64decode(data['registers']))
+        return hll
+
+
+class SpaceSaving:
+    # Space-Saving heavy hitters with `capacity` counters. Any value seen more
+    # than total/capacity times is tracked; `error` bounds the overcount of
+    # values that took over an evicted counter. The heap holds one entry per
+    # tracked value whose key may lag its count and is fixed lazily.
+    def __init__(self, capacity: int = 500) -> None:
+        self.capacity = capacity
+        self.counts: Dict[str, List[int]] = {}
+        self.heap: List[Tuple[int, str]] = []
+
+    def add(self, value: str, n: int = 1) -> None:
+        entry = self.counts.get(value)
+        if entry is not None:
+            entry[0] += n
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[value] = [n, 0]
+            heapq.heappush(self.heap, (n, value))
+            return
+        while True:
+            key, victim = self.heap[0]
+            actual = self.counts[victim][0]
+            if actual == key:
+                break
+            heapq.heapreplace(self.heap, (actual, victim))
+        del self.counts[victim]
+        self.counts[value] = [key + n, key]
+        heapq.heapreplace(self.heap, (key + n, value))
+
+    def min_count(self) -> int:
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(c for c, _e in self.counts.values())
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        items = heapq.nlargest(limit, self.counts.items(), key=lambda kv: kv[1][0])
+        return [{'value': v, 'count': c, 'error': e} for v, (c, e) in items]
+
+    def merge(self, other: 'SpaceSaving') -> None:
+        # Mergeable summaries: a value missing on one side may have been
+        # evicted there, so it inherits that side's minimum as extra error
+        mine, theirs = self.min_count(), other.min_count()
+        merged: Dict[str, List[int]] = {}
+        for v in set(self.counts) | set(other.counts):
+            a = self.counts.get(v, [mine, mine])
+            b = other.counts.get(v, [theirs, theirs])
+            merged[v] = [a[0] + b[0], a[1] + b[1]]
+        keep = heapq.nlargest(self.capacity, merged.items(), key=lambda kv: kv[1][0])
+        self.counts = {v: ce for v, ce in keep}
+        self.heap = [(ce[0], v) for v, ce in keep]
+        heapq.heapify(self.heap)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'capacity': self.capacity, 'counts': {v: ce for v, ce in self.counts.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SpaceSaving':
+        ss = cls(int(data['capacity']))
+        ss.counts = {v: [int(ce[0]), int(ce[1])] for v, ce in (data.get('counts') or {}).items()}
+        ss.heap = [(ce[0], v) for v, ce in ss.counts.items()]
+        heapq.heapify(ss.heap)
+        return ss
+
+
+class FieldSketch:
+    def __init__(self, field: str, top_k: int = 50, width: int = 2048, depth: int = 4,
+                 precision: int = 12) -> None:
+        self.field = field
+        self.parts = field.split('+')
+        self.top_k = top_k
+        self.total = 0
+        self.missing = 0
+        self.cms = CountMin(width, depth)
+        self.hll = HyperLogLog(precision)
+        self.heavy = SpaceSaving(max(top_k * 10, 100))
+
+    def value(self, evt: Dict[str, Any]) -> Optional[str]:
+        if len(self.parts) == 1:
+            return resolve(evt, self.parts[0])
+        values = [resolve(evt, p) for p in self.parts]
+        if any(v is None for v in values):
+            return None
+        return PAIR_SEP.join(values)  # type: ignore[arg-type]
+
+    def update(self, evt: Dict[str, Any]) -> None:
+        value = self.value(evt)
+        if value is None:
+            self.missing += 1
+            return
+        self.total += 1
+        h1, h2 = _hash(value)
+        self.cms.add(h1, h2)
+        self.hll.add(h1)
+        self.heavy.add(value)
+
+    def estimate(self, value: str) -> int:
+        return self.cms.estimate(*_hash(value[:MAX_VALUE_LEN]))
+
+    def summary(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            'field': self.field,
+            'total': self.total,
+            'missing': self.missing,
+            'distinct': self.hll.count() if self.total else 0,
+            'top': self.heavy.top(limit or self.top_k),
+        }
+
+    def merge(self, other: 'FieldSketch') -> None:
+        self.total += other.total
+        self.missing += other.missing
+        self.cms.merge(other.cms)
+        self.hll.merge(other.hll)
+        self.heavy.merge(other.heavy)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self.summary(), 'top_k': self.top_k,
+                'state': {'cms': self.cms.to_dict(), 'hll': self.hll.to_dict(), 'heavy': self.heavy.to_dict()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FieldSketch':
+        fs = cls(data['field'], int(data.get('top_k') or 50))
+        fs.total = int(data.get('total') or 0)
+        fs.missing = int(data.get('missing') or 0)
+        state = data['state']
+        fs.cms = CountMin.from_dict(state['cms'])
+        fs.hll = HyperLogLog.from_dict(state['hll'])
+        fs.heavy = SpaceSaving.from_dict(state['heavy'])
+        return fs
+
+
+class SketchSet:
+    # Fixed-memory per-field sketches maintained during ingest: Space-Saving
+    # for top values, Count-Min for the count of any value, HyperLogLog for
+    # distinct values. Written next to the outputs as <prefix>.summary.json;
+    # summaries from case hosts or distributed jobs merge losslessly for
+    # Count-Min/HLL and within the stated error for top values.
+    def __init__(self, fields: Iterable[str] = TRIAGE_SKETCH_FIELDS, top_k: int = 50, width: int = 2048,
+                 depth: int = 4, precision: int = 12) -> None:
+        self.fields: Dict[str, FieldSketch] = {
+            f: FieldSketch(f, top_k, width, depth, precision) for f in dict.fromkeys(fields)
+        }
+        self.events = 0
+        # The live server reads while the pipeline thread updates
+        self.lock = threading.Lock()
+
+    def update(self, evt: Dict[str, Any]) -> None:
+        with self.lock:
+            self.events += 1
+            for fs in self.fields.values():
+                fs.update(evt)
+
+    def summary(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        with self.lock:
+            return {'events': self.events, 'fields': [fs.summary(limit) for fs in self.fields.values()]}
+
+    def field(self, name: str) -> Optional[FieldSketch]:
+        return self.fields.get(name)
+
+    def merge(self, other: 'SketchSet') -> None:
+        with self.lock:
+            self.events += other.events
+            for name, fs in other.fields.items():
+                if name in self.fields:
+                    self.fields[name].merge(fs)
+                else:
+                    self.fields[name] = fs
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {'version': SUMMARY_VERSION, 'events': self.events,
+                    'fields': [fs.to_dict() for fs in self.fields.values()]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SketchSet':
+        sketches = cls(fields=())
+        sketches.events = int(data.get('events') or 0)
+        for item in data.get('fields') or []:
+            fs = FieldSketch.from_dict(item)
+            sketches.fields[fs.field] = fs
+        return sketches
+
+    def save(self, path: str) -> None:
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fh:
+            json.dump(self.to_dict(), fh, indent=1)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'SketchSet':
+        with open(path, 'r', encoding='utf-8') as fh:
+            return cls.from_dict(json.load(fh))
+
+
+def parse_fields(spec: str) -> Tuple[str, ...]:
+    # '' or 'none' -> disabled (sketching is opt-in), 'triage' -> the
+    # triage set
+    spec = (spec or '').strip()
+    if not spec or spec.lower() == 'none':
+        return ()
+    if spec.lower() == 'triage':
+        return TRIAGE_SKETCH_FIELDS
+    return tuple(f.strip() for f in spec.split(',') if f.strip())
@@ -0,0 +1,310 @@
+import os
+import json
+import heapq
+import itertools
+import shutil
+import hashlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import orjson
+
+from .sketches import resolve
+
+STACKS_SUFFIX = '.stacks.json'
+GROUPS_SUFFIX = '.stacks.jsonl'
+STACKS_VERSION = 2
+MISSING = '-'
+# Per group: distinct hosts kept (host_count saturates here) and example refs
+HOST_CAP = 64
+EXAMPLES = 3
+PARTITIONS = 16
+MAX_LEVEL = 4
+
+
+class StackDef:
+    # One stack: events of (channel, event_id) grouped by a key tuple,
+    # e.g. Sysmon 1 by (ParentImage, Image)
+    def __init__(self, name: str, channel: str, event_id: str, keys: List[str], description: str = '') -> None:
+        self.name = name
+        self.channel = channel
+        self.event_id = str(event_id)
+        self.keys = list(keys)
+        self.description = description
+
+    def key_for(self, evt: Dict[str, Any]) -> Optional[Tuple[str, ...]]:
+        values = [resolve(evt, k) for k in self.keys]
+        if all(v is None for v in values):
+            return None
+        return tuple(MISSING if v is None else v for v in values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'name': self.name, 'channel': self.channel, 'event_id': self.event_id,
+                'keys': self.keys, 'description': self.description}
+
+
+def load_stack_defs(stacks_dir: str) -> List[StackDef]:
+    # YAML list (or {name: def} mapping) of {name, channel, event_id, keys}
+    import yaml
+    defs: Dict[str, StackDef] = {}
+    for root, _dirs, files in os.walk(stacks_dir):
+        for f in sorted(files):
+            if not f.lower().endswith(('.yml', '.yaml')):
+                continue
+            try:
+                with open(os.path.join(root, f), 'r', encoding='utf-8') as fh:
+                    data = yaml.safe_load(fh)
+            except Exception:
+                continue
+            items = data.items() if isinstance(data, dict) else [(None, i) for i in (data or [])]
+            for key, item in items:
+                if not isinstance(item, dict):
+                    continue
+                name = item.get('name') or key
+                keys = item.get('keys') or []
+                if not name or not item.get('channel') or item.get('event_id') is None or not keys:
+                    continue
+                defs[str(name)] = StackDef(str(name), str(item['channel']), str(item['event_id']),
+                                           [str(k) for k in keys], str(item.get('description') or ''))
+    return list(defs.values())
+
+
+def _partition(stack: str, key: List[str], level: int) -> int:
+    # Salted by level so an oversized partition splits again on re-partitioning
+    raw = orjson.dumps([level, stack, key])
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=4).digest(), 'little') % PARTITIONS
+
+
+def _merge(into: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]], rec: Dict[str, Any]) -> None:
+    gk = (rec['s'], tuple(rec['k']))
+    cur = into.get(gk)
+    if cur is None:
+        into[gk] = rec
+        return
+    cur['n'] += rec['n']
+    if rec['f'] and (not cur['f'] or rec['f'] < cur['f']):
+        cur['f'] = rec['f']
+    if rec['l'] and (not cur['l'] or rec['l'] > cur['l']):
+        cur['l'] = rec['l']
+    if len(cur['h']) < HOST_CAP:
+        cur['h'] = list(dict.fromkeys(cur['h'] + rec['h']))[:HOST_CAP]
+    if len(cur['e']) < EXAMPLES:
+        cur['e'] = (cur['e'] + rec['e'])[:EXAMPLES]
+
+
+class _Partitions:
+    # PARTITIONS append-only JSONL files for one spill level
+    def __init__(self, workdir: str, level: int) -> None:
+        self.dir = os.path.join(workdir, f'l{level}-{os.urandom(4).hex()}')
+        os.makedirs(self.dir)
+        self.level = level
+        self.paths = [os.path.join(self.dir, f'p{i:02d}.jsonl') for i in range(PARTITIONS)]
+        self.files = [open(p, 'ab') for p in self.paths]
+
+    def write(self, groups: Iterable[Dict[str, Any]]) -> None:
+        for rec in groups:
+            self.files[_partition(rec['s'], rec['k'], self.level)].write(orjson.dumps(rec) + b'\n')
+
+    def close(self) -> None:
+        for fh in self.files:
+            fh.close()
+
+
+def _read(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, 'rb') as fh:
+        for line in fh:
+            if line.strip():
+                yield orjson.loads(line)
+
+
+def aggregate(sources: Iterable[Iterable[Dict[str, Any]]], workdir: str, max_groups: int,
+              level: int = 0) -> Iterator[Dict[str, Any]]:
+    # External hash aggregation: merge partial groups in a dict; when it
+    # outgrows max_groups, hash-partition everything to disk and aggregate
+    # each partition on its own (recursing with a new salt if one is still
+    # too large). Yields every group exactly once.
+    groups: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+    parts: Optional[_Partitions] = None
+    for source in sources:
+        for rec in source:
+            _merge(groups, rec)
+            if len(groups) > max_groups and level < MAX_LEVEL:
+                if parts is None:
+                    parts = _Partitions(workdir, level)
+                parts.write(groups.values())
+                groups.clear()
+    if parts is None:
+        yield from groups.values()
+        return
+    parts.write(groups.values())
+    groups.clear()
+    parts.close()
+    try:
+        for path in parts.paths:
+            yield from aggregate([_read(path)], workdir, max_groups, level + 1)
+            os.remove(path)
+    finally:
+        shutil.rmtree(parts.dir, ignore_errors=True)
+
+
+def _group_row(rec: Dict[str, Any], keys: List[str]) -> Dict[str, Any]:
+    return {
+        'key': dict(zip(keys, rec['k'])),
+        'count': rec['n'],
+        'host_count': len(rec['h']),
+        'hosts': rec['h'][:10],
+        'first_ts': rec['f'],
+        'last_ts': rec['l'],
+        'examples': rec['e'],
+    }
+
+
+def summarise(groups: Iterable[Dict[str, Any]], defs: Dict[str, Dict[str, Any]], bottom_n: int,
+              groups_path: Optional[str] = None) -> Dict[str, Any]:
+    # Bottom-N (least frequent, then fewest hosts) per stack in one pass;
+    # optionally writes the full aggregate for later case-wide re-stacking
+    stats = {name: {'events': 0, 'groups': 0} for name in defs}
+    heaps: Dict[str, List[Tuple[int, int, int, Dict[str, Any]]]] = {name: [] for name in defs}
+    out = open(groups_path + '.tmp', 'wb') if groups_path else None
+    try:
+        for seq, rec in enumerate(groups):
+            name = rec['s']
+            if name not in defs:
+                continue
+            if out is not None:
+                out.write(orjson.dumps(rec) + b'\n')
+            stats[name]['events'] += rec['n']
+            stats[name]['groups'] += 1
+            # Max-heap on (count, hosts) via negation keeps the N rarest
+            item = (-rec['n'], -len(rec['h']), seq, rec)
+            heap = heaps[name]
+            if len(heap) < bottom_n:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    finally:
+        if out is not None:
+            out.close()
+    if groups_path:
+        os.replace(groups_path + '.tmp', groups_path)
+    stacks = []
+    for name, meta in defs.items():
+        rows = [rec for _n, _h, _s, rec in sorted(heaps[name], reverse=True)]
+        stacks.append({**meta, **stats[name], 'bottom': [_group_row(r, meta['keys']) for r in rows]})
+    return {'version': STACKS_VERSION, 'bottom_n': bottom_n, 'stacks': stacks}
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(data, fh, indent=1)
+    os.replace(tmp, path)
+
+
+class StackAggregator:
+    # Counts key tuples per stack during ingest with bounded memory: at most
+    # max_groups groups are held, the rest spills to hash partitions under
+    # <prefix>.stacks.tmp/. finish() writes <prefix>.stacks.json (bottom-N
+    # per stack with example event refs) and <prefix>.stacks.jsonl (every
+    # group, so case hosts and distributed jobs can be stacked together).
+    def __init__(self, defs: List[StackDef], prefix: str, bottom_n: int = 50, max_groups: int = 200_000) -> None:
+        self.by_event: Dict[Tuple[str, str], List[StackDef]] = {}
+        for d in defs:
+            self.by_event.setdefault((d.channel.lower(), d.event_id), []).append(d)
+        self.defs = {d.name: d.to_dict() for d in defs}
+        self.prefix = prefix
+        self.bottom_n = bottom_n
+        self.max_groups = max_groups
+        self.workdir = prefix + '.stacks.tmp'
+        self.groups: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+        self.spill: Optional[_Partitions] = None
+
+    def add(self, evt: Dict[str, Any]) -> None:
+        matches = self.by_event.get((str(evt.get('channel') or '').lower(), str(evt.get('event_id'))))
+        if not matches:
+            return
+        ts = evt.get('timestamp')
+        host = evt.get('computer')
+        for d in matches:
+            key = d.key_for(evt)
+            if key is None:
+                continue
+            gk = (d.name, key)
+            rec = self.groups.get(gk)
+            if rec is None:
+                rec = self.groups[gk] = {'s': d.name, 'k': list(key), 'n': 0, 'f': ts, 'l': ts, 'h': [], 'e': []}
+            rec['n'] += 1
+            if ts:
+                if not rec['f'] or ts < rec['f']:
+                    rec['f'] = ts
+                if not rec['l'] or ts > rec['l']:
+                    rec['l'] = ts
+            if host and len(rec['h']) < HOST_CAP and host not in rec['h']:
+                rec['h'].append(host)
+            if len(rec['e']) < EXAMPLES:
+                rec['e'].append(event_ref(evt))
+        if len(self.groups) > self.max_groups:
+            if self.spill is None:
+                os.makedirs(self.workdir, exist_ok=True)
+                self.spill = _Partitions(self.workdir, 0)
+            self.spill.write(self.groups.values())
+            self.groups.clear()
+
+    def finish(self) -> Dict[str, Any]:
+        try:
+            if self.spill is None:
+                groups: Iterable[Dict[str, Any]] = self.groups.values()
+            else:
+                self.spill.write(self.groups.values())
+                self.spill.close()
+                self.groups.clear()
+                # Partitions hold disjoint keys, so each is aggregated on its own
+                groups = itertools.chain.from_iterable(
+                    aggregate([_read(p)], self.workdir, self.max_groups, level=1) for p in self.spill.paths)
+            summary = summarise(groups, self.defs, self.bottom_n, self.prefix + GROUPS_SUFFIX)
+        finally:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+        _write_json(self.prefix + STACKS_SUFFIX, summary)
+        return summary
+
+
+def event_ref(evt: Dict[str, Any]) -> Dict[str, Any]:
+    # Enough to find the event again: its events.id (/api/events/{id}),
+    # provenance, record number and time
+    return {'id': evt.get('event_pk'), 'source': evt.get('source'), 'record_id': evt.get('record_id'),
+            'timestamp': evt.get('timestamp'), 'computer': evt.get('computer')}
+
+
+def offset_examples(records: Iterable[Dict[str, Any]], offset: int) -> Iterator[Dict[str, Any]]:
+    # Shifts example event ids, e.g. to a case's global ids
+    for rec in records:
+        for e in rec['e']:
+            if e.get('id') is not None:
+                e['id'] += offset
+        yield rec
+
+
+def restack(prefixes: List[str], out_path: str, bottom_n: int = 50, max_groups: int = 200_000,
+            signature: Optional[str] = None, id_offsets: Optional[List[int]] = None) -> Dict[str, Any]:
+    # Stack several runs together (case hosts, distributed job shards) from
+    # their full .stacks.jsonl aggregates; `signature` is stored for cache
+    # checks, `id_offsets` (one per prefix) are added to example event ids
+    defs: Dict[str, Dict[str, Any]] = {}
+    sources: List[Iterable[Dict[str, Any]]] = []
+    for i, prefix in enumerate(prefixes):
+        if not os.path.exists(prefix + STACKS_SUFFIX) or not os.path.exists(prefix + GROUPS_SUFFIX):
+            continue
+        with open(prefix + STACKS_SUFFIX, 'r', encoding='utf-8') as fh:
+            for s in json.load(fh).get('stacks') or []:
+                defs.setdefault(s['name'], {k: s[k] for k in ('name', 'channel', 'event_id', 'keys', 'description')})
+        records = _read(prefix + GROUPS_SUFFIX)
+        sources.append(offset_examples(records, id_offsets[i]) if id_offsets else records)
+    workdir = out_path + '.tmp'
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        summary = summarise(aggregate(sources, workdir, max_groups), defs, bottom_n)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if signature:
+        summary['signature'] = signature
+    _write_json(out_path, summary)
+    return summary
@@ -1,20 +1,92 @@
 import os
+import re
 import json
 import sqlite3
-from typing import Dict, Iterable, List
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 DB_PATH = os.path.join(os.getcwd(), 'outputs', 'events.db')
+# EventData fields promoted to indexed generated columns when --index-fields
+# is not given ("maps" adds the rename targets of the loaded maps)
+DEFAULT_INDEX_FIELDS = ('TargetUserName', 'IpAddress', 'LogonType', 'Image', 'ParentImage')
+# Generated columns are named f_<field>; API rows leave them out
+FIELD_COLUMN_PREFIX = 'f_'
+INDEXABLE_FIELD = re.compile(r'^[\w\-]+$')
 
 
-def get_conn() -> sqlite3.Connection:
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+def get_conn(db_path: Optional[str] = None) -> sqlite3.Connection:
+    db_path = db_path or DB_PATH
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(db_path)
     return conn
 
 
-def init_db() -> None:
-    conn = get_conn()
+def ensure_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]) -> None:
+    # Add columns introduced after a database was first created
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    for name, decl in columns.items():
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {decl}')
+
+
+def ensure_event_indexes(conn: sqlite3.Connection) -> None:
+    # The columns API filters (and compiled DSL equality clauses) seek on
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_channel_event_id ON events(channel, event_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_event_id ON events(event_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events(timestamp)')
+
+
+def indexed_fields(conn: sqlite3.Connection) -> Dict[str, str]:
+    # EventData field -> generated column holding it
     try:
+        return {f: c for f, c in conn.execute('SELECT field, col FROM indexed_fields')}
+    except sqlite3.OperationalError:
+        return {}
+
+
+def promote_fields(fields: Iterable[str], db_path: Optional[str] = None) -> Dict[str, str]:
+    # Adds a VIRTUAL generated column plus an index for every field not
+    # promoted yet. The column reads data_json, or hot_json for rows stored
+    # compressed or as pointers, so lookups on it are index seeks.
+    conn = get_conn(db_path)
+    try:
+        conn.execute('CREATE TABLE IF NOT EXISTS indexed_fields (field TEXT PRIMARY KEY, col TEXT)')
+        done = indexed_fields(conn)
+        taken = {r[1] for r in conn.execute('PRAGMA table_xinfo(events)')}
+        for field in fields:
+            if field in done or not INDEXABLE_FIELD.match(field):
+                continue
+            base = FIELD_COLUMN_PREFIX + field.lower().replace('-', '_')
+            col = base
+            n = 2
+            while col in taken:
+                col = f'{base}_{n}'
+                n += 1
+            path = '$."' + field + '"'
+            conn.execute(f"ALTER TABLE events ADD COLUMN {col} TEXT GENERATED ALWAYS AS "
+                         f"(CAST(json_extract(COALESCE(data_json, hot_json), '{path}') AS TEXT)) VIRTUAL")
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_events_{col} ON events({col})')
+            conn.execute('INSERT INTO indexed_fields (field, col) VALUES (?, ?)', (field, col))
+            taken.add(col)
+            done[field] = col
+        conn.commit()
+        return done
+    finally:
+        conn.close()
+
+
+def drop_storage_columns(item: Dict[str, Any]) -> Dict[str, Any]:
+    # Storage-only columns of an events row that API responses leave out
+    item.pop('hot_json', None)
+    for k in [k for k in item if k.startswith(FIELD_COLUMN_PREFIX)]:
+        del item[k]
+    return item
+
+
+def init_db(db_path: Optional[str] = None) -> None:
+    conn = get_conn(db_path)
+    try:
+        # WAL lets the web server read while a live ingest is writing
+        conn.execute('PRAGMA journal_mode=WAL')
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS events (
@@ -26,10 +98,25 @@ def init_db() -> None:
                 provider TEXT,
                 record_id TEXT,
                 user_sid TEXT,
-                data_json TEXT
+                data_json TEXT,
+                source TEXT
             )
             """
         )
+        # ptr_*: where to re-decode the record when data_json is not stored
+        ensure_columns(conn, 'events', {'source': 'TEXT', 'ptr_path': 'TEXT', 'ptr_chunk': 'INTEGER',
+                                        'ptr_record': 'INTEGER'})
+        # data_zstd/data_dict: data_json compressed with a payload_dicts
+        # dictionary (--compress-data, see payload_codec.py)
+        # hot_json: the promoted fields of rows stored without data_json
+        ensure_columns(conn, 'events', {'data_zstd': 'BLOB', 'data_dict': 'INTEGER', 'hot_json': 'TEXT'})
+        from .logon_sessions import init_tables as init_session_tables
+        from .payload_codec import init_tables
+        from .process_tree import init_tables as init_process_tables
+        init_tables(conn)
+        init_process_tables(conn)
+        init_session_tables(conn)
+        ensure_event_indexes(conn)
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS findings (
@@ -46,42 +133,169 @@ def init_db() -> None:
             )
             """
         )
+        # process_key: the finding's process in the process tree (process_tree.py)
+        ensure_columns(conn, 'findings', {'process_key': 'TEXT'})
+        # Content hash of every rule the stored findings were produced with
+        conn.execute('CREATE TABLE IF NOT EXISTS rule_hashes (rule_id TEXT PRIMARY KEY, content_hash TEXT)')
         conn.commit()
     finally:
         conn.close()
 
 
-def insert_events(events: Iterable[Dict]) -> int:
-    conn = get_conn()
+def seal_db(db_path: Optional[str] = None) -> None:
+    # For databases that are complete (e.g. case shards): leave WAL mode so
+    # read-only readers do not need -wal/-shm files next to the database
+    conn = get_conn(db_path)
+    try:
+        conn.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        conn.close()
+
+
+def max_event_pk(db_path: Optional[str] = None) -> int:
+    # Highest events.id already stored; a run's ids continue from here
+    conn = get_conn(db_path)
+    try:
+        row = conn.execute('SELECT MAX(id) FROM events').fetchone()
+        return int(row[0] or 0)
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        conn.close()
+
+
+def load_rule_hashes(db_path: Optional[str] = None) -> Dict[str, str]:
+    conn = get_conn(db_path)
+    try:
+        return {rid: h for rid, h in conn.execute('SELECT rule_id, content_hash FROM rule_hashes')}
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+
+
+def save_rule_hashes(hashes: Dict[str, str], db_path: Optional[str] = None) -> None:
+    # Replaces the recorded pack: the latest run's rules are the baseline
+    # the next retrohunt diffs against
+    conn = get_conn(db_path)
+    try:
+        conn.execute('CREATE TABLE IF NOT EXISTS rule_hashes (rule_id TEXT PRIMARY KEY, content_hash TEXT)')
+        conn.execute('DELETE FROM rule_hashes')
+        conn.executemany('INSERT INTO rule_hashes (rule_id, content_hash) VALUES (?, ?)', sorted(hashes.items()))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def insert_events(events: Iterable[Dict], db_path: Optional[str] = None, pointers: bool = False,
+                  codec: Any = None, hot_fields: Iterable[str] = (), processes: bool = False,
+                  sessions: bool = False) -> int:
+    # Events carry the id the pipeline assigned (event_pk), so findings
+    # written before or after them can reference it directly. With
+    # `pointers`, events that have a record_ptr are stored without data_json;
+    # with a payload_codec.PayloadCodec, data_json is zstd-compressed. Either
+    # way `hot_fields` (the promoted fields) are kept readable in hot_json.
+    # With `processes`, process creation events also go to the process tree;
+    # with `sessions`, events carrying a LogonId to the logon session index.
+    conn = get_conn(db_path)
     try:
         cur = conn.cursor()
-        rows = [(
-            e.get('timestamp'),
-            e.get('channel'),
-            str(e.get('event_id')) if e.get('event_id') is not None else None,
-            e.get('computer'),
-            e.get('provider'),
-            str(e.get('record_id')) if e.get('record_id') is not None else None,
-            e.get('user_sid'),
-            json.dumps(e.get('data')) if e.get('data') is not None else None,
-        ) for e in events]
+        hot_fields = tuple(hot_fields) if pointers or codec is not None else ()
+        events = list(events)
+        rows = [_event_row(conn, e, pointers, codec, hot_fields) for e in events]
         cur.executemany(
             """
-            INSERT INTO events (timestamp, channel, event_id, computer, provider, record_id, user_sid, data_json)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO events (id, timestamp, channel, event_id, computer, provider, record_id, user_sid, data_json, source,
+                                ptr_path, ptr_chunk, ptr_record, data_zstd, data_dict, hot_json)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             rows
         )
+        count = cur.rowcount or 0
+        if processes:
+            from .process_tree import insert_processes
+            insert_processes(conn, events)
+        if sessions:
+            from .logon_sessions import insert_sessions
+            insert_sessions(conn, events)
+        if codec is not None:
+            codec.flush(conn)
         conn.commit()
-        return cur.rowcount or 0
+        return count
     finally:
         conn.close()
 
 
-def insert_findings(findings: List[Dict]) -> int:
+def _event_row(conn: sqlite3.Connection, e: Dict, pointers: bool, codec: Any,
+               hot_fields: Tuple[str, ...]) -> Tuple[Any, ...]:
+    ptr = e.get('record_ptr') if pointers else None
+    event_id = str(e.get('event_id')) if e.get('event_id') is not None else None
+    data = e.get('data')
+    data_json = json.dumps(data) if data is not None and ptr is None else None
+    data_zstd = data_dict = None
+    if codec is not None and data_json is not None:
+        data_json, data_zstd, data_dict = codec.encode(conn, e.get('channel'), event_id, e.get('event_pk'), data_json)
+    hot = {f: data[f] for f in hot_fields if f in data} if hot_fields and isinstance(data, dict) else None
+    return (
+        e.get('event_pk'),
+        e.get('timestamp'),
+        e.get('channel'),
+        event_id,
+        e.get('computer'),
+        e.get('provider'),
+        str(e.get('record_id')) if e.get('record_id') is not None else None,
+        e.get('user_sid'),
+        data_json,
+        e.get('source'),
+        ptr[0] if ptr else None,
+        ptr[1] if ptr else None,
+        ptr[2] if ptr else None,
+        data_zstd,
+        data_dict,
+        json.dumps(hot) if hot else None,
+    )
+
+
+def finish_payloads(codec: Any, db_path: Optional[str] = None) -> None:
+    # End of a --compress-data run: train the keys that are still short of
+    # TRAIN_SAMPLES but have enough to be worth a dictionary
+    conn = get_conn(db_path)
+    try:
+        codec.flush(conn, final=True)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def finish_processes(db_path: Optional[str] = None) -> None:
+    # End of ingest: link the process tree (see process_tree.resolve_parents)
+    from .process_tree import init_tables, resolve_parents
+    conn = get_conn(db_path)
+    try:
+        init_tables(conn)
+        resolve_parents(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def finish_sessions(db_path: Optional[str] = None) -> None:
+    # End of ingest: tie indexed events to their logon sessions (see
+    # logon_sessions.resolve_sessions)
+    from .logon_sessions import init_tables, resolve_sessions
+    conn = get_conn(db_path)
+    try:
+        init_tables(conn)
+        resolve_sessions(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def insert_findings(findings: List[Dict], db_path: Optional[str] = None) -> int:
     if not findings:
         return 0
-    conn = get_conn()
+    conn = get_conn(db_path)
     try:
         cur = conn.cursor()
         rows = [(
@@ -93,11 +307,13 @@ def insert_findings(findings: List[Dict]) -> int:
             f.get('description'),
             ','.join(f.get('tags') or []),
             f.get('event_ref'),
+            f.get('process_key'),
         ) for f in findings]
         cur.executemany(
             """
-            INSERT INTO findings (event_timestamp, channel, event_id, rule_id, severity, description, tags, event_ref)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO findings (event_timestamp, channel, event_id, rule_id, severity, description, tags, event_ref,
+                                  process_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             rows
         )
@@ -105,3 +321,81 @@ def insert_findings(findings: List[Dict]) -> int:
         return cur.rowcount or 0
     finally:
         conn.close()
+
+
+EVENT_SORT_COLS = {'timestamp', 'channel', 'event_id', 'computer', 'provider', 'user_sid'}
+FINDING_SORT_COLS = {'event_timestamp', 'channel', 'event_id', 'rule_id', 'severity'}
+
+
+def events_where(q: Optional[str], channel: Optional[str], event_id: Optional[str],
+                 since: Optional[str] = None, until: Optional[str] = None,
+                 dsl: Optional[str] = None, fields: Optional[Dict[str, str]] = None,
+                 columns: Optional[Dict[str, str]] = None) -> Tuple[str, List[Any]]:
+    # `dsl` (the --dsl grammar) is compiled to SQL by dsl_sql.compile_dsl; the
+    # connection needs dsl_sql.register_functions(). `fields` are EventData
+    # equality filters; both use the generated `columns` (indexed_fields()).
+    # `q` searches dsl_sql.SEARCH_EXPR: compressed payloads, and only the
+    # promoted fields of pointer rows.
+    clauses = []
+    params: List[Any] = []
+    if q:
+        from .dsl_sql import SEARCH_EXPR
+        clauses.append(f'({SEARCH_EXPR} LIKE ? OR computer LIKE ? OR provider LIKE ? OR user_sid LIKE ?)')
+        like = f'%{q}%'
+        params += [like, like, like, like]
+    if channel:
+        clauses.append('channel = ?')
+        params.append(channel)
+    if event_id:
+        clauses.append('event_id = ?')
+        params.append(event_id)
+    if since:
+        clauses.append('timestamp >= ?')
+        params.append(since)
+    if until:
+        clauses.append('timestamp <= ?')
+        params.append(until)
+    if fields:
+        from .dsl_sql import compile_condition
+        for field, value in sorted(fields.items()):
+            compiled = compile_condition(field, '==', value, columns)
+            clauses.append(compiled['sql'])
+            params += compiled['params']
+    if dsl:
+        from .dsl_sql import compile_dsl
+        compiled = compile_dsl(dsl, columns)
+        clauses.append(compiled['sql'])
+        params += compiled['params']
+    where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+    return where, params
+
+
+def findings_where(q: Optional[str], rule_id: Optional[str], severity: Optional[str],
+                   channel: Optional[str], event_id: Optional[str]) -> Tuple[str, List[Any]]:
+    clauses = []
+    params: List[Any] = []
+    if q:
+        like = f'%{q}%'
+        clauses.append('(description LIKE ? OR tags LIKE ? OR rule_id LIKE ?)')
+        params += [like, like, like]
+    if rule_id:
+        clauses.append('rule_id = ?')
+        params.append(rule_id)
+    if severity:
+        clauses.append('severity = ?')
+        params.append(severity)
+    if channel:
+        clauses.append('channel = ?')
+        params.append(channel)
+    if event_id:
+        clauses.append('event_id = ?')
+        params.append(event_id)
+    where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+    return where, params
+
+
+def order_by(sort_by: str, sort_dir: str, allowed: Iterable[str], default: str) -> Tuple[str, str]:
+    if sort_by not in allowed:
+        sort_by = default
+    sort_dir = 'ASC' if str(sort_dir).lower() == 'asc' else 'DESC'
+    return sort_by, sort_dir
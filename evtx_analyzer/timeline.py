@@ -0,0 +1,122 @@
+import os
+import heapq
+import shutil
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import orjson
+
+from .exporters import INTERNAL_KEYS
+from .utils import parse_iso8601_utc
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Sort key of records without a usable time: after everything else
+NO_TIME = 2 ** 62
+# Runs merged at once; more than this are merged in several passes
+MAX_FANIN = 64
+
+
+def event_time(evt: Dict[str, Any]) -> int:
+    dt = evt.get('timestamp_dt')
+    if dt is None:
+        return NO_TIME
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+def finding_time(row: Dict[str, Any]) -> int:
+    ts = row.get('event_timestamp')
+    if not ts:
+        return NO_TIME
+    try:
+        return (parse_iso8601_utc(ts) - EPOCH) // timedelta(microseconds=1)
+    except Exception:
+        return NO_TIME
+
+
+def _read_run(path: str) -> Iterator[Tuple[int, int, bytes]]:
+    with open(path, 'rb') as fh:
+        for line in fh:
+            ts, seq, payload = line.rstrip(b'\n').split(b'\t', 2)
+            yield int(ts), int(seq), payload
+
+
+def _write_run(path: str, items: Iterator[Tuple[int, int, bytes]]) -> None:
+    with open(path, 'wb') as fh:
+        for ts, seq, payload in items:
+            fh.write(b'%d\t%d\t%s\n' % (ts, seq, payload))
+
+
+class TimelineMerger:
+    # Exporter wrapper for --timeline: records are buffered serialized, sorted
+    # by time and spilled as sorted runs under `workdir` once the buffer
+    # passes buffer_bytes; close() k-way merges the runs (heapq) into the
+    # wrapped exporters, so any output format comes out globally time-ordered
+    # in bounded memory. Ties keep arrival order.
+    def __init__(self, exporters: List[Any], workdir: str, key: Callable[[Dict[str, Any]], int] = event_time,
+                 buffer_bytes: int = 256 * 1024 * 1024) -> None:
+        self.exporters = exporters
+        self.workdir = workdir
+        self.key = key
+        self.buffer_bytes = buffer_bytes
+        self.buffer: List[Tuple[int, int, bytes]] = []
+        self.buffered = 0
+        self.seq = 0
+        self.runs: List[str] = []
+
+    def write(self, rec: Dict[str, Any]) -> None:
+        payload = orjson.dumps({k: v for k, v in rec.items() if k not in INTERNAL_KEYS})
+        self.buffer.append((self.key(rec), self.seq, payload))
+        self.seq += 1
+        self.buffered += len(payload) + 64
+        if self.buffered >= self.buffer_bytes:
+            self._spill()
+
+    def _spill(self) -> None:
+        if not self.buffer:
+            return
+        os.makedirs(self.workdir, exist_ok=True)
+        self.buffer.sort()
+        path = os.path.join(self.workdir, f'run{len(self.runs):05d}.tsv')
+        _write_run(path, iter(self.buffer))
+        self.runs.append(path)
+        self.buffer.clear()
+        self.buffered = 0
+
+    def _merged(self) -> Iterator[Tuple[int, int, bytes]]:
+        if not self.runs:
+            self.buffer.sort()
+            return iter(self.buffer)
+        self._spill()
+        # Keep open files bounded: fold the oldest runs together first
+        level = 0
+        while len(self.runs) > MAX_FANIN:
+            group, self.runs = self.runs[:MAX_FANIN], self.runs[MAX_FANIN:]
+            path = os.path.join(self.workdir, f'merge{level:05d}.tsv')
+            _write_run(path, heapq.merge(*[_read_run(p) for p in group]))
+            for p in group:
+                os.remove(p)
+            self.runs.append(path)
+            level += 1
+        return heapq.merge(*[_read_run(p) for p in self.runs])
+
+    def close(self) -> None:
+        try:
+            for ts, _seq, payload in self._merged():
+                rec = orjson.loads(payload)
+                if ts != NO_TIME and 'timestamp' in rec:
+                    rec['timestamp_dt'] = EPOCH + timedelta(microseconds=ts)
+                for ex in self.exporters:
+                    ex.write(rec)
+        finally:
+            self.buffer.clear()
+            shutil.rmtree(self.workdir, ignore_errors=True)
+            for ex in self.exporters:
+                ex.close()
+
+
+def wrap_timeline(exporters: List[Any], workdir: str, key: Callable[[Dict[str, Any]], int],
+                  buffer_bytes: int) -> List[Any]:
+    # One merger in front of all exporters of a stream (events or findings)
+    if not exporters:
+        return exporters
+    return [TimelineMerger(exporters, workdir, key=key, buffer_bytes=buffer_bytes)]
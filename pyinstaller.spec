@@ -1,6 +1,13 @@
 # PyInstaller spec for win-evtx-analyzer
+#
+# Default is a single-file executable. Set EVENTHOUND_ONEDIR=1 for a onedir
+# build: it skips the per-launch unpack to a temp dir that dominates one-file
+# cold start, which matters when triage scripts invoke the binary many times.
+
+import os
 
 block_cipher = None
+onedir = os.environ.get('EVENTHOUND_ONEDIR') == '1'
 
 hiddenimports = [
     'Evtx',
@@ -8,11 +15,16 @@ hiddenimports = [
     'orjson',
     'click',
     'fastapi',
-    'uvicorn'
+    'uvicorn',
+    # Optional features (requirements-optional.txt); imported lazily, so
+    # PyInstaller would not find them on its own
+    'zstandard',
+    'py7zr',
 ]
 
 from PyInstaller.utils.hooks import collect_submodules
 hiddenimports += collect_submodules('Evtx')
+hiddenimports += collect_submodules('py7zr')
 
 
 a = Analysis(
@@ -23,19 +35,42 @@ a = Analysis(
     hiddenimports=hiddenimports,
     hookspath=[],
     runtime_hooks=[],
-    excludes=[],
+    excludes=['tkinter', 'test', 'pydoc_data', 'IPython', 'matplotlib', 'pytest'],
     cipher=block_cipher,
 )
 pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.zipfiles,
-    a.datas,
-    name='win-evtx-analyzer',
-    debug=False,
-    strip=False,
-    upx=True,
-    console=True,
-)
+if onedir:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='win-evtx-analyzer',
+        debug=False,
+        strip=False,
+        # UPX-compressed libraries have to be decompressed on every start
+        upx=False,
+        console=True,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.zipfiles,
+        a.datas,
+        strip=False,
+        upx=False,
+        name='win-evtx-analyzer',
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.zipfiles,
+        a.datas,
+        name='win-evtx-analyzer',
+        debug=False,
+        strip=False,
+        upx=True,
+        console=True,
+    )
@@ -4,9 +4,19 @@ SCRIPT_DIR=$(cd -- "$(dirname "$0")" >/dev/null 2>&1 ; pwd -P)
 ROOT_DIR=$(dirname "$SCRIPT_DIR")
 cd "$ROOT_DIR"
 
+# Usage: build_*.sh [onefile|onedir] (onedir starts much faster)
+VARIANT=${1:-onefile}
+
 python -m venv .venv && source .venv/bin/activate
-pip install -r requirements.txt
-pyinstaller --clean --onefile --name win-evtx-analyzer pyinstaller.spec | cat
+pip install -r requirements.txt -r requirements-optional.txt
 mkdir -p dist_macos
-cp dist/win-evtx-analyzer dist_macos/
-echo "Built dist_macos/win-evtx-analyzer"
+if [ "$VARIANT" = "onedir" ]; then
+  EVENTHOUND_ONEDIR=1 pyinstaller --clean --noconfirm pyinstaller.spec | cat
+  rm -rf dist_macos/win-evtx-analyzer
+  cp -R dist/win-evtx-analyzer dist_macos/
+  echo "Built dist_macos/win-evtx-analyzer/win-evtx-analyzer"
+else
+  pyinstaller --clean --noconfirm pyinstaller.spec | cat
+  cp dist/win-evtx-analyzer dist_macos/
+  echo "Built dist_macos/win-evtx-analyzer"
+fi
@@ -1,3 +1,5 @@
+# Usage: build_windows.ps1 [onefile|onedir] (onedir starts much faster)
+param([string]$Variant = "onefile")
 $ErrorActionPreference = "Stop"
 $ScriptDir = Split-Path -Parent $MyInvocation.MyCommand.Definition
 $RootDir = Split-Path -Parent $ScriptDir
@@ -5,8 +7,16 @@ Set-Location $RootDir
 
 python -m venv .venv
 . .\.venv\Scripts\Activate.ps1
-pip install -r requirements.txt
-pyinstaller --clean --onefile --name win-evtx-analyzer pyinstaller.spec | Out-Host
+pip install -r requirements.txt -r requirements-optional.txt
 New-Item -ItemType Directory -Force -Path dist_windows | Out-Null
-Copy-Item dist\win-evtx-analyzer.exe dist_windows\
-Write-Host "Built dist_windows/win-evtx-analyzer.exe"
+if ($Variant -eq "onedir") {
+    $env:EVENTHOUND_ONEDIR = "1"
+    pyinstaller --clean --noconfirm pyinstaller.spec | Out-Host
+    Remove-Item -Recurse -Force dist_windows\win-evtx-analyzer -ErrorAction SilentlyContinue
+    Copy-Item -Recurse dist\win-evtx-analyzer dist_windows\
+    Write-Host "Built dist_windows/win-evtx-analyzer/win-evtx-analyzer.exe"
+} else {
+    pyinstaller --clean --noconfirm pyinstaller.spec | Out-Host
+    Copy-Item dist\win-evtx-analyzer.exe dist_windows\
+    Write-Host "Built dist_windows/win-evtx-analyzer.exe"
+}
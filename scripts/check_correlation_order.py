@@ -0,0 +1,88 @@
+"""Input-order check for the correlation engine.
+
+Feeds the same short sequence (5x 4625 then two 4624s from one IP within two
+minutes) through a `failed_logons_then_success`-style rule on its own and
+after / before a large input whose timestamps are days newer, the way the
+pipeline reads files one after another (ending each source). The rule has to
+fire for both successes in every order, and an unfinished burst from the
+older input has to be evicted once the newer input moves past it.
+
+    python scripts/check_correlation_order.py [--filler 30000]
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from evtx_analyzer.correlation import CorrelationEngine, CorrelationRule  # noqa: E402
+
+RULE = {
+    'id': 'failed_logons_then_success',
+    'group_by': ['IpAddress'],
+    'timespan': '5m',
+    'sequence': [
+        {'count': 5, 'all': [{'field': 'event_id', 'op': 'eq', 'value': 4625}]},
+        {'all': [{'field': 'event_id', 'op': 'eq', 'value': 4624}]},
+    ],
+}
+BASE = datetime(2024, 1, 1)
+
+
+def event(source: str, ts: datetime, event_id: str, ip: str = '-') -> dict:
+    return {'source': source, 'timestamp_dt': ts, 'event_id': event_id, 'channel': 'Security',
+            'computer': 'HOST', 'data': {'IpAddress': ip}}
+
+
+def older_input() -> list:
+    # The failed logons and the successes are a few thousand records apart,
+    # so the engine runs its eviction pass in between. 10.0.0.7 never logs on.
+    ip = '10.0.0.9'
+    failed = [event('old.evtx', BASE + timedelta(seconds=10 * i), '4625', ip) for i in range(5)]
+    unfinished = [event('old.evtx', BASE + timedelta(seconds=10 * i), '4625', '10.0.0.7') for i in range(3)]
+    noise = [event('old.evtx', BASE + timedelta(seconds=41 + i / 100), '4663') for i in range(3000)]
+    success = [event('old.evtx', BASE + timedelta(seconds=s), '4624', ip) for s in (90, 120)]
+    return failed + unfinished + noise + success
+
+
+def newer_input(count: int) -> list:
+    start = BASE + timedelta(days=3)
+    return [event('new.evtx', start + timedelta(seconds=i), '4663') for i in range(count)]
+
+
+def run(inputs: list) -> tuple:
+    # (findings, groups left in state after the run)
+    engine = CorrelationEngine([CorrelationRule.from_item(RULE)])
+    hits = []
+    for events in inputs:
+        for evt in events:
+            hits.extend(engine.push(evt))
+        engine.end_source(events[0]['source'])
+    hits.extend(engine.flush())
+    return sum(1 for _evt, h in hits if h['rule_id'] == RULE['id']), engine.state_size()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--filler', type=int, default=30000, help='Events in the newer input')
+    args = ap.parse_args()
+
+    old = older_input()
+    new = newer_input(args.filler)
+    ok = True
+    for name, inputs in (('alone', [old]), ('newer first', [new, old]), ('newer last', [old, new])):
+        fired, left = run(inputs)
+        print(f'{name}: {fired} finding(s), {left} group(s) left')
+        if fired != 2:
+            ok = False
+            print(f'FAIL: expected 2 findings with the {name} input order')
+        if len(inputs) > 1 and left:
+            ok = False
+            print(f'FAIL: expired groups kept after the {name} run')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
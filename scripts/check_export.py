@@ -0,0 +1,78 @@
+"""Export check for /api/events/export on the SQLite backend.
+
+Ingests a few synthetic events into a temporary events.db (with a promoted
+EventData field) and downloads them as JSONL, CSV and Parquet, unfiltered and
+with a promoted-field filter. Every format has to return every export column
+and the matching rows.
+
+    python scripts/check_export.py [--events 25]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import evtx_analyzer.server as server  # noqa: E402
+from evtx_analyzer.storage import init_db, insert_events, promote_fields  # noqa: E402
+
+
+def make_events(count: int) -> list:
+    return [{'event_pk': i + 1, 'timestamp': f'2024-01-01T00:00:{i % 60:02d}Z', 'channel': 'Security',
+             'event_id': '4624', 'computer': 'HOST', 'provider': 'Microsoft-Windows-Security-Auditing',
+             'record_id': str(i + 1), 'user_sid': None, 'source': 'check.evtx',
+             'data': {'TargetUserName': 'alice' if i % 2 else 'bob', 'LogonType': '3'}} for i in range(count)]
+
+
+def read_rows(fmt: str, body: bytes) -> list:
+    if fmt == 'jsonl':
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    if fmt == 'csv':
+        return list(csv.DictReader(io.StringIO(body.decode('utf-8'))))
+    import pyarrow.parquet as pq
+    return pq.read_table(io.BytesIO(body)).to_pylist()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--events', type=int, default=25)
+    args = ap.parse_args()
+    from fastapi.testclient import TestClient
+
+    workdir = tempfile.mkdtemp(prefix='eventhound-export-')
+    ok = True
+    try:
+        db = os.path.join(workdir, 'events.db')
+        init_db(db)
+        insert_events(make_events(args.events), db_path=db)
+        promote_fields(['TargetUserName'], db_path=db)
+        server.DB_PATH = db
+        server.configure(backend='sqlite')
+        client = TestClient(server.app)
+        alice = args.events // 2
+        for fmt in ('jsonl', 'csv', 'parquet'):
+            for params, want in (({}, args.events), ({'TargetUserName': 'alice'}, alice)):
+                res = client.get('/api/events/export', params={'format': fmt, **params})
+                rows = read_rows(fmt, res.content) if res.status_code == 200 else []
+                columns = set(rows[0]) if rows else set()
+                label = f"{fmt} {params or 'unfiltered'}"
+                print(f'{label}: HTTP {res.status_code}, {len(rows)} rows, {len(columns)} columns')
+                if res.status_code != 200 or len(rows) != want:
+                    ok = False
+                    print(f'FAIL: expected {want} rows')
+                elif fmt != 'jsonl' and columns != set(server.EXPORT_FIELDS):
+                    ok = False
+                    print(f"FAIL: columns {sorted(columns)}, expected {sorted(server.EXPORT_FIELDS)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
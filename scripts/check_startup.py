@@ -0,0 +1,92 @@
+"""Startup-time budget check for the CLI.
+
+Runs `python -X importtime -c "import evtx_analyzer.cli"` in a fresh
+interpreter and fails if the package import exceeds the budget, or if any of
+the heavy modules that should only load on demand were pulled in eagerly.
+Optionally also times `main.py --help` end to end.
+
+    python scripts/check_startup.py [--budget-ms 60] [--cli-budget-ms 200] [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must not be imported just to parse arguments / print help
+DEFERRED_MODULES = ('rich', 'Evtx', 'xmltodict', 'yaml', 'requests', 'sqlite3', 'orjson',
+                    'pyarrow', 'fastapi', 'uvicorn')
+
+
+def measure_import() -> tuple:
+    code = ('import sys, evtx_analyzer.cli; '
+            f'print(",".join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT_DIR,
+                          capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        rows.append((int(parts[1]), parts[2].rstrip()))
+    idx = next((i for i, (_us, name) in enumerate(rows) if name.strip() == 'evtx_analyzer.cli'), None)
+    if idx is None:
+        return 0.0, [], []
+    # Children are reported before their parent; walk back to the previous
+    # top-level entry (one space of indent) to get the cli import subtree.
+    start = idx
+    while start > 0 and rows[start - 1][1].startswith('  '):
+        start -= 1
+    loaded = [m for m in proc.stdout.strip().split(',') if m]
+    top = sorted(rows[start:idx], reverse=True)[:10]
+    return rows[idx][0] / 1000.0, loaded, top
+
+
+def measure_cli(runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, 'main.py', '--help'], cwd=ROOT_DIR,
+                       stdout=subprocess.DEVNULL, check=True)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--budget-ms', type=float, default=60.0, help='Budget for importing evtx_analyzer.cli')
+    ap.add_argument('--cli-budget-ms', type=float, default=0.0,
+                    help='Optional budget for `main.py --help` wall time (median), 0 to skip')
+    ap.add_argument('--runs', type=int, default=5)
+    args = ap.parse_args()
+
+    ok = True
+    import_ms, loaded, top = measure_import()
+    print(f'import evtx_analyzer.cli: {import_ms:.1f}ms (budget {args.budget_ms:.0f}ms)')
+    for us, name in top:
+        print(f'  {us / 1000:7.1f}ms {name.strip()}')
+    if import_ms > args.budget_ms:
+        ok = False
+        print('FAIL: import budget exceeded')
+    if loaded:
+        ok = False
+        print(f"FAIL: eagerly imported: {', '.join(loaded)}")
+
+    if args.cli_budget_ms:
+        cli_ms = measure_cli(args.runs)
+        print(f'main.py --help: {cli_ms:.1f}ms median of {args.runs} (budget {args.cli_budget_ms:.0f}ms)')
+        if cli_ms > args.cli_budget_ms:
+            ok = False
+            print('FAIL: CLI wall-time budget exceeded')
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())